@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Startup benchmark of the eotile CLI
+
+Runs the CLI in fresh interpreters and reports the time to the first line of
+output, e.g.::
+
+    python benchmarks/startup.py 31TCJ -to_tile_id
+
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+DEFAULT_ARGUMENTS = ["31TCJ", "-to_tile_id"]
+
+
+def time_to_first_output(cli_arguments):
+    """
+    Runs the CLI once in a new interpreter
+
+    :param cli_arguments: arguments of the eotile command
+    :return: the time to the first line of output and the total run time, in seconds
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "eotile.eotile_cli", *cli_arguments],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+    )
+    process.stdout.readline()
+    first_output = time.perf_counter() - start
+    process.communicate()
+    return first_output, time.perf_counter() - start
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-repeat", type=int, default=5, help="Number of runs")
+    args, cli_arguments = parser.parse_known_args(arguments)
+    cli_arguments = cli_arguments or DEFAULT_ARGUMENTS
+
+    runs = [time_to_first_output(cli_arguments) for _ in range(args.repeat)]
+    print(f"eotile {' '.join(cli_arguments)} ({args.repeat} runs)")
+    print(f"  first output: median {statistics.median(elt[0] for elt in runs):.3f} s")
+    print(f"  total:        median {statistics.median(elt[1] for elt in runs):.3f} s")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,402 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Benchmark suite of the eotile queries
+
+Times ``eotile_module.main``, ``quick_search`` and ``get_tiles_from_tile_id`` for each
+input type (tile ids, bbox, wkt, file, location), AOI scale (small, regional,
+continental, global) and tile grid. Each case records its cold time (grids not loaded
+yet), the median and minimum of its warm times, its peak memory and the number of
+tiles found, in a JSON file to be compared with the results of another commit::
+
+    python benchmarks/suite.py run -aux_data synthetic -output base.json
+    python benchmarks/suite.py run -aux_data synthetic -output new.json
+    python benchmarks/suite.py compare base.json new.json
+
+Locations are resolved by a stub geocoding backend returning the AOI, without network
+access. With ``-aux_data synthetic``, the grids are generated once from the analytic
+engines (see synthetic_grids.py), for machines without the large aux data. The peak
+memory is the one traced by tracemalloc during a warm run: Python and NumPy
+allocations, not those of GEOS and GDAL. ``-startup`` adds the time to the first
+output of the CLI (see startup.py).
+
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+FUNCTIONS = ["main", "quick_search", "get_tiles_from_tile_id"]
+INPUT_TYPES = ["tile_id", "bbox", "wkt", "file", "location"]
+SOURCES = ["S2", "L8", "DEM", "SRTM 5x5"]
+
+# Bounds of the AOI of each scale: a city, a region, Europe, the land masses
+SCALES = {
+    "small": (1.35, 43.55, 1.50, 43.65),
+    "regional": (-0.5, 42.5, 3.5, 45.0),
+    "continental": (-10.0, 35.0, 30.0, 60.0),
+    "global": (-179.0, -56.0, 179.0, 59.0),
+}
+# Vertices of the elliptic AOIs, so that the overlaps are not computed with boxes only
+AOI_VERTICES = 720
+# Tile ids given to the tile id queries: Sentinel-2 ids, the most common input
+TILE_ID_SOURCE = "S2"
+MAX_TILE_IDS = 1000
+
+# Flags of eotile_module.main selecting a single tile source
+SOURCE_FLAGS = {
+    "S2": {"no_l8": True},
+    "L8": {"no_s2": True},
+    "DEM": {"no_s2": True, "no_l8": True, "dem": True},
+    "SRTM 5x5": {"no_s2": True, "no_l8": True, "srtm5x5": True},
+}
+TIME_REGRESSION = 0.10
+DEFAULT_SYNTHETIC_DIRPATH = Path(tempfile.gettempdir()) / "eotile_synthetic_aux_data"
+
+
+def aoi_geometry(scale: str):
+    """The ellipse inscribed in the bounds of a scale"""
+    import numpy as np
+    from shapely.geometry import Polygon
+
+    x_min, y_min, x_max, y_max = SCALES[scale]
+    angles = np.linspace(0, 2 * np.pi, AOI_VERTICES, endpoint=False)
+    return Polygon(
+        zip(
+            (x_min + x_max) / 2 + (x_max - x_min) / 2 * np.cos(angles),
+            (y_min + y_max) / 2 + (y_max - y_min) / 2 * np.sin(angles),
+        )
+    )
+
+
+def location_name(scale: str) -> str:
+    return f"Benchmark {scale}"
+
+
+class StubGeocoder:
+    """Resolves the location names of the benchmark to their AOI, without network access"""
+
+    def search(self, query, location_type=None, threshold=None):
+        for scale in SCALES:
+            if query == location_name(scale):
+                return {
+                    "type": "FeatureCollection",
+                    "features": [
+                        {
+                            "type": "Feature",
+                            "properties": {"type": "administrative", "display_name": query},
+                            "geometry": aoi_geometry(scale).__geo_interface__,
+                        }
+                    ],
+                }
+        return {"type": "FeatureCollection", "features": []}
+
+
+def build_inputs(scale: str, aux_data_dirpath: Path, tmp_dirpath: Path) -> dict:
+    """
+    Builds the input of each type for a scale
+
+    :return: the input argument of each input type
+    """
+    import geopandas as gp
+    from shapely.geometry import box
+
+    from eotile.eotiles.catalog import get_catalog, get_grid_filename
+
+    geom = aoi_geometry(scale)
+    filename = tmp_dirpath / f"aoi_{scale}.gpkg"
+    if not filename.exists():
+        gp.GeoDataFrame({"name": [scale]}, geometry=[geom], crs="epsg:4326").to_file(
+            filename, driver="GPKG"
+        )
+    tile_ids = list(
+        get_catalog(get_grid_filename(aux_data_dirpath, TILE_ID_SOURCE))
+        .query(box(*geom.bounds))["id"]
+    )
+    step = max(1, len(tile_ids) // MAX_TILE_IDS)
+    return {
+        "tile_id": ", ".join(tile_ids[::step][:MAX_TILE_IDS]),
+        "bbox": ", ".join(str(value) for value in SCALES[scale]),
+        "wkt": geom.wkt,
+        "file": str(filename),
+        "location": location_name(scale),
+    }
+
+
+def case_function(function: str, input_type: str, input_arg: str, source: str):
+    """
+    Returns the call of a case, None when the function does not take this input type
+
+    :return: a function without arguments returning the number of tiles found
+    """
+    from eotile import eotile_module
+    from eotile.eotiles.get_bb_from_tile_id import get_tiles_from_tile_id
+    from eotile.eotiles.utils import parse_to_list
+
+    if function == "main":
+        def call():
+            tile_lists = eotile_module.main(input_arg, **SOURCE_FLAGS[source])
+            return sum(len(tile_list) for tile_list in tile_lists)
+    elif function == "quick_search":
+        def call():
+            return len(eotile_module.quick_search(input_arg, input_type, source))
+    elif input_type == "tile_id":
+        flags = SOURCE_FLAGS[source]
+        def call():
+            tile_lists = get_tiles_from_tile_id(
+                parse_to_list(input_arg),
+                eotile_module.get_aux_data_dirpath(),
+                flags.get("no_l8", False),
+                flags.get("no_s2", False),
+                flags.get("dem", False),
+                flags.get("srtm5x5", False),
+            )
+            return sum(len(tile_list) for tile_list in tile_lists)
+    else:
+        return None
+    return call
+
+
+def measure(call, repeat: int) -> dict:
+    """
+    Times a case: once with the grids to load, then repeat times once they are loaded,
+    then once more with tracemalloc for its peak memory
+    """
+    from eotile.eotiles import catalog
+
+    catalog.clear_catalogs()
+    start = time.perf_counter()
+    n_tiles = call()
+    cold = time.perf_counter() - start
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        call()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "n_tiles": n_tiles,
+        "cold_s": cold,
+        "median_s": statistics.median(times),
+        "min_s": min(times),
+        "times_s": times,
+        "peak_memory_bytes": peak,
+    }
+
+
+def git_revision() -> dict:
+    """The commit of the working tree, and whether it has uncommitted changes"""
+    cwd = Path(__file__).resolve().parent
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=cwd, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=cwd, capture_output=True, text=True, check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": bool(status.strip())}
+
+
+def case_key(result: dict) -> tuple:
+    return result["function"], result["input"], result["scale"], result["source"]
+
+
+def run(args) -> dict:
+    if args.aux_data == "synthetic":
+        from synthetic_grids import build_synthetic_aux_data
+
+        sources = list(args.sources)
+        if "tile_id" in args.inputs:
+            # The tile id inputs are read from their own grid, and quick_search looks up
+            # the tiles of every source for them
+            sources += SOURCES if "quick_search" in args.functions else [TILE_ID_SOURCE]
+        os.environ["EOTILE_AUX_DATA"] = str(
+            build_synthetic_aux_data(Path(args.synthetic_dir), list(dict.fromkeys(sources)))
+        )
+    from eotile import eotile_module
+    from eotile.eotiles.geocoders import set_geocoder
+
+    set_geocoder(StubGeocoder())
+    aux_data_dirpath = eotile_module.get_aux_data_dirpath()
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dirname:
+        for scale in args.scales:
+            inputs = build_inputs(scale, aux_data_dirpath, Path(tmp_dirname))
+            for function in args.functions:
+                for input_type in args.inputs:
+                    for source in args.sources:
+                        call = case_function(function, input_type, inputs[input_type], source)
+                        if call is None:
+                            continue
+                        result = {
+                            "function": function,
+                            "input": input_type,
+                            "scale": scale,
+                            "source": source,
+                        }
+                        try:
+                            result.update(measure(call, args.repeat))
+                        except Exception as error:  # pylint: disable=broad-except
+                            # A failing case is recorded, the other ones still run
+                            result["error"] = f"{type(error).__name__}: {error}"
+                        results.append(result)
+                        print(format_result(result), file=sys.stderr)
+
+    if args.startup:
+        from startup import DEFAULT_ARGUMENTS, time_to_first_output
+
+        runs = [time_to_first_output(DEFAULT_ARGUMENTS) for _ in range(args.repeat)]
+        results.append({
+            "function": "cli_startup",
+            "input": " ".join(DEFAULT_ARGUMENTS),
+            "scale": None,
+            "source": None,
+            "median_s": statistics.median(elt[0] for elt in runs),
+            "min_s": min(elt[0] for elt in runs),
+            "times_s": [elt[0] for elt in runs],
+        })
+        print(format_result(results[-1]), file=sys.stderr)
+
+    return {
+        "meta": {
+            **git_revision(),
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "aux_data": args.aux_data,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+
+def format_result(result: dict) -> str:
+    name = " ".join(str(elt) for elt in case_key(result) if elt is not None)
+    if "error" in result:
+        return f"{name:<48} error: {result['error']}"
+    memory = result.get("peak_memory_bytes")
+    return (
+        f"{name:<48} median {result['median_s'] * 1000:9.1f} ms"
+        + (f"  cold {result['cold_s'] * 1000:9.1f} ms" if "cold_s" in result else "")
+        + (f"  peak {memory / 2 ** 20:8.1f} MiB" if memory is not None else "")
+        + (f"  {result['n_tiles']} tiles" if "n_tiles" in result else "")
+    )
+
+
+def compare(base: dict, new: dict, threshold: float = TIME_REGRESSION) -> int:
+    """
+    Prints the ratios of the median times and peak memories of two runs
+
+    :return: the number of cases whose median time or peak memory grew by more than threshold
+    """
+    base_results = {case_key(result): result for result in base["results"]}
+    regressions = 0
+    print(f"{base['meta'].get('commit')} -> {new['meta'].get('commit')}")
+    for result in new["results"]:
+        reference = base_results.get(case_key(result))
+        name = " ".join(str(elt) for elt in case_key(result) if elt is not None)
+        if reference is None or "error" in result or "error" in reference:
+            print(f"{name:<48} {'new' if reference is None else 'error'}")
+            continue
+        ratios = {"time": result["median_s"] / reference["median_s"]}
+        if result.get("peak_memory_bytes") and reference.get("peak_memory_bytes"):
+            ratios["memory"] = result["peak_memory_bytes"] / reference["peak_memory_bytes"]
+        regressed = [kind for kind, ratio in ratios.items() if ratio > 1 + threshold]
+        regressions += bool(regressed)
+        print(
+            f"{name:<48} "
+            + "  ".join(f"{kind} x{ratio:.2f}" for kind, ratio in ratios.items())
+            + ("  REGRESSION" if regressed else "")
+        )
+    return regressions
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmarks")
+    run_parser.add_argument(
+        "-aux_data",
+        choices=["installed", "synthetic"],
+        default="installed",
+        help="Benchmark the installed grids, or synthetic grids generated once",
+    )
+    run_parser.add_argument(
+        "-synthetic_dir",
+        default=str(DEFAULT_SYNTHETIC_DIRPATH),
+        help="Directory of the synthetic grids",
+    )
+    run_parser.add_argument("-functions", nargs="+", choices=FUNCTIONS, default=FUNCTIONS)
+    run_parser.add_argument("-inputs", nargs="+", choices=INPUT_TYPES, default=INPUT_TYPES)
+    run_parser.add_argument("-scales", nargs="+", choices=list(SCALES), default=list(SCALES))
+    run_parser.add_argument("-sources", nargs="+", choices=SOURCES, default=SOURCES)
+    run_parser.add_argument("-repeat", type=int, default=3, help="Number of warm runs")
+    run_parser.add_argument("-startup", action="store_true", help="Time the CLI startup too")
+    run_parser.add_argument("-output", help="JSON file of the results, standard output if unset")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two results files")
+    compare_parser.add_argument("base", help="Results of the reference commit")
+    compare_parser.add_argument("new", help="Results to compare")
+    compare_parser.add_argument(
+        "-threshold",
+        type=float,
+        default=TIME_REGRESSION,
+        help="Relative growth of a median time or peak memory reported as a regression",
+    )
+
+    args = parser.parse_args(arguments)
+    if args.command == "compare":
+        with open(args.base, encoding="utf-8") as base, open(args.new, encoding="utf-8") as new:
+            return 1 if compare(json.load(base), json.load(new), args.threshold) else 0
+
+    report = run(args)
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    else:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=1)
+    return 0 if not any("error" in result for result in report["results"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
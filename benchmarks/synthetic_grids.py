@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Synthetic tile grids for the benchmarks
+
+Generates the grid files of the tile sources from the analytic engines of eotile,
+with the file names of the real aux data, for machines without the large aux data::
+
+    python benchmarks/synthetic_grids.py /tmp/eotile_synthetic_aux_data
+
+The grids cover the whole world, oceans included, so they hold more tiles than
+the real ones. The flags of the DEM tiles are set from the latitude.
+
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import geopandas as gp
+import numpy as np
+
+from eotile.eotiles import latlon_grids, mgrs, wrs2
+from eotile.eotiles.catalog import GRID_FILENAMES
+
+WORLD_BOUNDS = (-180.0, -90.0, 180.0, 90.0)
+
+ENGINES = {
+    "S2": lambda: mgrs.MGRSGrid(overlap=False),
+    "L8": wrs2.WRS2Grid,
+    "DEM": latlon_grids.DEMGrid,
+    "SRTM 5x5": latlon_grids.SRTM5x5Grid,
+}
+
+
+def synthetic_tiles(source: str) -> gp.GeoDataFrame:
+    """
+    Builds the tiles of a source covering the whole world
+
+    :param source: Tile source: "S2", "L8", "DEM", "SRTM 5x5"
+    :return: the tiles, with an id column and the flag columns of the source
+    """
+    engine = ENGINES[source]()
+    tile_ids = engine.candidate_tile_ids(WORLD_BOUNDS)
+    footprints = engine.tile_footprints(tile_ids)
+    kept = [
+        position for position, footprint in enumerate(footprints)
+        if footprint is not None and not footprint.is_empty
+    ]
+    tiles = gp.GeoDataFrame(
+        {"id": [tile_ids[position] for position in kept]},
+        geometry=[footprints[position] for position in kept],
+        crs="epsg:4326",
+    )
+    if source == "DEM":
+        lats = tiles.geometry.bounds["miny"]
+        tiles["EXIST_SRTM"] = (lats >= -56) & (lats < 60)
+        tiles["EXIST_COP30"] = lats >= -60
+        tiles["EXIST_COP90"] = True
+    return tiles
+
+
+def build_synthetic_aux_data(dirpath: Path, sources=tuple(ENGINES)) -> Path:
+    """
+    Writes the synthetic grid files of some tile sources, keeping the existing ones
+
+    :param dirpath: Directory of the grid files, used as aux data directory
+    :param sources: (Optional, default = all) The tile sources
+    :return: the directory
+    """
+    dirpath = Path(dirpath)
+    dirpath.mkdir(parents=True, exist_ok=True)
+    for source in sources:
+        filename = dirpath / GRID_FILENAMES[source]
+        if filename.exists():
+            continue
+        tiles = synthetic_tiles(source)
+        engine = ENGINES[source]()
+        if isinstance(engine, latlon_grids.LatLonGrid):
+            # The lookup table lets the engine stand in for the grid file, as in the real aux data
+            np.save(latlon_grids.lookup_table_path(filename), engine.build_lookup_table(tiles))
+        tiles.to_file(filename, driver="GPKG")
+        print(f"Wrote {len(tiles)} {source} tiles to {filename}")
+    return dirpath
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("dirpath", help="Directory of the grid files")
+    parser.add_argument(
+        "-sources", nargs="+", choices=list(ENGINES), default=list(ENGINES),
+        help="Tile sources to generate",
+    )
+    args = parser.parse_args(arguments)
+    build_synthetic_aux_data(Path(args.dirpath), args.sources)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
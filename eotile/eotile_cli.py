@@ -29,12 +29,10 @@ EO tile
 import argparse
 import logging
 import sys
+from contextlib import contextmanager
 from pathlib import Path
 
-from geopy.geocoders import Nominatim
-
-from eotile import eotile_module
-from eotile.eotiles.eotiles import write_tiles_bb
+OUTPUT_BUFFER_SIZE = 1 << 20
 
 
 def build_parser():
@@ -47,8 +45,24 @@ def build_parser():
 
     parser.add_argument(
         "input",
+        nargs="?",
         help="Choose amongst : a file, a tile_id, a location, a wkt, a bbox",
     )
+    parser.add_argument(
+        "-batch",
+        "--batch",
+        nargs="?",
+        const="-",
+        metavar="FILE",
+        help="Read one input per line from FILE, or from standard input when FILE is omitted, "
+        "and tag the results with the line number",
+    )
+    parser.add_argument(
+        "-jobs",
+        type=int,
+        default=1,
+        help="Number of batch lines processed in parallel, the output order is kept",
+    )
     parser.add_argument("-epsg", help="Specify the epsg of the input")
     parser.add_argument("-no_l8", action="store_true", help="output L8 tiles")
     parser.add_argument("-no_s2", action="store_true", help="Disable S2 tiles")
@@ -58,7 +72,22 @@ def build_parser():
     )
     # Output arguments
 
-    parser.add_argument("-to_file", help="Write tiles to a file")
+    parser.add_argument(
+        "-to_file",
+        help="Write tiles to a file: .shp, .geojson, .gpkg, .fgb (FlatGeobuf) "
+        "or .parquet (GeoParquet, requires pyarrow)",
+    )
+    parser.add_argument(
+        "-single_file",
+        action="store_true",
+        help="Write the tiles of all sources to a single file with a source column, "
+        "instead of one file per source",
+    )
+    parser.add_argument(
+        "-no_spatial_index",
+        action="store_true",
+        help="Do not add a spatial index to FlatGeobuf files, nor sort GeoParquet rows",
+    )
     parser.add_argument(
         "-to_wkt",
         action="store_true",
@@ -80,6 +109,12 @@ def build_parser():
         help="Output the location of the centroid of matching tiles "
         "on standard output",
     )
+    parser.add_argument(
+        "-format",
+        choices=["text", "csv", "ndjson"],
+        default="text",
+        help="Format of the tiles written on standard output (or to the logger file)",
+    )
     parser.add_argument(
         "-s2_overlap",
         action="store_true",
@@ -99,6 +134,46 @@ def build_parser():
         help="If needed, specify the location type that is requested (city, county, state, country)",
     )
 
+    parser.add_argument(
+        "-aoi_mode",
+        choices=["first", "union", "features"],
+        default="first",
+        help="For AOI files: query the first feature, the union of the features, or each "
+        "feature in parallel, keeping its attributes with its tiles",
+    )
+    parser.add_argument(
+        "-aoi_tolerance",
+        type=float,
+        help="Decompose the AOI into a quad cover, intersecting only the tiles on its boundary, "
+        "and simplify the boundary with this error in degrees (0: exact). "
+        "AOIs of more than 20000 vertices are always decomposed, exactly",
+    )
+    parser.add_argument(
+        "-cover",
+        choices=["greedy", "optimal"],
+        help="Only keep a minimal set of the tiles of each source still covering the AOI: "
+        "greedy, or optimal for the fewest tiles found within -cover_budget search nodes",
+    )
+    parser.add_argument(
+        "-cover_budget",
+        type=int,
+        default=10000,
+        help="Search nodes of the optimal cover, the best cover found is kept when exhausted",
+    )
+    parser.add_argument(
+        "-search_type",
+        choices=["tile_id", "wkt", "geojson", "wkb", "point", "bbox", "file", "location"],
+        help="Type of the input, induced from the input when not set. "
+        "Points are given as 'lat, lon'",
+    )
+    parser.add_argument(
+        "-no_geocode",
+        action="store_true",
+        help="Classify the inputs which are not recognized as locations, "
+        "without checking them with the geocoding backend",
+    )
+    add_geocoder_arguments(parser)
+
     parser.add_argument(
         "-threshold",
         help="For large polygons at high resolution, you might want to simplify them using a threshold"
@@ -110,65 +185,298 @@ def build_parser():
         help="Minimum percentage of overlap to consider a tile (0 to 1)",
     )
 
+    parser.add_argument(
+        "-area_mode",
+        choices=["planar", "geodesic"],
+        default="planar",
+        help="Areas used by -min_overlap: planar (square degrees) or geodesic",
+    )
+
+    parser.add_argument(
+        "-executor",
+        choices=["thread", "process", "none"],
+        default="thread",
+        help="Run the queries of the tile sources concurrently in a thread or process pool, "
+        "or one after another (none)",
+    )
+    parser.add_argument(
+        "-profile",
+        "--profile",
+        nargs="?",
+        const="table",
+        choices=["table", "json"],
+        help="Time the stages of the query and write them on the standard error, "
+        "as a table (default) or as JSON",
+    )
+
+    return parser
+
+
+def build_cache_parser():
+    """Creates a parser for the cache management commands:
+    eotile cache {build, clear, clear-geocode}
+
+    :return: An parser.
+    :rtype: :class:`argparse.ArgumentParser`
+    """
+    parser = argparse.ArgumentParser(prog="eotile cache")
+    parser.add_argument(
+        "action",
+        choices=["build", "clear", "clear-geocode"],
+        help="Build the binary caches of the tile grids, or remove them, "
+        "or empty the cache of the location requests",
+    )
+    return parser
+
+
+def cache_main(arguments):
+    """
+    Command line interface to manage the binary caches of the tile grids
+
+    :param list arguments: list of arguments
+    """
+    args = build_cache_parser().parse_args(args=arguments)
+    from eotile import eotile_module
+
+    user_logger = _command_logger()
+    if args.action == "build":
+        for cache_dirpath in eotile_module.build_caches():
+            user_logger.info("Built %s", cache_dirpath)
+    elif args.action == "clear-geocode":
+        user_logger.info("Removed %s cached location requests", eotile_module.clear_geocode_cache())
+    else:
+        for filename in eotile_module.clear_caches():
+            user_logger.info("Removed the cache of %s", filename)
+
+
+def build_crossref_parser():
+    """Creates a parser for the cross-reference table command: eotile crossref build
+
+    :return: An parser.
+    :rtype: :class:`argparse.ArgumentParser`
+    """
+    parser = argparse.ArgumentParser(prog="eotile crossref")
+    parser.add_argument(
+        "action",
+        choices=["build"],
+        help="Build the cross-reference table of the tile grids",
+    )
+    return parser
+
+
+def build_serve_parser():
+    """Creates a parser for the query service: eotile serve
+
+    :return: An parser.
+    :rtype: :class:`argparse.ArgumentParser`
+    """
+    parser = argparse.ArgumentParser(
+        prog="eotile serve",
+        description="Serve the tile queries over HTTP/JSON, keeping the tile grids in memory",
+    )
+    parser.add_argument("-host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("-port", type=int, default=8080, help="Port to listen on")
+    parser.add_argument(
+        "-workers",
+        type=int,
+        help="Size of the worker pool, the number of CPUs (4 at most) by default",
+    )
+    parser.add_argument(
+        "-executor",
+        choices=["process", "thread"],
+        default="process",
+        help="Run the queries in worker processes (CPU parallelism) or threads",
+    )
+    parser.add_argument(
+        "-no_warm_up", action="store_true", help="Load the tile grids on the first queries"
+    )
+    add_geocoder_arguments(parser)
+    return parser
+
+
+def serve_main(arguments):
+    """
+    Command line interface of the query service
+
+    :param list arguments: list of arguments
+    """
+    args = build_serve_parser().parse_args(args=arguments)
+    from eotile.eotile_server import serve
+
+    _command_logger().info("Serving on http://%s:%s", args.host, args.port)
+    serve(
+        args.host,
+        args.port,
+        args.workers,
+        args.executor,
+        build_geocoder(args),
+        not args.no_warm_up,
+    )
+
+
+def crossref_main(arguments):
+    """
+    Command line interface to build the cross-reference table of the tile grids
+
+    :param list arguments: list of arguments
+    """
+    build_crossref_parser().parse_args(args=arguments)
+    from eotile import eotile_module
+
+    user_logger = _command_logger()
+    user_logger.info("Built %s", eotile_module.build_crossref())
+
+
+def build_assign_parser():
+    """Creates a parser for the parcel assignment: eotile assign
+
+    :return: An parser.
+    :rtype: :class:`argparse.ArgumentParser`
+    """
+    parser = argparse.ArgumentParser(
+        prog="eotile assign",
+        description="Assign the parcels of a large vector dataset to tiles, out of core",
+    )
+    parser.add_argument("parcels", help="Parcel file: any vector file, or GeoParquet")
+    parser.add_argument("output", help="Output (parcel, tile) table: .csv, or .parquet")
+    parser.add_argument(
+        "-source",
+        choices=["S2", "L8", "DEM", "SRTM 5x5"],
+        default="S2",
+        help="Tile grid the parcels are assigned to",
+    )
+    parser.add_argument("-s2_overlap", action="store_true", help="Use the overlapping S2 grid")
+    parser.add_argument("-id_column", help="Column identifying the parcels")
+    parser.add_argument(
+        "-keep_columns", nargs="+", default=[], help="Parcel columns copied to the output"
+    )
+    parser.add_argument("-layer", help="Layer of the parcels")
+    parser.add_argument(
+        "-min_overlap",
+        type=float,
+        help="Minimum percentage of overlap of each tile with a parcel (0 to 1)",
+    )
+    parser.add_argument(
+        "-area_mode",
+        choices=["planar", "geodesic"],
+        default="planar",
+        help="Areas used for -min_overlap",
+    )
+    parser.add_argument(
+        "-chunk_size", type=int, default=50000, help="Number of parcels processed at once"
+    )
+    parser.add_argument(
+        "-executor",
+        choices=["process", "thread", "none"],
+        default="process",
+        help="Join the chunks in a process or thread pool, or one after another (none)",
+    )
+    parser.add_argument("-tmp_dir", help="Directory of the temporary partition files")
     return parser
 
 
-def build_output(source, tile_list, user_logger, message, args):
+def assign_main(arguments):
     """
-    Sub-function of the main
-    Formats an output depending on a specified message & arguments over a dataframe pandas of tiles.
-    :param source: Type of the source (DEM, S2, L8)
-    :type source: str
-    :param user_logger: LOGGER to log the message to
-    :type user_logger: logging.LOGGER
-    :param tile_list: pandas dataframe of the tiles to format
-    :type tile_list: pandas DataFrame
-    :param message: The message to format
-    :type message: str
-    :param args: fields to look in
-    :type args: list
+    Command line interface of the parcel assignment
+
+    :param list arguments: list of arguments
     """
-    if source != "DEM":
-        interesting_columns = []
-        for elt in args:
-            if elt == "bounds":
-                interesting_columns.append("geometry")
-            else:
-                interesting_columns.append(elt)
-        for elt in tile_list[interesting_columns].iterrows():
-            arguments = []
-            for arg in args:
-                if arg == "geometry":
-                    arguments.append(elt[1]["geometry"].wkt)
-                elif arg == "bounds":
-                    arguments.append(elt[1]["geometry"].bounds)
-                else:
-                    arguments.append(str(elt[1][arg]))
-            user_logger.info(message.format(source, *arguments))
+    args = build_assign_parser().parse_args(args=arguments)
+    from eotile import eotile_module
+
+    stats = eotile_module.assign_parcels(
+        args.parcels,
+        args.output,
+        args.source,
+        args.s2_overlap,
+        id_column=args.id_column,
+        keep_columns=args.keep_columns,
+        layer=args.layer,
+        min_overlap=args.min_overlap,
+        area_mode=args.area_mode,
+        chunk_size=args.chunk_size,
+        executor=None if args.executor == "none" else args.executor,
+        tmp_dirpath=args.tmp_dir,
+    )
+    _command_logger().info(
+        "Assigned %s parcels: %s (parcel, tile) pairs written to %s",
+        stats["parcels"], stats["pairs"], args.output,
+    )
+
+
+def add_geocoder_arguments(parser):
+    """Adds the arguments selecting the geocoding backend of the location inputs"""
+    parser.add_argument(
+        "-boundaries",
+        help="Resolve locations offline from this administrative boundary file (GeoPackage) "
+        "instead of Nominatim",
+    )
+    parser.add_argument(
+        "-boundary_name_column",
+        default="name",
+        help="Column of the location names in the boundary file",
+    )
+    parser.add_argument(
+        "-boundary_type_column",
+        help="Column of the location types in the boundary file, filtered by -location_type",
+    )
+    parser.add_argument(
+        "-nominatim_url",
+        help="Base URL of the Nominatim server, e.g. a local mirror",
+    )
+
+
+def build_geocoder(args):
+    """
+    Builds the geocoding backend selected by the arguments
+
+    :return: the backend, None for the default one
+    """
+    from eotile.eotiles.geocoders import BoundaryFileBackend, NominatimBackend
+
+    if args.boundaries is not None:
+        return BoundaryFileBackend(
+            Path(args.boundaries), args.boundary_name_column, args.boundary_type_column
+        )
+    if args.nominatim_url is not None:
+        return NominatimBackend(args.nominatim_url)
+    return None
+
+
+def _command_logger():
+    user_logger = logging.getLogger("user_logger")
+    if not user_logger.handlers:
+        user_logger.addHandler(logging.StreamHandler())
+        user_logger.setLevel(logging.INFO)
+    return user_logger
+
+
+@contextmanager
+def output_stream(logger_file=None):
+    """
+    Opens the stream the tiles are written to: standard output, or the logger file
+
+    :param logger_file: (Optional, default = None) File to append the output to
+    """
+    if logger_file is None:
+        yield sys.stdout
     else:
-        interesting_columns = ["EXIST_SRTM", "EXIST_COP30", "EXIST_COP90"]
-        for elt in args:
-            if elt == "bounds":
-                interesting_columns.append("geometry")
-            else:
-                interesting_columns.append(elt)
-        for elt in tile_list[interesting_columns].iterrows():
-            availability = []
-            if elt[1]["EXIST_SRTM"]:
-                availability.append("SRTM")
-            if elt[1]["EXIST_COP30"]:
-                availability.append("Copernicus 30")
-            if elt[1]["EXIST_COP90"]:
-                availability.append("Copernicus 90")
-            arguments = []
-            for arg in args:
-                if arg == "geometry":
-                    arguments.append(elt[1]["geometry"].wkt)
-                elif arg == "bounds":
-                    arguments.append(elt[1]["geometry"].bounds)
-                else:
-                    arguments.append(str(elt[1][arg]))
-            user_logger.info(message.format(", ".join(availability), *arguments))
+        with open(logger_file, "a", encoding="utf-8", buffering=OUTPUT_BUFFER_SIZE) as stream:
+            yield stream
+
+
+def log_summary(user_logger, tile_lists):
+    """
+    Logs the number of tiles of each source
+
+    :param user_logger: LOGGER to log the summary to
+    :param tile_lists: The tiles of each source
+    :type tile_lists: dict
+    """
+    user_logger.info("--- Summary ---")
+    for source, tile_list in tile_lists.items():
+        if len(tile_list) > 0:
+            user_logger.info("- %s %s Tiles", len(tile_list), source)
 
 
 def main(arguments=None):
@@ -177,8 +485,70 @@ def main(arguments=None):
 
     :param list arguments: list of arguments
     """
+    if arguments is None:
+        arguments = sys.argv[1:]
+    if arguments[:1] == ["cache"]:
+        return cache_main(arguments[1:])
+    if arguments[:1] == ["crossref"]:
+        return crossref_main(arguments[1:])
+    if arguments[:1] == ["serve"]:
+        return serve_main(arguments[1:])
+    if arguments[:1] == ["assign"]:
+        return assign_main(arguments[1:])
     arg_parser = build_parser()
     args = arg_parser.parse_args(args=arguments)
+    if args.batch is None and args.input is None:
+        arg_parser.error("the following arguments are required: input")
+    if args.batch is not None and args.input is not None:
+        arg_parser.error("an input cannot be given with -batch")
+    if args.batch is not None and (args.to_file is not None or args.to_location):
+        arg_parser.error("-batch writes to the standard output, not with -to_file or -to_location")
+    if args.profile is None:
+        return search_main(args)
+
+    from eotile.eotiles.profiling import profiling
+
+    recorder = profiling()
+    try:
+        with recorder:
+            return search_main(args)
+    finally:
+        write_profile(sys.stderr, recorder.profile, args.profile)
+
+
+def write_profile(stream, profile, profile_format="table"):
+    """
+    Writes the timings of the query stages
+
+    :param stream: The output stream
+    :param profile: The recorded profile
+    :type profile: eotile.eotiles.profiling.Profile
+    :param profile_format: (Optional, default = "table") "table" or "json"
+    """
+    if profile_format == "json":
+        import json
+
+        stream.write(json.dumps(profile.to_dict()) + "\n")
+    else:
+        stream.write(profile.format_table() + "\n")
+    stream.flush()
+
+
+def search_main(args):
+    """
+    Runs the tile search of the parsed command line and outputs the tiles
+
+    :param args: The parsed arguments
+    :return: the exit status of a batch, None otherwise
+    """
+    # Imported once the arguments are valid, so that --help and usage errors stay instant
+    from eotile import eotile_module
+    from eotile.eotiles.profiling import span
+
+    geocoder = build_geocoder(args)
+    if args.batch is not None:
+        return batch_main(args, geocoder)
+
     [tile_list_s2, tile_list_l8, tile_list_dem, tile_list_srtm5x5] = eotile_module.main(
         args.input,
         args.logger_file,
@@ -192,53 +562,55 @@ def main(arguments=None):
         args.threshold,
         args.verbose,
         args.s2_overlap,
+        None if args.executor == "none" else args.executor,
+        area_mode=args.area_mode,
+        geocoder=geocoder,
+        search_type=args.search_type,
+        geocode=not args.no_geocode,
+        aoi_mode=args.aoi_mode,
+        aoi_tolerance=args.aoi_tolerance,
+        cover=args.cover,
+        cover_budget=args.cover_budget,
     )
     tile_sources = ["S2", "L8", "DEM", "SRTM 5x5"]
     user_logger = logging.getLogger("user_logger")
 
     # Outputting the result
-    tile_lists = [tile_list_s2, tile_list_l8, tile_list_dem, tile_list_srtm5x5]
-    if args.to_file is not None:
-        output_path = Path(args.to_file)
-        for i, tile_list in enumerate(tile_lists):
-            source = tile_sources[i]
-            if len(tile_list) > 0:
-                if output_path.suffix == ".gpkg":
-                    # Using layers method to combine sources if geopackage
-                    write_tiles_bb(tile_list, output_path, source=source)
-                else:
-                    # Else, we split into several files
-                    write_tiles_bb(
-                        tile_list,
-                        output_path.with_name(
-                            output_path.stem + "_" + source + output_path.suffix
-                        ),
-                    )
-    elif args.to_wkt:
-        for i, tile_list in enumerate(tile_lists):
-            source = tile_sources[i]
-            if len(tile_list) > 0:
-                build_output(
-                    source, tile_list, user_logger, "[{}] Tile: {}", ["geometry"]
-                )
+    tile_lists = dict(
+        zip(tile_sources, [tile_list_s2, tile_list_l8, tile_list_dem, tile_list_srtm5x5])
+    )
+    n_tiles = sum(len(tile_list) for tile_list in tile_lists.values())
+    with span("write_output", tiles=n_tiles):
+        write_output(args, tile_lists, user_logger)
 
-    elif args.to_bbox:
-        for i, tile_list in enumerate(tile_lists):
-            source = tile_sources[i]
-            if len(tile_list) > 0:
-                build_output(
-                    source, tile_list, user_logger, "[{}] Tile Bounds: {}", ["bounds"]
-                )
 
-    elif args.to_tile_id:
-        for i, tile_list in enumerate(tile_lists):
-            source = tile_sources[i]
-            if len(tile_list) > 0:
-                build_output(source, tile_list, user_logger, "[{}] Tile id: {}", ["id"])
+def write_output(args, tile_lists, user_logger):
+    """
+    Writes the tiles to a file, to their locations or to the standard output
+
+    :param args: The parsed arguments
+    :param tile_lists: The tiles of each source
+    :type tile_lists: dict
+    :param user_logger: LOGGER the summaries are logged to
+    """
+    if args.to_file is not None:
+        from eotile.eotiles.eotiles import write_tile_lists_to_file
+
+        # Geopackages get a layer per source, other formats a file per source
+        # unless -single_file is set
+        write_tile_lists_to_file(
+            tile_lists,
+            Path(args.to_file),
+            single_file=args.single_file,
+            spatial_index=not args.no_spatial_index,
+        )
+        log_summary(user_logger, tile_lists)
 
     elif args.to_location:
+        from geopy.geocoders import Nominatim
+
         geolocator = Nominatim(user_agent="EOTile")
-        for tile_list in tile_lists:
+        for tile_list in tile_lists.values():
             if len(tile_list) > 0:
                 for elt in tile_list["geometry"]:
                     centroid = list(list(elt.centroid.coords)[0])
@@ -246,24 +618,87 @@ def main(arguments=None):
                     location = geolocator.reverse(centroid, language="en")
                     if location is not None:
                         user_logger.info(str(location))
+        log_summary(user_logger, tile_lists)
+
     else:
-        for i, tile_list in enumerate(tile_lists):
-            source = tile_sources[i]
-            if len(tile_list) > 0:
-                build_output(
-                    source,
-                    tile_list,
-                    user_logger,
-                    "[{} tile]\n {}\n {}",
-                    ["id", "geometry"],
-                )
-
-    # counts
-    user_logger.info("--- Summary ---")
-    for i, tile_list in enumerate(tile_lists):
-        source = tile_sources[i]
-        if len(tile_list) > 0:
-            user_logger.info("- %s %s Tiles", len(tile_list), source)
+        from eotile.eotiles.writers import write_tile_lists
+
+        with output_stream(args.logger_file) as stream:
+            write_tile_lists(stream, tile_lists, stdout_output(args), args.format)
+
+
+def stdout_output(args):
+    """What to write about each tile on the standard output: tile_id, bbox, wkt or default"""
+    if args.to_wkt:
+        return "wkt"
+    if args.to_bbox:
+        return "bbox"
+    if args.to_tile_id:
+        return "tile_id"
+    return "default"
+
+
+def batch_main(args, geocoder=None):
+    """
+    Runs the inputs of a batch, one per line, and writes the tiles of each line
+    tagged with its line number. Failing lines are reported on the standard error.
+
+    :param args: The parsed arguments, args.batch being the input file or "-"
+    :param geocoder: (Optional, default = None) Geocoding backend of the location inputs
+    :return: 1 when some lines failed, else 0
+    """
+    from eotile import eotile_module
+    from eotile.eotiles.profiling import span
+    from eotile.eotiles.writers import write_tile_lists
+
+    tile_sources = ["S2", "L8", "DEM", "SRTM 5x5"]
+    lines = sys.stdin if args.batch == "-" else open(args.batch, encoding="utf-8")
+    failed = 0
+    header = True
+    try:
+        results = eotile_module.search_lines(
+            lines,
+            args.jobs,
+            no_l8=args.no_l8,
+            no_s2=args.no_s2,
+            dem=args.dem,
+            srtm5x5=args.srtm5x5,
+            location_type=args.location_type,
+            min_overlap=args.min_overlap,
+            epsg=args.epsg,
+            threshold=args.threshold,
+            verbose=args.verbose,
+            overlap=args.s2_overlap,
+            executor=None if args.executor == "none" else args.executor,
+            area_mode=args.area_mode,
+            geocoder=geocoder,
+            search_type=args.search_type,
+            geocode=not args.no_geocode,
+            aoi_mode=args.aoi_mode,
+            aoi_tolerance=args.aoi_tolerance,
+            cover=args.cover,
+            cover_budget=args.cover_budget,
+        )
+        with output_stream(args.logger_file) as stream:
+            for number, result in results:
+                if isinstance(result, BaseException):
+                    failed += 1
+                    sys.stderr.write(f"[line {number}] Error: {result}\n")
+                    continue
+                with span("write_output", tiles=sum(len(elt) for elt in result)):
+                    write_tile_lists(
+                        stream,
+                        dict(zip(tile_sources, result)),
+                        stdout_output(args),
+                        args.format,
+                        line=number,
+                        header=header,
+                    )
+                header = False
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+    return 1 if failed else 0
 
 
 if __name__ == "__main__":
@@ -27,13 +27,222 @@ EO tile
 """
 
 import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-import pkg_resources
+import pandas as pd
+
+from eotile.eotiles import catalog, crossref, geocode_cache, grid_cache
+from eotile.eotiles.aoi_cover import prepare_aoi
+from eotile.eotiles.catalog import get_grid_filename
+from eotile.eotiles.eotiles import (
+    create_tiles_list_eo_from_features,
+    create_tiles_list_eo_from_geometries,
+    load_aoi_features,
+    load_aois,
+    parse_to_list,
+    query_sources,
+)
+from eotile.eotiles.get_bb_from_tile_id import (
+    build_reference_geom,
+    get_tiles_from_tile_id,
+    tile_id_matcher,
+)
+from eotile.eotiles.overlap import PLANAR
+from eotile.eotiles.profiling import span
+from eotile.eotiles.tile_cover import COVER_BUDGET, check_cover_method, minimal_cover
+from eotile.eotiles.utils import (
+    SEARCH_TYPES,
+    build_aoi_geometry,
+    build_logger,
+    input_matcher,
+    log_level,
+    treat_eotiles,
+)
+
+PACKAGE_DIRPATH = Path(__file__).resolve().parent
+
+
+def get_aux_data_dirpath() -> Path:
+    """
+    Returns the directory holding the tile grid files: EOTILE_AUX_DATA when set,
+    or else the one configured in config/data_path
+    """
+    if os.environ.get("EOTILE_AUX_DATA"):
+        return Path(os.environ["EOTILE_AUX_DATA"])
+    with open(PACKAGE_DIRPATH / "config" / "data_path") as conf_file:
+        data_path = conf_file.readline()
+
+    return PACKAGE_DIRPATH / data_path.strip()
+
+
+def _requested_sources(no_l8, no_s2, dem, srtm5x5):
+    sources = []
+    if not no_s2:
+        sources.append("S2")
+    if not no_l8:
+        sources.append("L8")
+    if dem:
+        sources.append("DEM")
+    if srtm5x5:
+        sources.append("SRTM 5x5")
+    return sources
+
+
+TILE_SOURCES = ["S2", "L8", "DEM", "SRTM 5x5"]
+
+
+def _reference_tiles(aux_data_dirpath, tile_ids, overlap):
+    """Source and merged footprint of the input tiles of a tile id search"""
+    flags = tile_id_matcher(tile_ids[0])
+    source = TILE_SOURCES[flags.index(True)]
+    filename = get_grid_filename(aux_data_dirpath, source, overlap)
+    return source, build_reference_geom(filename, tile_ids)[1]
+
+
+def _cover(tile_list, aoi, cover, area_mode, cover_budget):
+    """
+    Minimal cover of a tile list. Per feature lists, holding an "aoi_index" column,
+    get a cover of each feature of the aoi GeoDataFrame.
+    """
+    if len(tile_list) == 0:
+        return tile_list
+    if "aoi_index" not in tile_list.columns:
+        return minimal_cover(tile_list, aoi, cover, area_mode, cover_budget)
+    return pd.concat(
+        [
+            minimal_cover(
+                features_tiles, aoi.geometry.loc[index], cover, area_mode, cover_budget
+            )
+            for index, features_tiles in tile_list.groupby("aoi_index", sort=False)
+        ]
+    )
+
+
+def warm_up(no_l8=False, no_s2=False, dem=False, srtm5x5=False, overlap=False):
+    """
+    Loads the requested tile grids in memory and builds their spatial indexes,
+    so that the following queries of a long-running process do not pay for it
+
+    :param no_l8: [Optional, default = False] Do you want to ignore l8 tiles ?
+    :type no_l8: Boolean
+    :param no_s2: [Optional, default = False] Do you want to ignore s2 tiles ?
+    :type no_s2: Boolean
+    :param dem: [Optional, default = False] Do you want to use DEM tiles ?
+    :type dem: Boolean
+    :param srtm5x5: [Optional, default = False] Do you want to use specific SRTM 5x5 tiles ?
+    :type srtm5x5: Boolean
+    :param overlap: (Optional, default = False) Do you want to use the overlapping source file ?
+    :type overlap: Boolean
+    """
+    aux_data_dirpath = get_aux_data_dirpath()
+    catalog.warm_up(
+        get_grid_filename(aux_data_dirpath, source, overlap)
+        for source in _requested_sources(no_l8, no_s2, dem, srtm5x5)
+    )
+
+
+def _installed_grid_filenames():
+    aux_data_dirpath = get_aux_data_dirpath()
+    filenames = [
+        aux_data_dirpath / filename
+        for filename in [*catalog.GRID_FILENAMES.values(), catalog.S2_OVERLAP_FILENAME]
+    ]
+    return [filename for filename in filenames if filename.exists()]
+
+
+def warm_up_installed():
+    """
+    Loads all the installed tile grids in memory and builds their spatial indexes
+
+    :return: The paths of the loaded grid files
+    :rtype: list
+    """
+    filenames = _installed_grid_filenames()
+    catalog.warm_up(filenames)
+    return filenames
+
+
+def build_caches():
+    """
+    Builds the binary caches of all the installed tile grids.
+    Later runs read the grids from these caches, until the grid files change.
+
+    :return: The paths of the cache directories
+    :rtype: list
+    """
+    cache_dirpaths = []
+    for filename in _installed_grid_filenames():
+        cache_dirpaths.append(grid_cache.build_cache(filename))
+        catalog.clear_catalogs(filename)
+    return cache_dirpaths
+
+
+def clear_caches():
+    """
+    Removes the binary caches of all the installed tile grids
+
+    :return: The paths of the grid files whose cache was removed
+    :rtype: list
+    """
+    filenames = [
+        filename for filename in _installed_grid_filenames() if grid_cache.clear_cache(filename)
+    ]
+    for filename in filenames:
+        catalog.clear_catalogs(filename)
+    return filenames
+
+
+def clear_geocode_cache():
+    """
+    Removes the cached location requests
+
+    :return: The number of removed requests
+    :rtype: int
+    """
+    cache = geocode_cache.get_geocode_cache()
+    return cache.clear() if cache is not None else 0
+
+
+def build_crossref():
+    """
+    Builds the cross-reference table of the installed tile grids, used to answer
+    tile id queries without spatial queries
+
+    :return: The path of the table
+    :rtype: Path
+    """
+    return crossref.build_crossref(get_aux_data_dirpath())
+
+
+def assign_parcels(
+    filename_parcels,
+    output_filename,
+    tile_source="S2",
+    overlap=False,
+    **kwargs,
+):
+    """
+    Assigns the parcels of a large vector dataset to the tiles of an installed grid,
+    streaming the parcels so that memory stays bounded
+
+    :param filename_parcels: Path to the parcels: a vector file, or a GeoParquet file
+    :param output_filename: Path to the (parcel, tile) table: .csv or .parquet
+    :param tile_source: (Optional, default = "S2") Tile source: "S2", "L8", "DEM", "SRTM 5x5"
+    :param overlap: (Optional, default = False) Use the overlapping S2 grid
+    :param kwargs: Options of :func:`eotile.eotiles.parcels.assign_parcels`
+    :return: the number of parcels, of partitions and of pairs written
+    :rtype: dict
+    """
+    from eotile.eotiles import parcels
+
+    filename_tiles_list = get_grid_filename(get_aux_data_dirpath(), tile_source, overlap)
+    return parcels.assign_parcels(
+        Path(filename_parcels), filename_tiles_list, Path(output_filename), **kwargs
+    )
 
-from eotile.eotiles.eotiles import parse_to_list
-from eotile.eotiles.get_bb_from_tile_id import get_tiles_from_tile_id
-from eotile.eotiles.utils import build_logger, input_matcher, treat_eotiles
 
 def from_tile_id(tile_id,
     no_l8=False,
@@ -44,14 +253,7 @@ def from_tile_id(tile_id,
     overlap=False,
 ):
 
-    with open(
-        pkg_resources.resource_filename(__name__, "config/data_path")
-    ) as conf_file:
-        data_path = conf_file.readline()
-
-    aux_data_dirpath = Path(
-        pkg_resources.resource_filename(__name__, data_path.strip())
-    )
+    aux_data_dirpath = get_aux_data_dirpath()
 
     (
         tile_list_s2,
@@ -84,6 +286,17 @@ def main(
     threshold=None,
     verbose=None,
     overlap=False,
+    executor="thread",
+    timings=None,
+    area_mode="planar",
+    geocoder=None,
+    search_type=None,
+    geocode=True,
+    aoi_mode="first",
+    aoi_tolerance=None,
+    cover=None,
+    cover_budget=COVER_BUDGET,
+    configure_logging=True,
 ):
     """
     Main module of eotile
@@ -118,27 +331,64 @@ def main(
     :type verbose: Integer
     :param overlap: (Optional, default = False) Do you want to use the overlapping source file ?
     :type overlap: Boolean
+    :param executor: (Optional, default = "thread") Run the queries of the tile sources
+    concurrently in a "thread" or "process" pool, or one after another with None
+    :type executor: Str
+    :param timings: (Optional, default = None) Filled with the wall time of each tile source
+    query, in seconds
+    :type timings: dict
+    :param area_mode: (Optional, default = "planar") Areas used for min_overlap: "planar"
+    (square degrees) or "geodesic"
+    :type area_mode: Str
+    :param geocoder: (Optional, default = None) Geocoding backend of the location inputs,
+    the one configured by EOTILE_GEOCODER when None
+    :type geocoder: GeocodingBackend
+    :param search_type: (Optional, default = None) Type of input_arg: "tile_id", "wkt", "geojson",
+    "wkb", "point", "bbox", "file" or "location", induced from input_arg when None
+    :type search_type: Str
+    :param geocode: (Optional, default = True) When the search type is induced, check
+    with the geocoding backend that unrecognized inputs are locations
+    :type geocode: Boolean
+    :param aoi_mode: (Optional, default = "first") For AOI files: "first" to query the first
+    feature, "union" for the union of the features, "features" to query each feature in the
+    pool of the executor, the tiles then carry the index and the attributes of their feature
+    :type aoi_mode: Str
+    :param aoi_tolerance: (Optional, default = None) Decompose the AOI into a quad cover, so that
+    only the tiles on its boundary are intersected, simplifying its boundary with this error in
+    degrees (0 to keep it exact). When None, only AOIs of more than 20000 vertices are
+    decomposed, exactly.
+    :type aoi_tolerance: Float
+    :param cover: (Optional, default = None) Only keep a minimal set of the tiles of each source
+    still covering the AOI: "greedy", or "optimal" for the fewest tiles found within
+    cover_budget. The area of the AOI covered by each kept tile only is reported in the
+    "unique_area" and "unique_fraction" columns. For tile ids, the input tiles are the AOI.
+    :type cover: Str
+    :param cover_budget: (Optional, default = 10000) Search nodes of the "optimal" cover
+    :type cover_budget: Integer
+    :param configure_logging: (Optional, default = True) Set the handlers of the loggers from
+    verbose and logger_file. False leaves them as they are, e.g. configured once by a server
+    or a batch running main in several threads.
+    :type configure_logging: Boolean
     """
-    if verbose is None:  # Default, no file
-        log_level = logging.ERROR
-    elif verbose == 1:  # Else, in a file
-        log_level = logging.WARNING
-    elif verbose == 2:
-        log_level = logging.INFO
+    if cover is not None:
+        check_cover_method(cover)
+    if configure_logging:
+        dev_logger, user_logger = build_logger(log_level(verbose), logger_file)
     else:
-        log_level = logging.DEBUG
-    dev_logger, user_logger = build_logger(log_level, logger_file)
-
-    with open(
-        pkg_resources.resource_filename(__name__, "config/data_path")
-    ) as conf_file:
-        data_path = conf_file.readline()
+        dev_logger, user_logger = logging.getLogger("dev_logger"), logging.getLogger("user_logger")
 
-    aux_data_dirpath = Path(
-        pkg_resources.resource_filename(__name__, data_path.strip())
-    )
+    aux_data_dirpath = get_aux_data_dirpath()
     tile_list_s2, tile_list_l8, tile_list_dem, tile_list_srtm5x5 = [], [], [], []
-    induced_type = input_matcher(input_arg)
+    # AOI of the minimal covers, and source of the input tiles of a tile id search
+    aoi, reference_source = None, None
+    if search_type is None:
+        with span("classify_input") as stage:
+            induced_type = input_matcher(input_arg, geocoder, geocode)
+            stage.count(type=induced_type)
+    elif search_type in SEARCH_TYPES:
+        induced_type = search_type
+    else:
+        raise ValueError(f"Unknown search type {search_type}, expected one of {SEARCH_TYPES}")
 
     if induced_type == "tile_id":
         (
@@ -155,73 +405,63 @@ def main(
             srtm5x5,
             min_overlap,
             overlap,
+            executor,
+            timings,
+            area_mode,
         )
-    else:
-        if not no_s2:
-            # S2 Tiles
-            if not overlap:
-                filename_tiles_s2 = aux_data_dirpath / "s2_no_overlap.gpkg"
-            else:
-                filename_tiles_s2 = aux_data_dirpath / "s2_with_overlap.gpkg"
-            tile_list_s2 = treat_eotiles(
-                induced_type,
-                input_arg,
-                "S2",
-                dev_logger,
-                epsg,
-                filename_tiles_s2,
-                min_overlap,
-                location_type,
-                threshold,
+        if cover is not None:
+            reference_source, aoi = _reference_tiles(
+                aux_data_dirpath, parse_to_list(input_arg), overlap
             )
-
-        if not no_l8:
-            # L8 Tiles
-            filename_tiles_l8 = aux_data_dirpath / "l8_tiles.gpkg"
-            tile_list_l8 = treat_eotiles(
-                induced_type,
-                input_arg,
-                "L8",
-                dev_logger,
-                epsg,
-                filename_tiles_l8,
+    elif induced_type == "file" and aoi_mode == "features":
+        features = aoi = load_aoi_features(Path(input_arg))
+        tile_lists = {
+            source: create_tiles_list_eo_from_features(
+                get_grid_filename(aux_data_dirpath, source, overlap),
+                features,
                 min_overlap,
-                location_type,
-                threshold,
+                area_mode,
+                executor,
             )
-
-        if dem:
-            # SRTM Tiles
-            filename_tiles_dem = aux_data_dirpath / "DEM_Union.gpkg"
-            tile_list_dem = treat_eotiles(
-                induced_type,
-                input_arg,
-                "DEM",
-                dev_logger,
-                epsg,
-                filename_tiles_dem,
-                min_overlap,
-                location_type,
-                threshold,
+            for source in _requested_sources(no_l8, no_s2, dem, srtm5x5)
+        }
+        tile_list_s2 = tile_lists.get("S2", [])
+        tile_list_l8 = tile_lists.get("L8", [])
+        tile_list_dem = tile_lists.get("DEM", [])
+        tile_list_srtm5x5 = tile_lists.get("SRTM 5x5", [])
+    else:
+        # The AOI is parsed and reprojected once for all the tile sources
+        geom = build_aoi_geometry(
+            induced_type, input_arg, epsg, location_type, threshold, geocoder, aoi_mode
+        )
+        if geom is None:
+            dev_logger.error("Unrecognized Option: %s", induced_type)
+        else:
+            aoi = geom
+            # Large AOIs are decomposed once for all the tile sources
+            geom = prepare_aoi(geom, aoi_tolerance)
+            filenames = {
+                source: get_grid_filename(aux_data_dirpath, source, overlap)
+                for source in _requested_sources(no_l8, no_s2, dem, srtm5x5)
+            }
+            tile_lists = query_sources(
+                filenames, geom, min_overlap, executor, timings, area_mode
             )
+            tile_list_s2 = tile_lists.get("S2", [])
+            tile_list_l8 = tile_lists.get("L8", [])
+            tile_list_dem = tile_lists.get("DEM", [])
+            tile_list_srtm5x5 = tile_lists.get("SRTM 5x5", [])
 
-        if srtm5x5:
-            # Copernicus Tiles
-            filename_tiles_srtm5x5 = aux_data_dirpath / "srtm5x5_tiles.gpkg"
-            tile_list_srtm5x5 = treat_eotiles(
-                induced_type,
-                input_arg,
-                "SRTM 5x5",
-                dev_logger,
-                epsg,
-                filename_tiles_srtm5x5,
-                min_overlap,
-                location_type,
-                threshold,
-            )
+    tile_lists = [tile_list_s2, tile_list_l8, tile_list_dem, tile_list_srtm5x5]
+    if cover is not None and aoi is not None:
+        tile_lists = [
+            tile_list if source == reference_source
+            else _cover(tile_list, aoi, cover, area_mode, cover_budget)
+            for source, tile_list in zip(TILE_SOURCES, tile_lists)
+        ]
     #
     # Outputting the result
-    return [tile_list_s2, tile_list_l8, tile_list_dem, tile_list_srtm5x5]
+    return tile_lists
 
 
 def quick_search(
@@ -233,6 +473,9 @@ def quick_search(
     epsg=None,
     threshold=None,
     overlap=False,
+    cover=None,
+    cover_budget=COVER_BUDGET,
+    configure_logging=True,
 ):
 
     """
@@ -241,7 +484,8 @@ def quick_search(
 
     :param input_arg:  Choose amongst : a file, a tile_id, a location, a wkt, a bbox
     :type input_arg: Str
-    :param search_type: Precise the input_arg type : "tile_id", "wkt", "location", "bbox", "file"
+    :param search_type: Precise the input_arg type : "tile_id", "wkt", "geojson", "wkb", "point",
+    "location", "bbox", "file"
     :type search_type: Str
     :param tile_source: Precise the requested output type : "S2", "L8", "SRTM", "Copernicus"
     :type tile_source: Str
@@ -258,22 +502,22 @@ def quick_search(
     :type location_type: Str
     :param overlap: (Optional, default = False) Do you want to use the overlapping source file ?
     :type overlap: Boolean
+    :param cover: (Optional, default = None) Only keep a minimal set of tiles still covering
+    the AOI: "greedy" or "optimal", see :func:`main`
+    :type cover: Str
+    :param cover_budget: (Optional, default = 10000) Search nodes of the "optimal" cover
+    :type cover_budget: Integer
+    :param configure_logging: (Optional, default = True) Set the handlers of the loggers,
+    see :func:`main`
+    :type configure_logging: Boolean
     """
-    with open(
-        pkg_resources.resource_filename(__name__, "config/data_path")
-    ) as conf_file:
-        data_path = conf_file.readline()
-    aux_data_dirpath = Path(
-        pkg_resources.resource_filename(__name__, data_path.strip())
-    )
-    filenames = []
-    if not overlap:
-        filenames.append(aux_data_dirpath / "s2_no_overlap.gpkg")
-    else:
-        filenames.append(aux_data_dirpath / "s2_with_overlap.gpkg")
-    filenames.append(aux_data_dirpath / "l8_tiles.gpkg")
-    filenames.append(aux_data_dirpath / "DEM_Union.gpkg")
-    filenames.append(aux_data_dirpath / "srtm5x5_tiles.gpkg")
+    if cover is not None:
+        check_cover_method(cover)
+    aux_data_dirpath = get_aux_data_dirpath()
+    filenames = [
+        get_grid_filename(aux_data_dirpath, source, overlap)
+        for source in ["S2", "L8", "DEM", "SRTM 5x5"]
+    ]
     positioning_dict = {"S2": 0, "L8": 1, "DEM": 2, "SRTM 5x5": 3}
     if search_type == "tile_id":
         ret = get_tiles_from_tile_id(
@@ -286,9 +530,18 @@ def quick_search(
             min_overlap,
             overlap,
         )
-        return ret[positioning_dict[tile_source]]
+        tile_list = ret[positioning_dict[tile_source]]
+        if cover is not None:
+            reference_source, aoi = _reference_tiles(
+                aux_data_dirpath, parse_to_list(input_arg), overlap
+            )
+            if tile_source != reference_source:
+                tile_list = _cover(tile_list, aoi, cover, PLANAR, cover_budget)
+        return tile_list
     else:
-        dev_logger, user_logger = build_logger(logging.ERROR, None)
+        dev_logger = logging.getLogger("dev_logger")
+        if configure_logging:
+            dev_logger, _ = build_logger(logging.ERROR, None)
         return treat_eotiles(
             search_type,
             input_arg,
@@ -299,4 +552,106 @@ def quick_search(
             min_overlap,
             location_type,
             threshold,
+            cover,
+            cover_budget,
         )
+
+
+def batch_search(
+    aois,
+    no_l8=False,
+    no_s2=False,
+    dem=False,
+    srtm5x5=False,
+    min_overlap=None,
+    epsg=None,
+    overlap=False,
+    area_mode="planar",
+):
+    """
+    Batch search of many AOIs at once
+    Each grid is joined with all the AOIs in a single bulk spatial join
+
+    :param aois: The AOIs: a GeoDataFrame, a GeoSeries or an iterable of wkt strings
+    :type aois: Union[gp.GeoDataFrame, gp.GeoSeries, Iterable[str]]
+    :param min_overlap: [Optional, default = None] Minimum percentage of overlap to
+    consider a tile (0 to 1), applied to each (AOI, tile) pair
+    :type min_overlap: Str
+    :param epsg: [Optional, default = "4326"] Specify the epsg of the AOIs without CRS
+    :type epsg: Str
+    :param no_l8: [Optional, default = False] Do you want to ignore l8 tiles ?
+    :type no_l8: Boolean
+    :param no_s2: [Optional, default = False] Do you want to ignore s2 tiles ?
+    :type no_s2: Boolean
+    :param dem: [Optional, default = False] Do you want to use DEM tiles ?
+    :type dem: Boolean
+    :param srtm5x5: [Optional, default = False] Do you want to use specific SRTM 5x5 tiles ?
+    :type srtm5x5: Boolean
+    :param overlap: (Optional, default = False) Do you want to use the overlapping source file ?
+    :type overlap: Boolean
+    :param area_mode: (Optional, default = "planar") Areas used for min_overlap: "planar"
+    (square degrees) or "geodesic"
+    :type area_mode: Str
+    :return: A long-form DataFrame with the aoi_index, source and id columns, and the overlap
+    column when min_overlap is set
+    :rtype: pd.DataFrame
+    """
+    aux_data_dirpath = get_aux_data_dirpath()
+    geoms = load_aois(aois, epsg)
+
+    outputs = []
+    for source in _requested_sources(no_l8, no_s2, dem, srtm5x5):
+        output = create_tiles_list_eo_from_geometries(
+            get_grid_filename(aux_data_dirpath, source, overlap), geoms, min_overlap, area_mode
+        )
+        output.insert(1, "source", source)
+        outputs.append(output)
+    if not outputs:
+        return pd.DataFrame(columns=["aoi_index", "source", "id"])
+    return pd.concat(outputs, ignore_index=True)
+
+
+def _search_line(number, input_arg, kwargs):
+    try:
+        return number, main(input_arg, **kwargs)
+    except (Exception, SystemExit) as error:  # pylint: disable=broad-except
+        # A bad line does not stop the batch
+        return number, error
+
+
+def search_lines(lines, jobs=1, **kwargs):
+    """
+    Runs main on each line of a batch, reusing the loaded tile grids.
+    Blank lines and lines starting with # are skipped.
+
+    :param lines: The input lines, e.g. an open file or sys.stdin
+    :type lines: Iterable[str]
+    :param jobs: (Optional, default = 1) Number of lines processed in parallel, in threads.
+    The results are yielded in the input order whatever the number of jobs.
+    :type jobs: Integer
+    :param kwargs: Arguments of main
+    :return: an iterator of (line number, result), the result being the four tile lists
+    returned by main, or the exception raised by the line
+    :rtype: Iterator[Tuple[int, Union[list, BaseException]]]
+    """
+    # Configured once, rather than by each line run in the pool
+    build_logger(log_level(kwargs.get("verbose")), kwargs.get("logger_file"))
+    kwargs = dict(kwargs, configure_logging=False)
+    numbered = (
+        (number, line.strip())
+        for number, line in enumerate(lines, 1)
+        if line.strip() and not line.lstrip().startswith("#")
+    )
+    if jobs <= 1:
+        for number, input_arg in numbered:
+            yield _search_line(number, input_arg, kwargs)
+        return
+    # A bounded window of lines in flight, so that large inputs are streamed
+    with ThreadPoolExecutor(jobs, thread_name_prefix="eotile-batch") as pool:
+        pending = deque()
+        for number, input_arg in numbered:
+            pending.append(pool.submit(_search_line, number, input_arg, kwargs))
+            if len(pending) >= 2 * jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,492 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+EO tile HTTP/JSON query service
+
+A long-running asyncio server answering the queries of :func:`eotile_module.main`
+and :func:`eotile_module.quick_search`. The tile grids are loaded once, in each
+worker of the pool running the spatial work, and stay in memory between requests.
+
+Routes:
+
+* POST /search: body with the arguments of main, "input" being the input argument
+* POST /quick_search: body with the arguments of quick_search
+* POST /tile_id: body with "ids", a list of tile ids, and the tile sources of main
+* GET /health
+* GET /metrics: request counts and latencies of each route
+
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from eotile import eotile_module
+from eotile.eotiles.geocoders import GeocodingBackend, set_geocoder
+from eotile.eotiles.utils import build_logger
+from eotile.eotiles.writers import OUTPUT_FIELDS, tile_records
+
+LOGGER = logging.getLogger("dev_logger")
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+MAX_BODY_SIZE = 16 * 1024 * 1024
+# Latencies kept per route to compute the percentiles
+METRICS_WINDOW = 2048
+TILE_SOURCES = ["S2", "L8", "DEM", "SRTM 5x5"]
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+# Arguments accepted by each query route, with their type
+SEARCH_ARGUMENTS = {
+    "input": str,
+    "search_type": str,
+    "no_l8": bool,
+    "no_s2": bool,
+    "dem": bool,
+    "srtm5x5": bool,
+    "location_type": str,
+    "min_overlap": str,
+    "epsg": str,
+    "threshold": str,
+    "overlap": bool,
+    "area_mode": str,
+    "output": str,
+}
+QUICK_SEARCH_ARGUMENTS = {
+    "input": str,
+    "search_type": str,
+    "tile_source": str,
+    "location_type": str,
+    "min_overlap": str,
+    "epsg": str,
+    "threshold": str,
+    "overlap": bool,
+    "output": str,
+}
+TILE_ID_ARGUMENTS = {
+    "ids": list,
+    "no_l8": bool,
+    "no_s2": bool,
+    "dem": bool,
+    "srtm5x5": bool,
+    "min_overlap": str,
+    "overlap": bool,
+    "area_mode": str,
+    "output": str,
+}
+
+
+class HTTPError(Exception):
+    """Error answered to the client with an HTTP status"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def parse_arguments(params: dict, accepted: Dict[str, type]) -> dict:
+    """
+    Checks and converts the arguments of a query
+
+    :param params: The arguments, from a JSON body or a query string
+    :param accepted: The accepted arguments and their types
+    :return: the converted arguments
+    :raises HTTPError: on unknown or invalid arguments
+    """
+    unknown = set(params) - set(accepted)
+    if unknown:
+        raise HTTPError(400, f"Unknown arguments: {', '.join(sorted(unknown))}")
+    arguments = {}
+    for name, value in params.items():
+        expected = accepted[name]
+        if value is None:
+            arguments[name] = None
+        elif expected is bool:
+            arguments[name] = value if isinstance(value, bool) else str(value).lower() in (
+                "1", "true", "yes"
+            )
+        elif expected is list:
+            arguments[name] = value if isinstance(value, list) else str(value).split(",")
+        else:
+            arguments[name] = str(value)
+    output = arguments.get("output")
+    if output is not None and output not in OUTPUT_FIELDS:
+        raise HTTPError(400, f"Unknown output {output}, expected one of {list(OUTPUT_FIELDS)}")
+    return arguments
+
+
+def _records(tile_lists: Dict[str, list], output: str) -> dict:
+    tiles = {
+        source: tile_records(tile_list, source, output)
+        for source, tile_list in tile_lists.items()
+        if len(tile_list) > 0
+    }
+    return {"tiles": tiles, "counts": {source: len(records) for source, records in tiles.items()}}
+
+
+def _as_value_error(function: Callable, arguments: dict) -> dict:
+    # Invalid tile ids exit the CLI, they are reported as invalid requests here
+    try:
+        return function(**arguments)
+    except SystemExit as error:
+        raise ValueError(str(error)) from None
+
+
+def _search(**arguments) -> dict:
+    output = arguments.pop("output", None) or "default"
+    if "input" not in arguments:
+        raise ValueError("Missing argument: input")
+    arguments["configure_logging"] = False
+    tile_lists = eotile_module.main(arguments.pop("input"), **arguments)
+    return _records(dict(zip(TILE_SOURCES, tile_lists)), output)
+
+
+def _quick_search(**arguments) -> dict:
+    output = arguments.pop("output", None) or "default"
+    missing = {"input", "search_type", "tile_source"} - set(arguments)
+    if missing:
+        raise ValueError(f"Missing arguments: {', '.join(sorted(missing))}")
+    tile_source = arguments["tile_source"]
+    if tile_source not in TILE_SOURCES:
+        raise ValueError(f"Unknown tile source {tile_source}, expected one of {TILE_SOURCES}")
+    arguments["configure_logging"] = False
+    tile_list = eotile_module.quick_search(
+        arguments.pop("input"), arguments.pop("search_type"), arguments.pop("tile_source"),
+        **arguments
+    )
+    return _records({tile_source: tile_list}, output)
+
+
+def _tile_id(**arguments) -> dict:
+    if not arguments.get("ids"):
+        raise ValueError("Missing argument: ids")
+    ids = [str(tile_id).strip() for tile_id in arguments.pop("ids")]
+    return _search(input=", ".join(ids), search_type="tile_id", **arguments)
+
+
+def run_query(route: str, arguments: dict) -> dict:
+    """
+    Runs a query, in a worker of the pool
+
+    :param route: "search", "quick_search" or "tile_id"
+    :param arguments: The arguments of the query
+    :return: the tiles of each source, as JSON records, and their counts
+    """
+    function = {"search": _search, "quick_search": _quick_search, "tile_id": _tile_id}[route]
+    return _as_value_error(function, arguments)
+
+
+def init_worker(geocoder: Optional[GeocodingBackend] = None, warm_up: bool = True) -> None:
+    """
+    Prepares a worker: sets the loggers and the geocoding backend, and loads the installed
+    tile grids. The queries then leave the loggers as they are.
+
+    :param geocoder: (Optional, default = None) Geocoding backend of the location inputs
+    :param warm_up: (Optional, default = True) Load the tile grids and their indexes
+    """
+    build_logger(logging.ERROR)
+    if geocoder is not None:
+        set_geocoder(geocoder)
+    if warm_up:
+        eotile_module.warm_up_installed()
+
+
+class LatencyMetrics:
+    """
+    Request counts and latency percentiles of each route, over the last requests
+
+    :param window: (Optional, default = 2048) Number of latencies kept per route
+    """
+
+    def __init__(self, window: int = METRICS_WINDOW):
+        self.window = window
+        self.started = time.time()
+        self.in_flight = 0
+        self._routes: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, route: str, seconds: float, status: int) -> None:
+        """Records the latency and status of a request"""
+        with self._lock:
+            metrics = self._routes.setdefault(
+                route, {"count": 0, "errors": 0, "latencies": deque(maxlen=self.window)}
+            )
+            metrics["count"] += 1
+            metrics["errors"] += status >= 400
+            metrics["latencies"].append(seconds)
+
+    def snapshot(self) -> dict:
+        """
+        :return: the uptime, the requests in flight, and for each route the request and error
+        counts with the mean, median, 95th and 99th percentiles and max latencies in ms
+        """
+        routes = {}
+        with self._lock:
+            for route, metrics in self._routes.items():
+                latencies = sorted(metrics["latencies"])
+
+                def percentile(rank, values=latencies):
+                    position = min(len(values) - 1, int(round(rank * (len(values) - 1))))
+                    return round(values[position] * 1000, 3)
+
+                routes[route] = {
+                    "count": metrics["count"],
+                    "errors": metrics["errors"],
+                    "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+                    "p50_ms": percentile(0.5),
+                    "p95_ms": percentile(0.95),
+                    "p99_ms": percentile(0.99),
+                    "max_ms": round(latencies[-1] * 1000, 3),
+                }
+        return {
+            "uptime_s": round(time.time() - self.started, 3),
+            "in_flight": self.in_flight,
+            "routes": routes,
+        }
+
+
+class EOTileServer:
+    """
+    Asyncio HTTP/JSON server of the tile queries
+
+    :param host: (Optional, default = "127.0.0.1") Address to listen on
+    :param port: (Optional, default = 8080) Port to listen on, 0 for any free port
+    :param workers: (Optional, default = None) Size of the worker pool,
+    the number of CPUs (4 at most) when None
+    :param executor: (Optional, default = "process") Worker pool running the queries:
+    "process" for CPU parallelism, or "thread"
+    :param geocoder: (Optional, default = None) Geocoding backend of the location inputs
+    :param warm_up: (Optional, default = True) Load the installed tile grids at startup
+    """
+
+    def __init__(
+        self,
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        workers: Optional[int] = None,
+        executor: str = "process",
+        geocoder: Optional[GeocodingBackend] = None,
+        warm_up: bool = True,
+    ):
+        if executor not in ("process", "thread"):
+            raise ValueError(f"Unknown executor {executor}, expected process or thread")
+        self.host = host
+        self.port = port
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.executor = executor
+        self.geocoder = geocoder
+        self.warm_up = warm_up
+        self.metrics = LatencyMetrics()
+        self._pool: Optional[Executor] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._routes = {
+            ("GET", "/health"): self._health,
+            ("GET", "/metrics"): self._metrics,
+            ("POST", "/search"): self._query("search", SEARCH_ARGUMENTS),
+            ("GET", "/search"): self._query("search", SEARCH_ARGUMENTS),
+            ("POST", "/quick_search"): self._query("quick_search", QUICK_SEARCH_ARGUMENTS),
+            ("POST", "/tile_id"): self._query("tile_id", TILE_ID_ARGUMENTS),
+        }
+
+    async def start(self) -> None:
+        """Starts the worker pool, loads the grids and starts listening"""
+        if self.executor == "process":
+            self._pool = ProcessPoolExecutor(
+                self.workers, initializer=init_worker, initargs=(self.geocoder, self.warm_up)
+            )
+        else:
+            self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="eotile-server")
+            # The catalogs are shared by the threads
+            init_worker(self.geocoder, False)
+        loop = asyncio.get_running_loop()
+        if self.executor == "thread" and self.warm_up:
+            await loop.run_in_executor(self._pool, eotile_module.warm_up_installed)
+        elif self.executor == "process":
+            # Starts every worker now rather than on the first requests
+            await asyncio.gather(
+                *(loop.run_in_executor(self._pool, time.sleep, 0.05) for _ in range(self.workers))
+            )
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        LOGGER.info("Serving on http://%s:%s with %s %s workers",
+                    self.host, self.port, self.workers, self.executor)
+
+    async def close(self) -> None:
+        """Stops listening and shuts the worker pool down"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._pool is not None:
+            # Waits for the running queries without blocking the event loop
+            await asyncio.get_running_loop().run_in_executor(None, self._pool.shutdown, True)
+        if self.executor == "thread" and self.geocoder is not None:
+            set_geocoder(None)
+
+    async def serve_forever(self) -> None:
+        """Starts the server and serves until cancelled"""
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def _health(self, params: dict) -> dict:
+        return {"status": "ok"}
+
+    async def _metrics(self, params: dict) -> dict:
+        return self.metrics.snapshot()
+
+    def _query(self, route: str, accepted: Dict[str, type]):
+        async def handler(params: dict) -> dict:
+            arguments = parse_arguments(params, accepted)
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(self._pool, run_query, route, arguments)
+            except (ValueError, TypeError, KeyError) as error:
+                raise HTTPError(400, str(error)) from error
+
+        return handler
+
+    async def _dispatch(self, method: str, target: str, body: bytes) -> Tuple[int, dict]:
+        url = urlsplit(target)
+        handler = self._routes.get((method, url.path))
+        if handler is None:
+            if any(path == url.path for _, path in self._routes):
+                raise HTTPError(405, f"Method {method} not allowed on {url.path}")
+            raise HTTPError(404, f"Unknown route {url.path}")
+        params = dict(parse_qsl(url.query))
+        if body:
+            try:
+                params.update(json.loads(body))
+            except (ValueError, TypeError) as error:
+                raise HTTPError(400, f"Invalid JSON body: {error}") from error
+        return 200, await handler(params)
+
+    async def _respond(self, method: str, target: str, body: bytes) -> Tuple[int, dict]:
+        self.metrics.in_flight += 1
+        try:
+            return await self._dispatch(method, target, body)
+        except HTTPError as error:
+            return error.status, {"error": error.message}
+        except Exception as error:  # pylint: disable=broad-except
+            LOGGER.exception("Request %s %s failed", method, target)
+            return 500, {"error": f"{type(error).__name__}: {error}"}
+        finally:
+            self.metrics.in_flight -= 1
+
+    def _route_name(self, method: str, target: str) -> str:
+        # Unknown routes share a single entry, so that clients cannot grow the metrics
+        route = (method, urlsplit(target).path)
+        return " ".join(route) if route in self._routes else "unmatched"
+
+    @staticmethod
+    def _write(writer, status: int, payload: dict, keep_alive: bool, seconds: float) -> None:
+        content = json.dumps(payload).encode()
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(content)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            f"X-Response-Time-Ms: {seconds * 1000:.3f}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + content)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                start = time.perf_counter()
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    self._write(writer, 400, {"error": "Malformed request line"}, False, 0.0)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = (
+                    version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                )
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    self._write(writer, 400, {"error": "Invalid Content-Length"}, False, 0.0)
+                    break
+                if length > MAX_BODY_SIZE:
+                    self._write(writer, 413, {"error": "Request body too large"}, False, 0.0)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await self._respond(method, target, body)
+                seconds = time.perf_counter() - start
+                self._write(writer, status, payload, keep_alive, seconds)
+                await writer.drain()
+                self.metrics.record(self._route_name(method, target), seconds, status)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+def serve(
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    workers: Optional[int] = None,
+    executor: str = "process",
+    geocoder: Optional[GeocodingBackend] = None,
+    warm_up: bool = True,
+) -> None:
+    """
+    Runs the query service until interrupted, see :class:`EOTileServer`
+    """
+    server = EOTileServer(host, port, workers, executor, geocoder, warm_up)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
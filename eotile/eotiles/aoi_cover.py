@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Quad cover of large AOIs
+
+Country-scale polygons have hundreds of thousands of vertices, and every tile
+intersection pays for all of them. Such an AOI is decomposed on a quad grid
+aligned on the whole world: each cell is either inside the AOI, outside, or
+on its boundary, where it holds the small piece of the AOI it clips. Cells are
+split until their piece is small enough.
+
+Tiles touching inside cells only are then known to be inside without any
+geometric work, tiles touching no cell are outside, and the exact intersection
+is computed for the boundary tiles only, against the few pieces around them.
+Since the cells do not overlap, the planar overlap of a tile is the sum of
+its overlaps with the cells and the pieces.
+
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+import logging
+from typing import List, Optional, Sequence, Tuple
+
+import geopandas as gp
+import numpy as np
+from geopandas.array import GeometryArray, from_shapely
+from shapely.geometry import MultiPolygon, Polygon, box
+from shapely.ops import clip_by_rect, unary_union
+
+from eotile.eotiles.overlap import PLANAR, geometry_areas
+from eotile.eotiles.profiling import span
+
+LOGGER = logging.getLogger("dev_logger")
+
+# AOIs with more vertices are decomposed even without tolerance
+DECOMPOSE_MIN_VERTICES = 20000
+# Boundary cells are split until their piece has at most this number of vertices
+MAX_PIECE_VERTICES = 256
+# Cells of the deepest level are 360 / 2 ** 24 degrees wide, about 2 m
+MAX_LEVEL = 24
+# The world cell, square so that all the cells are
+WORLD_BOUNDS = (-180.0, -180.0, 180.0, 180.0)
+
+OUTSIDE = 0
+BOUNDARY = 1
+INSIDE = 2
+
+
+def count_vertices(geom) -> int:
+    """
+    Counts the vertices of a geometry, all rings and parts included
+
+    :param geom: The geometry
+    :return: the number of vertices
+    """
+    if geom is None or geom.is_empty:
+        return 0
+    if isinstance(geom, Polygon):
+        return len(geom.exterior.coords) + sum(len(ring.coords) for ring in geom.interiors)
+    if hasattr(geom, "geoms"):
+        return sum(count_vertices(part) for part in geom.geoms)
+    return len(geom.coords)
+
+
+def _polygonal(geom):
+    """Polygonal part of a clipped geometry, None when it has no area"""
+    if geom.is_empty:
+        return None
+    if isinstance(geom, (Polygon, MultiPolygon)):
+        return geom if geom.area > 0 else None
+    polygons = [
+        polygon for part in getattr(geom, "geoms", [])
+        for polygon in (part.geoms if isinstance(part, MultiPolygon) else [part])
+        if isinstance(polygon, Polygon) and polygon.area > 0
+    ]
+    if not polygons:
+        return None
+    return polygons[0] if len(polygons) == 1 else MultiPolygon(polygons)
+
+
+def _object_array(geometries) -> np.ndarray:
+    # Filled one by one: NumPy would iterate over the parts of multi-part geometries
+    array = np.empty(len(geometries), dtype=object)
+    for position, geometry in enumerate(geometries):
+        array[position] = geometry
+    return array
+
+
+def _as_array(geometries) -> GeometryArray:
+    # Without CRS, the tiles and the cover are both in WGS84
+    if isinstance(geometries, GeometryArray):
+        return GeometryArray(geometries.data)
+    return from_shapely(_object_array(list(geometries)))
+
+
+def _children(bounds: Tuple[float, float, float, float]):
+    x_min, y_min, x_max, y_max = bounds
+    x_mid, y_mid = (x_min + x_max) / 2.0, (y_min + y_max) / 2.0
+    return [
+        (x_min, y_min, x_mid, y_mid),
+        (x_mid, y_min, x_max, y_mid),
+        (x_min, y_mid, x_mid, y_max),
+        (x_mid, y_mid, x_max, y_max),
+    ]
+
+
+def _contains_bounds(outer, inner) -> bool:
+    return outer[0] <= inner[0] and outer[1] <= inner[1] \
+        and outer[2] >= inner[2] and outer[3] >= inner[3]
+
+
+class AoiCover:
+    """
+    Decomposition of a polygonal AOI into inside cells and boundary pieces
+
+    :param geom: AOI geometry, in WGS84
+    :param tolerance: (Optional, default = 0) Error allowed on the boundary, in degrees.
+    Boundary pieces are simplified with this tolerance and cells are not split below it.
+    With 0, the cover is exact.
+    :param max_vertices: (Optional, default = 256) Boundary cells are split until their
+    piece has at most this number of vertices
+    """
+
+    def __init__(
+        self, geom, tolerance: float = 0.0, max_vertices: int = MAX_PIECE_VERTICES
+    ):
+        self.geom = geom
+        self.bounds = geom.bounds
+        self.tolerance = float(tolerance)
+        self.max_vertices = max_vertices
+        self.vertices_before = count_vertices(geom)
+        self.inside_cells: List[Polygon] = []
+        self.pieces: List = []
+        self._decompose()
+        self.vertices_after = sum(count_vertices(piece) for piece in self.pieces)
+        self._indexes = None
+        LOGGER.info(
+            "AOI cover: %s vertices before, %s after in %s boundary pieces, %s inside cells",
+            self.vertices_before, self.vertices_after, len(self.pieces), len(self.inside_cells),
+        )
+
+    def _decompose(self) -> None:
+        stack = [(self.geom, WORLD_BOUNDS, 0)]
+        while stack:
+            piece, bounds, level = stack.pop()
+            if _contains_bounds(bounds, piece.bounds):
+                # Descending to the smallest cell holding the piece needs no clipping
+                holding = [child for child in _children(bounds)
+                           if _contains_bounds(child, piece.bounds)]
+                if holding and level < MAX_LEVEL:
+                    stack.append((piece, holding[0], level + 1))
+                    continue
+            else:
+                piece = _polygonal(clip_by_rect(piece, *bounds))
+                if piece is None:
+                    continue
+            cell_area = (bounds[2] - bounds[0]) * (bounds[3] - bounds[1])
+            if isinstance(piece, Polygon) and not piece.interiors \
+                    and piece.area >= cell_area * (1.0 - 1e-12):
+                self.inside_cells.append(box(*bounds))
+            elif count_vertices(piece) <= self.max_vertices or level >= MAX_LEVEL \
+                    or bounds[2] - bounds[0] <= self.tolerance:
+                if self.tolerance > 0:
+                    # The simplified piece stays within the convex cell
+                    piece = piece.simplify(self.tolerance, preserve_topology=True)
+                self.pieces.append(piece)
+            else:
+                stack.extend((piece, child, level + 1) for child in _children(bounds))
+
+    def __getstate__(self):
+        # The spatial indexes are rebuilt where the cover is used
+        state = self.__dict__.copy()
+        state["_indexes"] = None
+        return state
+
+    def _pairs(self, tile_geoms: GeometryArray):
+        if self._indexes is None:
+            self._indexes = (
+                gp.GeoSeries(self.inside_cells, dtype="geometry").sindex,
+                gp.GeoSeries(self.pieces, dtype="geometry").sindex,
+            )
+        tiles = gp.GeoSeries(tile_geoms)
+        return [
+            np.asarray(index.query_bulk(tiles, predicate="intersects"), dtype=np.int64)
+            .reshape(2, -1)
+            for index in self._indexes
+        ]
+
+    def classify(self, tile_geoms) -> np.ndarray:
+        """
+        Classifies tiles against the cover, with exact predicates on the boundary pieces only
+
+        :param tile_geoms: Tile footprints, in WGS84
+        :return: OUTSIDE, BOUNDARY or INSIDE for each tile. Tiles touching inside cells
+        only are INSIDE, they may still be partly outside when the AOI boundary runs along
+        the cell edges.
+        """
+        tile_geoms = _as_array(tile_geoms)
+        cell_pairs, piece_pairs = self._pairs(tile_geoms)
+        classes = np.full(len(tile_geoms), OUTSIDE, dtype=np.int8)
+        classes[cell_pairs[0]] = INSIDE
+        classes[piece_pairs[0]] = BOUNDARY
+        return classes
+
+    def overlaps(
+        self,
+        tile_geoms,
+        tile_areas: Optional[Sequence[float]] = None,
+        area_mode: str = PLANAR,
+    ) -> np.ndarray:
+        """
+        Computes the fraction of each tile covered by the AOI
+
+        :param tile_geoms: Tile footprints, in WGS84
+        :param tile_areas: (Optional, default = None) The areas of the tiles, computed when missing
+        :param area_mode: (Optional, default = "planar") "planar" or "geodesic"
+        :return: the overlap of each tile, between 0 and 1
+        """
+        tile_geoms = _as_array(tile_geoms)
+        if tile_areas is None:
+            tile_areas = geometry_areas(tile_geoms, area_mode)
+        tile_areas = np.asarray(tile_areas, dtype=float)
+        cell_pairs, piece_pairs = self._pairs(tile_geoms)
+        tile_positions = np.concatenate([cell_pairs[0], piece_pairs[0]])
+        parts = np.concatenate([
+            _object_array(self.inside_cells)[cell_pairs[1]],
+            _object_array(self.pieces)[piece_pairs[1]],
+        ])
+        covered = np.zeros(len(tile_geoms), dtype=float)
+        if area_mode == PLANAR:
+            intersections = tile_geoms[tile_positions].intersection(_as_array(parts))
+            np.add.at(covered, tile_positions, geometry_areas(intersections, area_mode))
+        elif len(tile_positions):
+            # Geodesic areas do not add up over the cells, whose edges are not geodesics:
+            # the AOI around each tile is merged back from its parts, then intersected
+            order = np.argsort(tile_positions, kind="stable")
+            uniques, starts = np.unique(tile_positions[order], return_index=True)
+            intersections = [
+                tile_geoms[position].intersection(unary_union(list(parts[order[start:end]])))
+                for position, start, end in zip(uniques, starts, [*starts[1:], len(order)])
+            ]
+            covered[uniques] = geometry_areas(intersections, area_mode)
+        boundary = np.zeros(len(tile_geoms), dtype=bool)
+        boundary[piece_pairs[0]] = True
+        overlaps = np.minimum(covered / tile_areas, 1.0)
+        # Tiles inside the cells are covered up to the rounding of the sums
+        overlaps[~boundary & np.isclose(overlaps, 1.0, rtol=0.0, atol=1e-9)] = 1.0
+        return overlaps
+
+
+def prepare_aoi(geom, tolerance: Optional[float] = None):
+    """
+    Decomposes a polygonal AOI into a quad cover when it is large, or when a tolerance is set
+
+    :param geom: AOI geometry, in WGS84
+    :param tolerance: (Optional, default = None) Error allowed on the boundary, in degrees.
+    When None, only AOIs with more than 20000 vertices are decomposed, exactly.
+    :return: an :class:`AoiCover`, or the geometry itself
+    """
+    if not isinstance(geom, (Polygon, MultiPolygon)):
+        return geom
+    if tolerance is None and count_vertices(geom) <= DECOMPOSE_MIN_VERTICES:
+        return geom
+    with span("aoi_cover") as stage:
+        cover = AoiCover(geom, tolerance or 0.0)
+        stage.count(
+            vertices=cover.vertices_before, pieces=len(cover.pieces), inside=len(cover.inside_cells)
+        )
+    return cover
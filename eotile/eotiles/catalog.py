@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Process-wide in-memory catalog of the tile grids
+
+Each grid file is read once, on first use, and kept in memory together with a
+spatial index over the footprints and an id -> row lookup table.
+
+Grids with an analytic engine (Sentinel-2, Landsat 8, DEM, SRTM 5x5) are not read in full for the first
+queries: the engine lists the candidate tile ids and only these rows are read.
+When the grid file is not installed, the engine footprints are only used in its place
+for the DEM and SRTM 5x5 grids, whose lookup tables list the existing tiles. A missing
+Sentinel-2 or Landsat 8 grid file is an error.
+Grids with an up-to-date binary cache (see :mod:`eotile.eotiles.grid_cache`) are
+served from the memory-mapped cache instead of the grid file.
+
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import fiona
+import geopandas as gp
+import numpy as np
+import pandas as pd
+
+from eotile.eotiles import grid_cache, latlon_grids, mgrs, overlap, wrs2
+from eotile.eotiles.profiling import span
+
+LOGGER = logging.getLogger("dev_logger")
+
+GRID_FILENAMES = {
+    "S2": "s2_no_overlap.gpkg",
+    "L8": "l8_tiles.gpkg",
+    "DEM": "DEM_Union.gpkg",
+    "SRTM 5x5": "srtm5x5_tiles.gpkg",
+}
+S2_OVERLAP_FILENAME = "s2_with_overlap.gpkg"
+
+# Builders of the analytic engines of the grid files, by file name
+ANALYTIC_GRIDS = {
+    GRID_FILENAMES["S2"]: lambda filename: mgrs.MGRSGrid(overlap=False),
+    S2_OVERLAP_FILENAME: lambda filename: mgrs.MGRSGrid(overlap=True),
+    GRID_FILENAMES["L8"]: lambda filename: wrs2.WRS2Grid(),
+    GRID_FILENAMES["DEM"]: lambda filename: latlon_grids.DEMGrid(
+        latlon_grids.lookup_table_path(filename)
+    ),
+    GRID_FILENAMES["SRTM 5x5"]: lambda filename: latlon_grids.SRTM5x5Grid(
+        latlon_grids.lookup_table_path(filename)
+    ),
+}
+
+# Number of candidate-only queries served before the whole grid is loaded
+FULL_LOAD_AFTER = 8
+# Above this number of candidates, the whole grid is loaded
+MAX_CANDIDATE_IDS = 1000
+
+
+def read_tiles_subset(filename_tiles_list: Path, tile_ids) -> Optional[gp.GeoDataFrame]:
+    """
+    Reads only some tiles of a grid file, pushing an id filter down to the driver
+
+    :param filename_tiles_list: Path to the grid file
+    :param tile_ids: The tile ids to read
+    :return: the tiles, or None when the driver does not support attribute filters
+    """
+    quoted = ", ".join("'" + str(tile_id).replace("'", "''") + "'" for tile_id in tile_ids)
+    with span("read_grid_subset", grid=Path(filename_tiles_list).name) as stage:
+        with fiona.open(str(filename_tiles_list)) as source:
+            try:
+                features = list(source.filter(where=f"id IN ({quoted})"))
+            except TypeError:
+                # fiona < 1.9
+                return None
+            crs = source.crs
+            columns = list(source.schema["properties"]) + ["geometry"]
+        stage.count(rows=len(features))
+    return gp.GeoDataFrame.from_features(features, crs=crs, columns=columns)
+
+
+def get_grid_filename(aux_data_dirpath: Path, tile_source: str, overlap=False) -> Path:
+    """
+    Returns the path of the grid file of a tile source
+
+    :param aux_data_dirpath: Path to the input aux data
+    :type aux_data_dirpath: Path
+    :param tile_source: Tile source : "S2", "L8", "DEM", "SRTM 5x5"
+    :type tile_source: str
+    :param overlap: (Optional, default = False) Do you want to use the overlapping S2 file ?
+    :type overlap: Boolean
+    :return: The path to the grid file
+    :rtype: Path
+    """
+    if tile_source == "S2" and overlap:
+        return aux_data_dirpath / S2_OVERLAP_FILENAME
+    return aux_data_dirpath / GRID_FILENAMES[tile_source]
+
+
+def lookup_positions(index: pd.Index, tile_ids: List[str]) -> Tuple[np.ndarray, List[str]]:
+    """
+    Looks up the row positions of tile ids in an id index
+
+    An id present several times in the grid gives all its rows, as ``.loc`` does.
+
+    :param index: Tile id of each row
+    :param tile_ids: The tile ids to look up
+    :return: the row positions, in the requested order, and the unknown tile ids
+    """
+    if index.is_unique:
+        positions = index.get_indexer(tile_ids)
+        missing = np.flatnonzero(positions < 0)
+    else:
+        positions, missing = index.get_indexer_non_unique(tile_ids)
+    return positions[positions >= 0], [tile_ids[position] for position in missing]
+
+
+class TileCatalog:
+    """
+    In-memory tile grid, loaded lazily from its grid file
+
+    The spatial index and the id lookup table are built on first use, or
+    explicitly with :meth:`warm_up`.
+    """
+
+    def __init__(self, filename_tiles_list: Path):
+        self.filename = Path(filename_tiles_list)
+        engine_builder = ANALYTIC_GRIDS.get(self.filename.name)
+        self.engine = engine_builder(self.filename) if engine_builder is not None else None
+        self._tiles = None
+        self._id_index = None
+        self._candidate_queries = 0
+        self._missing_file_logged = False
+        self._cache = None
+        self._cache_checked = False
+        self._areas: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.RLock()
+
+    @property
+    def is_loaded(self) -> bool:
+        """True when the grid file has already been read"""
+        return self._tiles is not None
+
+    @property
+    def cache(self) -> Optional[grid_cache.GridCache]:
+        """The binary cache of the grid file, None when missing or out of date"""
+        if not self._cache_checked:
+            with self._lock:
+                if not self._cache_checked:
+                    self._cache = grid_cache.open_cache(self.filename)
+                    self._cache_checked = True
+        return self._cache
+
+    @property
+    def tiles(self) -> gp.GeoDataFrame:
+        """
+        The whole tile grid. It must not be modified by callers.
+
+        :raises OSError: when the file cannot be open
+        """
+        if self._tiles is None:
+            with self._lock:
+                if self._tiles is None:
+                    with span("read_grid", grid=self.filename.name) as stage:
+                        if self.cache is not None:
+                            tiles = self.cache.to_geodataframe()
+                            stage.count(cached=1)
+                        else:
+                            tiles = gp.read_file(self.filename)
+                        stage.count(rows=0 if tiles is None else len(tiles))
+                    if tiles is None:
+                        LOGGER.error("ERROR: Could not open %s", self.filename)
+                        raise IOError
+                    LOGGER.info(
+                        "Number of features in %s: %s", self.filename.name, len(tiles)
+                    )
+                    self._tiles = tiles.reset_index(drop=True)
+        return self._tiles
+
+    @property
+    def id_index(self) -> pd.Index:
+        """Hash index giving the row position of a tile id"""
+        if self._id_index is None:
+            with self._lock:
+                if self._id_index is None:
+                    self._id_index = pd.Index(self.tiles["id"])
+        return self._id_index
+
+    def warm_up(self) -> "TileCatalog":
+        """
+        Loads the grid and builds the spatial index and the id lookup table
+
+        :return: the catalog itself
+        """
+        with self._lock:
+            _ = self.tiles.sindex
+            _ = self.id_index
+        return self
+
+    def analytic_tiles(self, tile_ids) -> gp.GeoDataFrame:
+        """
+        Builds tiles from the analytic engine footprints, skipping the invalid ids
+
+        :param tile_ids: The tile ids
+        :rtype: gp.geodataframe.GeoDataFrame
+        """
+        tile_ids = list(tile_ids)
+        with span("compute_footprints", grid=self.filename.name, tiles=len(tile_ids)):
+            footprints = self.engine.tile_footprints(tile_ids)
+        tile_ids = [tile_id for tile_id, elt in zip(tile_ids, footprints) if elt is not None]
+        attributes = self.engine.tile_attributes(tile_ids)
+        attributes.insert(0, "id", tile_ids)
+        return gp.GeoDataFrame(
+            attributes,
+            geometry=[footprint for footprint in footprints if footprint is not None],
+            crs="epsg:4326",
+        )
+
+    def _use_engine(self) -> bool:
+        if self.is_loaded or self.engine is None:
+            return False
+        if not self.filename.exists():
+            if not self.engine.can_replace_grid:
+                return False
+            if not self._missing_file_logged:
+                LOGGER.warning(
+                    "%s is not available, using computed footprints", self.filename.name
+                )
+                self._missing_file_logged = True
+            return True
+        return self._candidate_queries < FULL_LOAD_AFTER
+
+    def _query_candidates(self, geom) -> Optional[gp.GeoDataFrame]:
+        candidate_ids = self.engine.candidate_tile_ids(geom.bounds)
+        if not self.filename.exists():
+            tiles = self.analytic_tiles(candidate_ids)
+        elif len(candidate_ids) > MAX_CANDIDATE_IDS:
+            return None
+        else:
+            tiles = read_tiles_subset(self.filename, candidate_ids)
+            if tiles is None:
+                return None
+            self._candidate_queries += 1
+        return tiles[tiles.intersects(geom)]
+
+    def query(self, geom) -> gp.GeoDataFrame:
+        """
+        Returns the tiles intersecting a geometry, in the grid file order
+
+        :param geom: AOI geometry
+        :type geom: shapely.geometry.base.BaseGeometry
+        :return: a copy of the matching tiles
+        :rtype: gp.geodataframe.GeoDataFrame
+        """
+        if not self.is_loaded and self.cache is not None:
+            tiles = self.cache.frame(self.cache.query_positions(geom.bounds))
+            return tiles[tiles.intersects(geom)].reset_index(drop=True)
+        if self._use_engine():
+            tiles = self._query_candidates(geom)
+            if tiles is not None:
+                return tiles.reset_index(drop=True)
+        tiles = self.tiles
+        positions = tiles.sindex.query(geom, predicate="intersects")
+        return tiles.iloc[np.sort(positions)].reset_index(drop=True)
+
+    def query_bulk(self, geoms: gp.GeoSeries):
+        """
+        Spatial join of many geometries against the whole grid
+
+        :param geoms: AOI geometries
+        :type geoms: gp.GeoSeries
+        :return: the positions of the geometries and of the tiles of each intersecting pair,
+        sorted by geometry then tile
+        :rtype: Tuple[np.ndarray, np.ndarray]
+        """
+        sindex = self.tiles.sindex
+        if hasattr(sindex, "query_bulk"):
+            pairs = sindex.query_bulk(geoms, predicate="intersects")
+        else:
+            pairs = sindex.query(geoms, predicate="intersects")
+        # The rtree backend returns float arrays when nothing intersects
+        pairs = np.asarray(pairs, dtype=np.int64).reshape(2, -1)
+        order = np.lexsort((pairs[1], pairs[0]))
+        return pairs[0][order], pairs[1][order]
+
+    def tile_areas(self, tiles: gp.GeoDataFrame, area_mode: str = overlap.PLANAR) -> np.ndarray:
+        """
+        Returns the areas of tiles of the grid, computed once per tile and area mode
+
+        :param tiles: Tiles of the grid
+        :param area_mode: (Optional, default = "planar") "planar" or "geodesic"
+        :return: the area of each tile
+        """
+        with self._lock:
+            areas = self._areas.setdefault(overlap.check_area_mode(area_mode), {})
+            tile_ids = tiles["id"].tolist()
+            missing = [position for position, tile_id in enumerate(tile_ids) if tile_id not in areas]
+            if missing:
+                missing_areas = overlap.geometry_areas(tiles.geometry.values[missing], area_mode)
+                areas.update(zip([tile_ids[position] for position in missing], missing_areas))
+            return np.array([areas[tile_id] for tile_id in tile_ids], dtype=float)
+
+    def get_tile(self, tile_id: str) -> pd.Series:
+        """
+        Returns a tile from its tile id
+
+        :param tile_id: The tile id of the tile to output
+        :return: a copy of the tile row, the first one when the id is repeated in the grid
+        :raises KeyError: when the tile id is not available
+        """
+        if self.engine is not None and not self.is_loaded:
+            if not self.engine.may_be_tile_id(tile_id):
+                raise KeyError(tile_id)
+            if not self.filename.exists() and self.engine.can_replace_grid:
+                return self.analytic_tiles([tile_id]).iloc[0]
+        if not self.is_loaded and self.cache is not None:
+            positions, unknown = lookup_positions(self.cache.id_index, [tile_id])
+            if unknown:
+                raise KeyError(tile_id)
+            return self.cache.frame(positions[:1]).iloc[0]
+        positions, unknown = lookup_positions(self.id_index, [tile_id])
+        if unknown:
+            raise KeyError(tile_id)
+        return self.tiles.iloc[positions[0]].copy()
+
+    def get_tiles(self, tile_ids: Sequence[str]) -> Tuple[gp.GeoDataFrame, List[str]]:
+        """
+        Resolves a list of tile ids in one bulk operation
+
+        Before the grid is loaded, only the requested rows are read, from the binary cache
+        or with an id filter pushed down to the driver.
+
+        :param tile_ids: The tile ids of the tiles to output
+        :return: a copy of the known tiles, in the requested order, and the unknown tile ids
+        :rtype: Tuple[gp.GeoDataFrame, List[str]]
+        """
+        tile_ids = [str(tile_id) for tile_id in tile_ids]
+        tiles, index = None, None
+        if not self.is_loaded and self.cache is not None:
+            positions, unknown = lookup_positions(self.cache.id_index, tile_ids)
+            return self.cache.frame(positions), unknown
+        if not self.is_loaded:
+            requested = tile_ids
+            if self.engine is not None:
+                requested = [elt for elt in tile_ids if self.engine.may_be_tile_id(elt)]
+            if self.engine is not None and not self.filename.exists() \
+                    and self.engine.can_replace_grid:
+                tiles = self.analytic_tiles(dict.fromkeys(requested))
+            elif 0 < len(requested) <= MAX_CANDIDATE_IDS and self.filename.exists():
+                tiles = read_tiles_subset(self.filename, dict.fromkeys(requested))
+            if tiles is not None:
+                index = pd.Index(tiles["id"])
+        if tiles is None:
+            tiles, index = self.tiles, self.id_index
+        positions, unknown = lookup_positions(index, tile_ids)
+        return tiles.iloc[positions].reset_index(drop=True), unknown
+
+
+_CATALOGS: Dict[Path, TileCatalog] = {}
+_CATALOGS_LOCK = threading.Lock()
+
+
+def get_catalog(filename_tiles_list: Path) -> TileCatalog:
+    """
+    Returns the process-wide catalog of a grid file, creating it if needed
+
+    :param filename_tiles_list: Path to the grid file
+    :type filename_tiles_list: Path
+    :rtype: TileCatalog
+    """
+    key = Path(filename_tiles_list).absolute()
+    with _CATALOGS_LOCK:
+        catalog = _CATALOGS.get(key)
+        if catalog is None:
+            catalog = TileCatalog(key)
+            _CATALOGS[key] = catalog
+    return catalog
+
+
+def warm_up(filenames: Iterable[Path]) -> None:
+    """
+    Loads and indexes several grid files so that later queries are served from memory
+
+    :param filenames: Paths to the grid files
+    """
+    for filename in filenames:
+        get_catalog(filename).warm_up()
+
+
+def clear_catalogs(filename_tiles_list: Optional[Path] = None) -> None:
+    """
+    Drops the cached catalogs
+
+    :param filename_tiles_list: (Optional, default = None) Only drop the catalog of this file
+    """
+    with _CATALOGS_LOCK:
+        if filename_tiles_list is None:
+            _CATALOGS.clear()
+        else:
+            _CATALOGS.pop(Path(filename_tiles_list).absolute(), None)
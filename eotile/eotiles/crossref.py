@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Cross-reference table of the tile grids
+
+For every pair of tiles of two different grids which intersect, the table stores
+the fraction of the second tile covered by the first one. Tile id queries are
+then answered with a lookup instead of a spatial query.
+
+The table records a signature of the grid files it was built from, and is not
+used for a grid file which has changed since.
+
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import warnings
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import geopandas as gp
+import numpy as np
+import pandas as pd
+
+from eotile.eotiles.catalog import (
+    GRID_FILENAMES,
+    S2_OVERLAP_FILENAME,
+    TileCatalog,
+    get_catalog,
+)
+
+LOGGER = logging.getLogger("dev_logger")
+
+CROSSREF_FILENAME = "crossref.npz"
+CROSSREF_VERSION = 2
+# Bytes read at the start and at the end of the grid files to check that they are unchanged
+SIGNATURE_CHUNK = 65536
+
+# Tile source of each grid file
+GRID_SOURCES = {filename: source for source, filename in GRID_FILENAMES.items()}
+GRID_SOURCES[S2_OVERLAP_FILENAME] = "S2"
+
+# Overlap, relative to the tile area, below which two tiles of a grid are taken as disjoint
+DISJOINT_TOLERANCE = 1e-9
+
+
+def crossref_path(aux_data_dirpath: Path) -> Path:
+    """Returns the path of the cross-reference table of an aux data directory"""
+    return Path(aux_data_dirpath) / CROSSREF_FILENAME
+
+
+def _source_signature(filename_tiles_list: Path) -> List:
+    # Based on the content rather than on the modification time, which is not kept when
+    # the package is installed. The GeoPackage header holds a change counter.
+    size = Path(filename_tiles_list).stat().st_size
+    digest = hashlib.sha1()
+    with open(filename_tiles_list, "rb") as grid_file:
+        digest.update(grid_file.read(SIGNATURE_CHUNK))
+        grid_file.seek(max(size - SIGNATURE_CHUNK, 0))
+        digest.update(grid_file.read(SIGNATURE_CHUNK))
+    return [size, digest.hexdigest()]
+
+
+def _pair_key(from_name: str, to_name: str) -> str:
+    return f"{from_name}>{to_name}"
+
+
+def is_disjoint(catalog: TileCatalog) -> bool:
+    """
+    Tells whether the tiles of a grid do not overlap each other: the overlap of a union
+    of their tiles is then the sum of the overlaps of each tile
+
+    :param catalog: The catalog of the grid
+    :return: False when two tiles share more than their edges
+    """
+    geometries = catalog.tiles.geometry
+    positions_a, positions_b = catalog.query_bulk(geometries)
+    keep = positions_a < positions_b
+    geoms_a = gp.GeoSeries(geometries.values[positions_a[keep]])
+    geoms_b = gp.GeoSeries(geometries.values[positions_b[keep]])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        intersections = geoms_a.intersection(geoms_b).area.to_numpy()
+        areas = np.minimum(geoms_a.area.to_numpy(), geoms_b.area.to_numpy())
+    return not bool((intersections > DISJOINT_TOLERANCE * areas).any())
+
+
+def build_crossref(aux_data_dirpath: Path) -> Path:
+    """
+    Builds the cross-reference table of the grid files installed in a directory
+
+    :param aux_data_dirpath: Path to the aux data
+    :type aux_data_dirpath: Path
+    :return: the path of the table
+    :rtype: Path
+    """
+    aux_data_dirpath = Path(aux_data_dirpath)
+    names = [name for name in GRID_SOURCES if (aux_data_dirpath / name).exists()]
+    arrays = {}
+    for index, name_a in enumerate(names):
+        tiles_a = get_catalog(aux_data_dirpath / name_a).tiles
+        for name_b in names[index + 1:]:
+            if GRID_SOURCES[name_a] == GRID_SOURCES[name_b]:
+                continue
+            catalog_b = get_catalog(aux_data_dirpath / name_b)
+            positions_a, positions_b = catalog_b.query_bulk(tiles_a.geometry)
+            geoms_a = gp.GeoSeries(tiles_a.geometry.values[positions_a])
+            geoms_b = gp.GeoSeries(catalog_b.tiles.geometry.values[positions_b])
+            with warnings.catch_warnings():
+                # Square degrees, as in the min_overlap filter of the spatial queries
+                warnings.simplefilter("ignore", UserWarning)
+                intersections = geoms_a.intersection(geoms_b).area.to_numpy()
+                areas_a, areas_b = geoms_a.area.to_numpy(), geoms_b.area.to_numpy()
+            ids_a = tiles_a["id"].to_numpy(dtype=str)[positions_a]
+            ids_b = catalog_b.tiles["id"].to_numpy(dtype=str)[positions_b]
+            for key, from_ids, to_ids, to_positions, to_areas in (
+                (_pair_key(name_a, name_b), ids_a, ids_b, positions_b, areas_b),
+                (_pair_key(name_b, name_a), ids_b, ids_a, positions_a, areas_a),
+            ):
+                order = np.lexsort((to_positions, from_ids))
+                arrays[f"{key}|from"] = from_ids[order]
+                arrays[f"{key}|to"] = to_ids[order]
+                arrays[f"{key}|position"] = to_positions[order]
+                arrays[f"{key}|fraction"] = (intersections / to_areas)[order]
+            LOGGER.info("Cross-referenced %s with %s: %s pairs", name_a, name_b, len(ids_a))
+
+    meta = {
+        "version": CROSSREF_VERSION,
+        "grids": {name: _source_signature(aux_data_dirpath / name) for name in names},
+        "disjoint": {
+            name: is_disjoint(get_catalog(aux_data_dirpath / name)) for name in names
+        },
+    }
+    filename = crossref_path(aux_data_dirpath)
+    with open(filename, "wb") as output:
+        np.savez_compressed(output, meta=np.array(json.dumps(meta)), **arrays)
+    clear_crossrefs(aux_data_dirpath)
+    return filename
+
+
+class _PairTable:
+    """Tiles of a grid intersecting each tile of another grid"""
+
+    def __init__(self, from_ids, to_ids, positions, fractions):
+        self.to_ids = to_ids
+        self.positions = positions
+        self.fractions = fractions
+        # The pairs are sorted by input tile id
+        keys, self.starts, counts = np.unique(from_ids, return_index=True, return_counts=True)
+        self.keys = pd.Index(keys)
+        self.ends = self.starts + counts
+
+    def rows(self, tile_ids: Sequence[str]) -> np.ndarray:
+        """Row positions of the pairs of some tiles, unknown tiles have no pair"""
+        keys = self.keys.get_indexer(list(tile_ids))
+        keys = keys[keys >= 0]
+        if len(keys) == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([np.arange(self.starts[key], self.ends[key]) for key in keys])
+
+
+class CrossReference:
+    """
+    Cross-reference table, built by :func:`build_crossref`
+    """
+
+    def __init__(self, filename: Path):
+        self.filename = Path(filename)
+        self.aux_data_dirpath = self.filename.parent
+        self._data = np.load(self.filename)
+        self.meta = json.loads(str(self._data["meta"]))
+        self._tables: Dict[str, _PairTable] = {}
+        self._current: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+
+    def is_current(self, grid_name: str) -> bool:
+        """Tells whether a grid file is unchanged since the table was built"""
+        if grid_name not in self._current:
+            signature = self.meta["grids"].get(grid_name)
+            filename = self.aux_data_dirpath / grid_name
+            self._current[grid_name] = signature is not None and filename.exists() \
+                and _source_signature(filename) == signature
+        return self._current[grid_name]
+
+    def _table(self, key: str) -> Optional[_PairTable]:
+        with self._lock:
+            if key not in self._tables:
+                if f"{key}|from" not in self._data.files:
+                    return None
+                self._tables[key] = _PairTable(
+                    *(self._data[f"{key}|{name}"] for name in ("from", "to", "position", "fraction"))
+                )
+            return self._tables[key]
+
+    def lookup(
+        self, from_name: str, to_name: str, tile_ids: Iterable[str], min_overlap=None
+    ) -> Optional[pd.Series]:
+        """
+        Lists the tiles of a grid intersecting a set of tiles of another grid
+
+        :param from_name: File name of the grid of the input tiles
+        :param to_name: File name of the grid of the output tiles
+        :param tile_ids: The input tile ids
+        :param min_overlap: (Optional, default=None) Minimum percentage of each output tile
+        covered by the union of the input tiles
+        :return: the overlap of each output tile, indexed by tile id in the grid file order,
+        or None when the table cannot answer: grid missing from the table or changed,
+        or overlapping input tiles
+        """
+        tile_ids = list(tile_ids)
+        if not (self.is_current(from_name) and self.is_current(to_name)):
+            return None
+        disjoint = self.meta["disjoint"].get(from_name, False)
+        if min_overlap is not None and len(tile_ids) > 1 and not disjoint:
+            return None
+        table = self._table(_pair_key(from_name, to_name))
+        if table is None:
+            return None
+        rows = table.rows(dict.fromkeys(tile_ids))
+        pairs = pd.DataFrame(
+            {"position": table.positions[rows], "fraction": table.fractions[rows]},
+            index=table.to_ids[rows],
+        )
+        overlaps = pairs.groupby(level=0).agg({"position": "first", "fraction": "sum"})
+        if min_overlap is not None:
+            overlaps = overlaps[overlaps.fraction >= float(min_overlap)]
+        return overlaps.sort_values("position")["fraction"].clip(upper=1.0).rename("overlap")
+
+
+_CROSSREFS: Dict[Path, Optional[CrossReference]] = {}
+_CROSSREFS_LOCK = threading.Lock()
+
+
+def get_crossref(aux_data_dirpath: Path) -> Optional[CrossReference]:
+    """
+    Returns the process-wide cross-reference table of an aux data directory
+
+    :param aux_data_dirpath: Path to the aux data
+    :return: the table, None when it has not been built or has an older format
+    :rtype: CrossReference
+    """
+    key = Path(aux_data_dirpath).absolute()
+    with _CROSSREFS_LOCK:
+        if key not in _CROSSREFS:
+            crossref = None
+            filename = crossref_path(key)
+            if filename.exists():
+                crossref = CrossReference(filename)
+                if crossref.meta.get("version") != CROSSREF_VERSION:
+                    LOGGER.warning("Ignoring %s: older format", filename)
+                    crossref = None
+            _CROSSREFS[key] = crossref
+        return _CROSSREFS[key]
+
+
+def clear_crossrefs(aux_data_dirpath: Optional[Path] = None) -> None:
+    """
+    Drops the cached cross-reference tables
+
+    :param aux_data_dirpath: (Optional, default = None) Only drop the table of this directory
+    """
+    with _CROSSREFS_LOCK:
+        if aux_data_dirpath is None:
+            _CROSSREFS.clear()
+        else:
+            _CROSSREFS.pop(Path(aux_data_dirpath).absolute(), None)
@@ -26,30 +26,60 @@ tile list utilities
 :license: see LICENSE file.
 """
 
+import json
 import logging
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
 from pathlib import Path
-from typing import Optional, Union
-import warnings
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 
 import geopandas as gp
-import pyproj
+import numpy as np
+import pandas as pd
 import shapely
-from shapely.geometry import Polygon
+import shapely.wkb
+from shapely.geometry import Polygon, box, shape
+from shapely.ops import unary_union
 
+from eotile.eotiles.aoi_cover import OUTSIDE, AoiCover
+from eotile.eotiles.catalog import get_catalog
+from eotile.eotiles.overlap import PLANAR, pair_overlaps, tile_overlaps
+from eotile.eotiles.profiling import span
+from eotile.eotiles.reprojection import reproject_geometry, to_wgs84
 
 LOGGER = logging.getLogger("dev_logger")
 
+# Rows of the GeoParquet row groups, whose statistics let readers skip far away tiles
+PARQUET_ROW_GROUP_SIZE = 4096
+# One query per tile source at most
+MAX_WORKERS = 4
+_EXECUTORS: Dict[str, Executor] = {}
+_EXECUTORS_LOCK = threading.Lock()
 
-def write_tiles_bb(tile_list: gp.geodataframe.GeoDataFrame, filename: Path, source="Unknown") \
-        -> None:
+
+def write_tiles_bb(
+    tile_list: gp.geodataframe.GeoDataFrame,
+    filename: Path,
+    source="Unknown",
+    spatial_index=True,
+) -> None:
     """Writes the input tiles to a file
 
     :param tile_list: The list of input tiles to write
     :type tile_list: gp.geodataframe.GeoDataFrame
-    :param filename: Path to the output file aux data (Must be a shp file)
+    :param filename: Path to the output file: .shp, .geojson, .gpkg, .fgb or .parquet
     :type filename: Path
     :param source: Source type of the geoDataframe to write
     :type source: String
+    :param spatial_index: (Optional, default = True) Adds a spatial index to FlatGeobuf files,
+    and sorts GeoParquet rows along a space-filling curve with bounding box columns
+    :type spatial_index: Boolean
+    :raises ImportError: when pyarrow is missing to write GeoParquet files
     """
     tiles = tile_list.set_crs(epsg=4326)
     if filename.suffix == ".shp":
@@ -61,24 +91,151 @@ def write_tiles_bb(tile_list: gp.geodataframe.GeoDataFrame, filename: Path, sour
     elif filename.suffix == ".gpkg":
         # GeoJSON case
         tiles.to_file(str(filename), layer=source, driver="GPKG")
+    elif filename.suffix == ".fgb":
+        # FlatGeobuf case
+        tiles.to_file(
+            str(filename), driver="FlatGeobuf", SPATIAL_INDEX="YES" if spatial_index else "NO"
+        )
+    elif filename.suffix == ".parquet":
+        # GeoParquet case
+        if spatial_index:
+            bounds = tiles.geometry.bounds
+            tiles = tiles.assign(
+                xmin=bounds["minx"], ymin=bounds["miny"], xmax=bounds["maxx"], ymax=bounds["maxy"]
+            ).iloc[morton_order(bounds.to_numpy())]
+        try:
+            tiles.to_parquet(str(filename), index=False, row_group_size=PARQUET_ROW_GROUP_SIZE)
+        except ImportError as error:
+            raise ImportError("Writing GeoParquet files requires pyarrow") from error
     else:
         LOGGER.error(f"Unrecognized suffix {filename.suffix}")
 
 
-def load_aoi(filename_aoi: Path) -> shapely.geometry.Polygon:
+def morton_codes(cells: np.ndarray, bits: int = 16) -> np.ndarray:
+    """
+    Interleaves the bits of cell coordinates into Z-order curve codes
+
+    :param cells: (column, row) of each cell, integers below 2 ** bits
+    :param bits: (Optional, default = 16) Number of bits of each coordinate
+    :return: the code of each cell
+    """
+    cells = np.asarray(cells).astype(np.uint64)
+    codes = np.zeros(len(cells), dtype=np.uint64)
+    for bit in range(bits):
+        for axis in range(2):
+            codes |= ((cells[:, axis] >> np.uint64(bit)) & np.uint64(1)) \
+                << np.uint64(2 * bit + axis)
+    return codes
+
+
+def morton_order(bounds: np.ndarray) -> np.ndarray:
+    """
+    Orders boxes along a Z-order curve of their centers,
+    so that nearby tiles end up in the same row groups
+
+    :param bounds: (min x, min y, max x, max y) of each box
+    :return: the positions of the boxes, sorted
+    """
+    if len(bounds) == 0:
+        return np.arange(0)
+    centers = np.column_stack(
+        [(bounds[:, 0] + bounds[:, 2]) / 2.0, (bounds[:, 1] + bounds[:, 3]) / 2.0]
+    )
+    lower, upper = centers.min(axis=0), centers.max(axis=0)
+    scale = np.where(upper > lower, upper - lower, 1.0)
+    cells = ((centers - lower) / scale * 0xFFFF).astype(np.uint64)
+    return np.argsort(morton_codes(cells), kind="stable")
+
+
+def write_tile_lists_to_file(
+    tile_lists: Dict[str, gp.geodataframe.GeoDataFrame],
+    filename: Path,
+    single_file=False,
+    spatial_index=True,
+) -> List[Path]:
+    """Writes the tiles of several sources to files
+
+    GeoPackages get one layer per source, replacing the layers of the same name and keeping
+    the other ones. They are written to a copy of the output file which then replaces it,
+    so that a GeoPackage is never left half written.
+    Other formats get one file per source, or a single file with a "source" column.
+
+    :param tile_lists: The tiles of each source
+    :type tile_lists: Dict[str, gp.geodataframe.GeoDataFrame]
+    :param filename: Path to the output file
+    :type filename: Path
+    :param single_file: (Optional, default = False) Writes all the sources to a single file
+    with a "source" column, for the formats without layers
+    :type single_file: Boolean
+    :param spatial_index: (Optional, default = True) See write_tiles_bb
+    :type spatial_index: Boolean
+    :return: the written files
+    """
+    tile_lists = {source: tiles for source, tiles in tile_lists.items() if len(tiles) > 0}
+    if not tile_lists:
+        return []
+    if filename.suffix == ".gpkg":
+        tmp_filename = filename.with_name(f".{filename.stem}.tmp{filename.suffix}")
+        try:
+            if filename.exists():
+                shutil.copyfile(filename, tmp_filename)
+            for source, tiles in tile_lists.items():
+                write_tiles_bb(tiles, tmp_filename, source=source)
+            os.replace(tmp_filename, filename)
+        finally:
+            if tmp_filename.exists():
+                tmp_filename.unlink()
+        return [filename]
+    if single_file:
+        tiles = pd.concat(
+            [tiles.assign(source=source) for source, tiles in tile_lists.items()],
+            ignore_index=True,
+        )
+        tiles = gp.GeoDataFrame(tiles, geometry="geometry", crs="epsg:4326")
+        write_tiles_bb(tiles, filename, spatial_index=spatial_index)
+        return [filename]
+    filenames = []
+    for source, tiles in tile_lists.items():
+        source_filename = filename.with_name(filename.stem + "_" + source + filename.suffix)
+        write_tiles_bb(tiles, source_filename, source=source, spatial_index=spatial_index)
+        filenames.append(source_filename)
+    return filenames
+
+
+def load_aoi(filename_aoi: Path, aoi_mode="first") -> shapely.geometry.Polygon:
     """
     Loads an Area of Interest from a file using geopandas
     :param filename_aoi: The path to the file containing the AOI
     :type filename_aoi: Path
+    :param aoi_mode: (Optional, default = "first") "first" to keep the first feature of the file,
+    "union" for the union of all its features
+    :type aoi_mode: str
     :return: the geometry polygon
     :rtype: shapely.geometry.Polygon
+    :raises ValueError: when the AOI mode is unknown
     """
-    aoi = gp.read_file(filename_aoi)
-    aoi = aoi.to_crs("epsg:4326")
-    geometry = aoi.iloc[0].geometry
+    if aoi_mode not in ("first", "union"):
+        raise ValueError(f"Unknown AOI mode {aoi_mode}, expected 'first' or 'union'")
+    if aoi_mode == "union":
+        return unary_union(load_aoi_features(filename_aoi).geometry.values)
+    # The second row is only read to warn about it, only the first one is reprojected
+    aoi = gp.read_file(filename_aoi, rows=2)
     if len(aoi) > 1:
         LOGGER.warning(f"The input file {filename_aoi} contains more than one geometry")
-    return geometry
+    return to_wgs84(aoi.iloc[:1]).geometry.iloc[0]
+
+
+def load_aoi_features(filename_aoi: Path) -> gp.geodataframe.GeoDataFrame:
+    """
+    Loads all the features of an Area of Interest file, in WGS84
+
+    :param filename_aoi: The path to the file containing the AOI
+    :type filename_aoi: Path
+    :return: the features, with their attributes
+    :rtype: gp.geodataframe.GeoDataFrame
+    """
+    aoi = gp.read_file(filename_aoi)
+    return to_wgs84(aoi)
 
 
 def get_tile(tile_list: gp.geodataframe.GeoDataFrame, tile_id: str) -> gp.geoseries:
@@ -152,12 +309,56 @@ def load_wkt_geom(wkt: str, epsg: Optional[str]) -> Polygon:
     :return: a shapely Polygon geometry
     """
     geom = shapely.wkt.loads(wkt)
-    if epsg is not None:
-        source = pyproj.CRS(f"EPSG:{epsg}")
-        target = pyproj.CRS("EPSG:4326")
-        project = pyproj.Transformer.from_crs(source, target, always_xy=True).transform
-        geom = shapely.ops.transform(project, geom)
-    return geom
+    return reproject_geometry(geom, epsg)
+
+
+def load_geojson_geom(geojson: str, epsg: Optional[str]):
+    """
+    Loads a GeoJSON geometry, feature or feature collection to a shapely object
+    and reprojects it if needed
+
+    :param geojson: The GeoJSON object in str format
+    :param epsg: An optional in the epsg code in case it is not WGS84
+    :return: a shapely geometry, the union of the features for a feature collection
+    :raises ValueError: when the input is not a GeoJSON object
+    """
+    try:
+        obj = json.loads(geojson)
+        if obj["type"] == "FeatureCollection":
+            geom = unary_union([shape(feature["geometry"]) for feature in obj["features"]])
+        elif obj["type"] == "Feature":
+            geom = shape(obj["geometry"])
+        else:
+            geom = shape(obj)
+    except (ValueError, KeyError, TypeError, AttributeError) as error:
+        raise ValueError(f"Input was recognized as GeoJSON but is incorrect: {error}") from error
+    return reproject_geometry(geom, epsg)
+
+
+def load_wkb_geom(wkb_hex: str, epsg: Optional[str]):
+    """
+    Loads a hex encoded wkb geometry to a shapely object and reprojects it if needed
+
+    :param wkb_hex: The wkb geometry, hex encoded
+    :param epsg: An optional in the epsg code in case it is not WGS84
+    :return: a shapely geometry
+    """
+    geom = shapely.wkb.loads(wkb_hex, hex=True)
+    return reproject_geometry(geom, epsg)
+
+
+def point_to_list(point: str) -> list:
+    """
+    Transforms a "lat, lon" point str from args to a list
+
+    :param point: The point, latitude first
+    :return: a list [lat, lon]
+    :raises ValueError: when the coordinates are out of range
+    """
+    lat, lon = [float(elt) for elt in re.split(r"[,\s]+", point.strip(" ()[]'"))]
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError(f"Point out of range, expected lat, lon: {point}")
+    return [lat, lon]
 
 
 def geom_to_eo_tiles(
@@ -177,42 +378,129 @@ def geom_to_eo_tiles(
     return create_tiles_list_eo_from_geometry(filename_tiles_eo, geom, min_overlap)
 
 
+def load_aois(
+    aois: Union[gp.GeoDataFrame, gp.GeoSeries, Iterable[str]], epsg: Optional[str] = None
+) -> gp.GeoSeries:
+    """
+    Loads many AOIs to a WGS84 GeoSeries
+
+    :param aois: A GeoDataFrame, a GeoSeries or an iterable of wkt strings
+    :param epsg: An optional epsg code for the AOIs without CRS (wkt strings included)
+    :return: the AOI geometries, indexed like the input
+    :rtype: gp.GeoSeries
+    """
+    if isinstance(aois, gp.GeoDataFrame):
+        geoms = aois.geometry
+    elif isinstance(aois, gp.GeoSeries):
+        geoms = aois
+    else:
+        geoms = gp.GeoSeries([shapely.wkt.loads(wkt) for wkt in aois])
+    if geoms.crs is None:
+        geoms = geoms.set_crs(epsg=int(epsg) if epsg is not None else 4326)
+    return to_wgs84(geoms)
+
+
+def create_tiles_list_eo_from_geometries(
+    filename_tiles_list: Path, geoms: gp.GeoSeries, min_overlap=None, area_mode=PLANAR
+) -> pd.DataFrame:
+    """Create the EO tile ids of many AOI geometries with a single spatial join
+
+    :param filename_tiles_list: Path to the file containing the list of tiles
+    :type filename_tiles_list: Path
+    :param geoms: AOI geometries, in WGS84
+    :type geoms: gp.GeoSeries
+    :param min_overlap: (Optional, default=None) Minimum percentage of overlap,
+    applied to each (AOI, tile) pair
+    :param area_mode: (Optional, default="planar") Areas used for the overlap: "planar" in
+    square degrees, or "geodesic"
+    :return: a long-form table with one row per (AOI, tile) pair: the AOI index label
+    and the tile id, and the overlap when min_overlap is set
+    :rtype: pd.DataFrame
+    """
+    catalog = get_catalog(filename_tiles_list)
+    if not catalog.filename.exists() and catalog.engine is not None \
+            and catalog.engine.can_replace_grid:
+        # No grid to join with: computed footprints, one AOI after the other
+        outputs = []
+        for label, geom in geoms.items():
+            tiles = create_tiles_list_eo_from_geometry(
+                filename_tiles_list, geom, min_overlap, area_mode
+            )
+            output = pd.DataFrame({"aoi_index": label, "id": tiles["id"].values})
+            if min_overlap is not None:
+                output["overlap"] = tiles["overlap"].values
+            outputs.append(output)
+        columns = ["aoi_index", "id"] if min_overlap is None else ["aoi_index", "id", "overlap"]
+        return pd.concat(outputs, ignore_index=True) if outputs else pd.DataFrame(columns=columns)
+    aoi_positions, tile_positions = catalog.query_bulk(geoms)
+    output = pd.DataFrame(
+        {
+            "aoi_index": geoms.index[aoi_positions],
+            "id": catalog.tiles["id"].values[tile_positions],
+        }
+    )
+    if min_overlap is not None:
+        tiles = catalog.tiles.iloc[tile_positions]
+        output["overlap"] = pair_overlaps(
+            tiles.geometry.values,
+            geoms.values,
+            aoi_positions,
+            catalog.tile_areas(tiles, area_mode),
+            area_mode,
+        )
+        output = output[output["overlap"] >= float(min_overlap)].reset_index(drop=True)
+    LOGGER.info("Number of (AOI, tile) pairs in %s: %s", filename_tiles_list.name, len(output))
+    return output
+
+
 def create_tiles_list_eo_from_geometry(
-    filename_tiles_list: Path, geom: Polygon, min_overlap=None
+    filename_tiles_list: Path, geom: Polygon, min_overlap=None, area_mode=PLANAR
 ) -> gp.geodataframe.GeoDataFrame:
     """Create the EO tile list according to an aoi geometry
 
     :param filename_tiles_list: Path to the XML file containing the list of tiles
     :type filename_tiles_list: str
-    :param geom: AOI geometry
+    :param geom: AOI geometry, or its quad cover (see :func:`eotile.eotiles.aoi_cover.prepare_aoi`)
     :param min_overlap: (Optional, default=None) Minimum percentage of overlap
     :type geom: shapely.geometry.Polygon
+    :param area_mode: (Optional, default="planar") Areas used for the overlap: "planar" in
+    square degrees, or "geodesic"
+    :type area_mode: str
     :raises OSError: when the file cannot be open
-    :return: list of EO tiles
+    :return: list of EO tiles, with their overlap in an "overlap" column when min_overlap is set
     :rtype: gp.geodataframe.GeoDataFrame
     """
 
-    # Open the tile list file
-    data_source_filtered = gp.read_file(filename_tiles_list, mask=geom)
-    # Check to see if shapefile is found.
-    if data_source_filtered is None:
-        LOGGER.error("ERROR: Could not open %s", filename_tiles_list)
-        raise IOError
+    # Query the in-memory catalog of the tile list file
+    catalog = get_catalog(filename_tiles_list)
+    with span("grid_query", grid=Path(filename_tiles_list).name) as stage:
+        if isinstance(geom, AoiCover):
+            # Only the tiles on the boundary of the AOI are intersected, with its small pieces
+            data_source_filtered = catalog.query(box(*geom.bounds))
+            data_source_filtered = data_source_filtered[
+                geom.classify(data_source_filtered.geometry.values) != OUTSIDE
+            ].copy()
+        else:
+            data_source_filtered = catalog.query(geom)
+        stage.count(candidates=len(data_source_filtered))
 
     feature_count = len(data_source_filtered)
     LOGGER.info("Number of features in %s: %s", filename_tiles_list.name, feature_count)
-    warnings.filterwarnings("ignore")
-    # Ignore the
-    # UserWarning: Geometry is in a geographic CRS.
-    # Results from 'area' are likely incorrect.
-    # Use 'GeoSeries.to_crs()' to re-project geometries to a projected CRS before this operation.
-    #
-    # We keep the square degrees results as is. Since we use a ratio, this does not matter
     if min_overlap is not None:
-        data_source_filtered = data_source_filtered[
-            data_source_filtered.intersection(geom).area / data_source_filtered.area
-            >= float(min_overlap)
-        ]
+        with span("overlap_filter", area_mode=area_mode, candidates=feature_count) as stage:
+            tile_areas = catalog.tile_areas(data_source_filtered, area_mode)
+            if isinstance(geom, AoiCover):
+                data_source_filtered["overlap"] = geom.overlaps(
+                    data_source_filtered.geometry.values, tile_areas, area_mode
+                )
+            else:
+                data_source_filtered["overlap"] = tile_overlaps(
+                    data_source_filtered.geometry.values, geom, tile_areas, area_mode
+                )
+            data_source_filtered = data_source_filtered[
+                data_source_filtered["overlap"] >= float(min_overlap)
+            ]
+            stage.count(tiles=len(data_source_filtered))
 
     return data_source_filtered
 
@@ -229,21 +517,17 @@ def load_tiles_list_eo(
     :rtype: gp.geodataframe.GeoDataFrame
     """
 
-    # Open the tile list file
-    data_source_filtered = gp.read_file(filename_tiles_list)
-    # Check to see if shapefile is found.
-    if data_source_filtered is None:
-        LOGGER.error("ERROR: Could not open %s", filename_tiles_list)
-        raise IOError
-
-    feature_count = len(data_source_filtered)
-    LOGGER.info("Number of features in %s: %s", filename_tiles_list.name, feature_count)
-
-    return data_source_filtered
+    # The tile list file is read once, then served from the in-memory catalog
+    return get_catalog(filename_tiles_list).tiles.copy()
 
 
 def create_tiles_list_eo(
-    filename_tiles_list: Path, filename_aoi: Path, min_overlap=None
+    filename_tiles_list: Path,
+    filename_aoi: Path,
+    min_overlap=None,
+    aoi_mode="first",
+    executor="process",
+    area_mode=PLANAR,
 ) -> gp.geodataframe.GeoDataFrame:
     """Create the EO tile list according to an aoi
 
@@ -252,9 +536,152 @@ def create_tiles_list_eo(
     :param filename_aoi: Path to the input AOI file (Must be a shp file)
     :type filename_aoi: pathlib.Path
     :param min_overlap: (Optional, default=None) Minimum percentage of overlap
+    :param aoi_mode: (Optional, default="first") "first" to query the first feature of the AOI
+    file, "union" for the union of its features, "features" to query each feature,
+    see create_tiles_list_eo_from_features
+    :type aoi_mode: str
+    :param executor: (Optional, default="process") Pool running the per feature queries:
+    "process", "thread" or None to run them one after another
+    :type executor: str
+    :param area_mode: (Optional, default="planar") Areas used for the overlap: "planar" in
+    square degrees, or "geodesic"
+    :type area_mode: str
     :return: list of EO tiles
     :rtype: gp.geodataframe.GeoDataFrame
     """
+    if aoi_mode == "features":
+        return create_tiles_list_eo_from_features(
+            filename_tiles_list, load_aoi_features(filename_aoi), min_overlap, area_mode, executor
+        )
     # Load the aoi
-    geom = load_aoi(filename_aoi)
-    return create_tiles_list_eo_from_geometry(filename_tiles_list, geom, min_overlap)
+    geom = load_aoi(filename_aoi, aoi_mode)
+    return create_tiles_list_eo_from_geometry(filename_tiles_list, geom, min_overlap, area_mode)
+
+
+def create_tiles_list_eo_from_features(
+    filename_tiles_list: Path,
+    features: gp.GeoDataFrame,
+    min_overlap=None,
+    area_mode=PLANAR,
+    executor="process",
+) -> gp.geodataframe.GeoDataFrame:
+    """Create the EO tile list of each feature of an AOI
+
+    The features are queried in the pool of the executor, whose process workers keep
+    their own grid catalogs between queries.
+
+    :param filename_tiles_list: Path to the file containing the list of tiles
+    :type filename_tiles_list: Path
+    :param features: The AOI features, in WGS84
+    :type features: gp.GeoDataFrame
+    :param min_overlap: (Optional, default=None) Minimum percentage of overlap,
+    applied to each (feature, tile) pair
+    :param area_mode: (Optional, default="planar") Areas used for the overlap: "planar" in
+    square degrees, or "geodesic"
+    :param executor: (Optional, default="process") Pool running the queries:
+    "process", "thread" or None to run them one after another
+    :return: one row per (feature, tile) pair, in the feature order: the feature index label
+    in an "aoi_index" column, the tile columns, then the feature attributes, prefixed with
+    "aoi_" when their name is already used
+    :rtype: gp.geodataframe.GeoDataFrame
+    """
+    features = features[features.geometry.notna() & ~features.geometry.is_empty]
+    geoms = list(features.geometry.values)
+    args = (repeat(filename_tiles_list), geoms, repeat(min_overlap), repeat(area_mode))
+    if executor is None:
+        tile_lists = list(map(create_tiles_list_eo_from_geometry, *args))
+    else:
+        chunksize = max(1, len(geoms) // (4 * MAX_WORKERS))
+        pool = get_executor(executor)
+        tile_lists = list(pool.map(create_tiles_list_eo_from_geometry, *args, chunksize=chunksize))
+
+    attributes = features.drop(columns=features.geometry.name)
+    outputs = []
+    for position, tiles in enumerate(tile_lists):
+        output = tiles.reset_index(drop=True)
+        output.insert(0, "aoi_index", features.index[position])
+        for column, value in attributes.iloc[position].items():
+            name = f"aoi_{column}" if column in output.columns else column
+            output[name] = value
+        outputs.append(output)
+    LOGGER.info(
+        "Number of (feature, tile) pairs in %s: %s",
+        Path(filename_tiles_list).name,
+        sum(len(output) for output in outputs),
+    )
+    if not outputs:
+        return gp.GeoDataFrame({"aoi_index": [], "id": []}, geometry=[], crs="epsg:4326")
+    return gp.GeoDataFrame(pd.concat(outputs, ignore_index=True), geometry="geometry")
+
+
+def get_executor(kind: str) -> Executor:
+    """
+    Returns the process-wide executor of a kind, creating it if needed.
+    Process workers keep their own grid catalogs between queries.
+
+    :param kind: "thread" or "process"
+    :raises ValueError: when the kind of executor is unknown
+    """
+    if kind not in ("thread", "process"):
+        raise ValueError(f"Unknown executor {kind}, expected 'thread' or 'process'")
+    with _EXECUTORS_LOCK:
+        if kind not in _EXECUTORS:
+            if kind == "thread":
+                _EXECUTORS[kind] = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+            else:
+                _EXECUTORS[kind] = ProcessPoolExecutor(max_workers=MAX_WORKERS)
+    return _EXECUTORS[kind]
+
+
+def _timed_query(
+    filename_tiles_list: Path, geom: Polygon, min_overlap=None, area_mode=PLANAR
+) -> Tuple[gp.geodataframe.GeoDataFrame, float]:
+    start = time.perf_counter()
+    with span("query_source", grid=Path(filename_tiles_list).name) as stage:
+        tile_list = create_tiles_list_eo_from_geometry(
+            filename_tiles_list, geom, min_overlap, area_mode
+        )
+        stage.count(tiles=len(tile_list))
+    return tile_list, time.perf_counter() - start
+
+
+def query_sources(
+    filenames: Dict[str, Path],
+    geom: Polygon,
+    min_overlap=None,
+    executor: Optional[str] = "thread",
+    timings: Optional[Dict[str, float]] = None,
+    area_mode: str = PLANAR,
+) -> Dict[str, gp.geodataframe.GeoDataFrame]:
+    """Queries several tile sources with the same AOI geometry, concurrently
+
+    :param filenames: The tile list file of each source
+    :type filenames: Dict[str, Path]
+    :param geom: AOI geometry, in WGS84
+    :param min_overlap: (Optional, default=None) Minimum percentage of overlap
+    :param executor: (Optional, default="thread") "thread", "process" or None to run the
+    queries one after another
+    :param timings: (Optional, default=None) Filled with the wall time of each source, in seconds
+    :param area_mode: (Optional, default="planar") Areas used for the overlap: "planar" in
+    square degrees, or "geodesic"
+    :return: the EO tiles of each source
+    :rtype: Dict[str, gp.geodataframe.GeoDataFrame]
+    """
+    if executor is None or len(filenames) < 2:
+        results = {
+            source: _timed_query(filename, geom, min_overlap, area_mode)
+            for source, filename in filenames.items()
+        }
+    else:
+        pool = get_executor(executor)
+        futures = {
+            source: pool.submit(_timed_query, filename, geom, min_overlap, area_mode)
+            for source, filename in filenames.items()
+        }
+        results = {source: future.result() for source, future in futures.items()}
+
+    for source, (tile_list, elapsed) in results.items():
+        LOGGER.info("%s query: %s tiles in %.3f s", source, len(tile_list), elapsed)
+        if timings is not None:
+            timings[source] = elapsed
+    return {source: tile_list for source, (tile_list, _) in results.items()}
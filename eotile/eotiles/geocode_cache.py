@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+On-disk cache of the geocoding requests
+
+Responses are stored as JSON in a SQLite database, keyed by the request
+parameters. Entries expire after a time to live, and the least recently used
+ones are evicted when the cache holds too many entries. Every operation opens
+its own connection, so that the cache can be shared by threads and processes.
+
+The cache is configured with environment variables:
+
+* EOTILE_GEOCODE_CACHE: path of the database, "off" to disable the cache
+* EOTILE_GEOCODE_TTL: time to live of the entries, in seconds
+* EOTILE_GEOCODE_MAX_ENTRIES: maximum number of entries
+
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+
+LOGGER = logging.getLogger("dev_logger")
+
+DEFAULT_TTL = 30 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 10000
+CACHE_FILENAME = "geocode.sqlite"
+DISABLED = "off"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS geocode (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+)
+"""
+
+
+def default_cache_path() -> Path:
+    """Returns the default path of the geocoding cache, in the user cache directory"""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "eotile" / CACHE_FILENAME
+
+
+class GeocodeCache:
+    """
+    Persistent cache of geocoding responses, with a time to live and LRU eviction
+
+    :param path: Path of the SQLite database, created when missing
+    :param ttl: (Optional, default = 30 days) Time to live of the entries, in seconds
+    :param max_entries: (Optional, default = 10000) Number of entries kept at most
+    """
+
+    def __init__(
+        self, path: Path, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES
+    ):
+        self.path = Path(path)
+        self.ttl = float(ttl)
+        self.max_entries = int(max_entries)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(str(self.path), timeout=30)
+
+    @staticmethod
+    def make_key(parameters: Sequence[Any]) -> str:
+        """Builds the key of a request from its parameters"""
+        return json.dumps(list(parameters))
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Reads a response
+
+        :param key: Key of the request, see :meth:`make_key`
+        :return: the response, None when missing, expired or when the database cannot be read
+        """
+        now = time.time()
+        try:
+            with closing(self._connect()) as connection, connection:
+                row = connection.execute(
+                    "SELECT value, created FROM geocode WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                if now - row[1] > self.ttl:
+                    connection.execute("DELETE FROM geocode WHERE key = ?", (key,))
+                    return None
+                connection.execute("UPDATE geocode SET accessed = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as error:
+            # A locked or damaged database: the request is sent to the geocoder
+            LOGGER.warning("Cannot read the geocoding cache %s: %s", self.path, error)
+            return None
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Any) -> None:
+        """
+        Stores a response, then evicts the least recently used entries beyond the size limit
+
+        :param key: Key of the request, see :meth:`make_key`
+        :param value: The response, serializable to JSON
+        """
+        now = time.time()
+        try:
+            with closing(self._connect()) as connection, connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO geocode (key, value, created, accessed) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), now, now),
+                )
+                connection.execute(
+                    "DELETE FROM geocode WHERE key IN ("
+                    "SELECT key FROM geocode ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+        except sqlite3.Error as error:
+            # The response is still returned, only not kept
+            LOGGER.warning("Cannot write to the geocoding cache %s: %s", self.path, error)
+
+    def clear(self) -> int:
+        """
+        Removes all the entries
+
+        :return: the number of removed entries
+        """
+        connection = self._connect()
+        try:
+            with connection:
+                return connection.execute("DELETE FROM geocode").rowcount
+        finally:
+            connection.close()
+
+    def __len__(self) -> int:
+        connection = self._connect()
+        try:
+            return connection.execute("SELECT COUNT(*) FROM geocode").fetchone()[0]
+        finally:
+            connection.close()
+
+
+_CACHES: Dict[tuple, GeocodeCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_geocode_cache() -> Optional[GeocodeCache]:
+    """
+    Returns the geocoding cache configured by the environment
+
+    :return: the cache, None when it is disabled or cannot be opened
+    :rtype: GeocodeCache
+    """
+    path = os.environ.get("EOTILE_GEOCODE_CACHE") or default_cache_path()
+    if str(path).lower() == DISABLED:
+        return None
+    config = (
+        str(path),
+        float(os.environ.get("EOTILE_GEOCODE_TTL", DEFAULT_TTL)),
+        int(os.environ.get("EOTILE_GEOCODE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+    )
+    with _CACHES_LOCK:
+        if config not in _CACHES:
+            try:
+                _CACHES[config] = GeocodeCache(*config)
+            except (OSError, sqlite3.Error) as error:
+                # The requests still work without the cache
+                LOGGER.warning("Geocoding cache disabled, cannot open %s: %s", path, error)
+                return None
+        return _CACHES[config]
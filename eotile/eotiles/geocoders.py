@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Geocoding backends, which resolve location inputs to administrative boundaries
+
+A backend answers a search with a GeoJSON feature collection holding the best
+match, or no feature. Nominatim is used by default; :class:`BoundaryFileBackend`
+resolves names offline from an administrative boundary file.
+
+The default backend is configured with environment variables:
+
+* EOTILE_GEOCODER: "nominatim", or the path of a boundary GeoPackage
+* EOTILE_NOMINATIM_URL: base URL of the Nominatim server, e.g. a local mirror
+
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from eotile.eotiles.geocode_cache import GeocodeCache, get_geocode_cache
+from eotile.eotiles.profiling import span
+
+LOGGER = logging.getLogger("dev_logger")
+
+NOMINATIM = "nominatim"
+NOMINATIM_URL = "https://nominatim.openstreetmap.org"
+# Type of the features returned by the boundary files, as Nominatim names it
+ADMINISTRATIVE = "administrative"
+
+
+def feature_collection(features: List[dict]) -> dict:
+    """Wraps features into a GeoJSON feature collection"""
+    return {"type": "FeatureCollection", "features": features}
+
+
+class GeocodingBackend(ABC):
+    """
+    Base class of the geocoding backends
+    """
+
+    @abstractmethod
+    def search(self, query: str, location_type=None, threshold=None) -> dict:
+        """
+        Looks for the boundary of a location
+
+        :param query: Name of the location
+        :type query: str
+        :param location_type: (Optional, default = None) Type of the location:
+        city, county, state or country
+        :type location_type: str
+        :param threshold: (Optional, default = None) Simplification tolerance of the boundary,
+        in degrees
+        :type threshold: str
+        :return: A GeoJSON feature collection holding the best match, empty when nothing matches
+        :rtype: dict
+        """
+
+
+class NominatimBackend(GeocodingBackend):
+    """
+    Searches an OpenStreetMap Nominatim server. Responses are kept in the geocoding cache.
+
+    :param base_url: (Optional, default = None) Base URL of the server, EOTILE_NOMINATIM_URL
+    or the public server when None
+    :type base_url: str
+    """
+
+    def __init__(self, base_url: Optional[str] = None):
+        if base_url is None:
+            base_url = os.environ.get("EOTILE_NOMINATIM_URL", NOMINATIM_URL)
+        self.base_url = base_url.rstrip("/")
+
+    def search(self, query: str, location_type=None, threshold=None) -> dict:
+        """
+        See :meth:`GeocodingBackend.search`
+
+        :raises requests.HTTPError: when the request fails, failures are not cached
+        """
+        with span("geocode", backend="nominatim") as stage:
+            return self._search(query, location_type, threshold, stage)
+
+    def _search(self, query, location_type, threshold, stage) -> dict:
+        cache = get_geocode_cache()
+        key = GeocodeCache.make_key([self.base_url, query, location_type, threshold])
+        if cache is not None:
+            response = cache.get(key)
+            if response is not None:
+                stage.count(cached=1)
+                return response
+
+        import requests
+
+        params = {
+            location_type if location_type is not None else "q": query,
+            "format": "geojson",
+            "polygon_geojson": 1,
+            "limit": 1,
+        }
+        if threshold is not None:
+            params["polygon_threshold"] = threshold
+        data = requests.get(
+            f"{self.base_url}/search", params=params, headers={"User-Agent": "eotile"}, timeout=60
+        )
+        data.raise_for_status()
+        response = data.json()
+        if cache is not None:
+            cache.put(key, response)
+        return response
+
+
+def normalize_name(name: str) -> str:
+    """Lower case name without accents nor repeated spaces, used to match location names"""
+    name = unicodedata.normalize("NFKD", str(name))
+    name = "".join(char for char in name if not unicodedata.combining(char))
+    return re.sub(r"\s+", " ", name).strip().casefold()
+
+
+class BoundaryFileBackend(GeocodingBackend):
+    """
+    Resolves location names offline, from a file of administrative boundaries
+
+    The names of the file are read once into a hash index, then only the geometry of
+    the matching feature is read. GeoPackage names are read with SQLite, without
+    going through GDAL.
+
+    :param filename: Path to the boundary file, usually a GeoPackage
+    :type filename: Path
+    :param name_column: (Optional, default = "name") Column of the location names
+    :type name_column: str
+    :param type_column: (Optional, default = None) Column of the location types
+    (city, county, state, country), used to filter on the location type
+    :type type_column: str
+    :param layer: (Optional, default = None) Layer of the boundaries, the first one when None
+    :type layer: str
+    """
+
+    def __init__(
+        self,
+        filename: Path,
+        name_column: str = "name",
+        type_column: Optional[str] = None,
+        layer: Optional[str] = None,
+    ):
+        self.filename = Path(filename)
+        if not self.filename.exists():
+            raise FileNotFoundError(f"Boundary file not found: {self.filename}")
+        self.name_column = name_column
+        self.type_column = type_column
+        self.layer = layer
+        self._index: Optional[Dict[str, List[Tuple[int, Optional[str]]]]] = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Sent to the worker processes without the index, rebuilt there
+        state = self.__dict__.copy()
+        state["_index"] = None
+        state["_lock"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _read_names_gpkg(self) -> List[tuple]:
+        columns = [self.name_column] + ([self.type_column] if self.type_column else [])
+        connection = sqlite3.connect(f"file:{self.filename}?mode=ro", uri=True)
+        try:
+            if self.layer is None:
+                self.layer = connection.execute(
+                    "SELECT table_name FROM gpkg_contents WHERE data_type = 'features' "
+                    "ORDER BY rowid LIMIT 1"
+                ).fetchone()[0]
+            primary_key = next(
+                row[1]
+                for row in connection.execute(f'PRAGMA table_info("{self.layer}")')
+                if row[5]
+            )
+            selected = ", ".join(f'"{column}"' for column in [primary_key] + columns)
+            return connection.execute(f'SELECT {selected} FROM "{self.layer}"').fetchall()
+        finally:
+            connection.close()
+
+    def _read_names(self) -> List[tuple]:
+        import fiona
+
+        with fiona.open(str(self.filename), layer=self.layer) as source:
+            return [
+                (fid, feature["properties"][self.name_column])
+                + ((feature["properties"][self.type_column],) if self.type_column else ())
+                for fid, feature in source.items()
+            ]
+
+    @property
+    def index(self) -> Dict[str, List[Tuple[int, Optional[str]]]]:
+        """Feature ids and types of each normalized location name, in the file order"""
+        with self._lock:
+            if self._index is None:
+                if self.filename.suffix == ".gpkg":
+                    rows = self._read_names_gpkg()
+                else:
+                    rows = self._read_names()
+                index: Dict[str, List[Tuple[int, Optional[str]]]] = {}
+                for fid, name, *location_type in rows:
+                    if name is not None:
+                        index.setdefault(normalize_name(name), []).append(
+                            (int(fid), location_type[0] if location_type else None)
+                        )
+                self._index = index
+                LOGGER.info("Indexed %s location names of %s", len(index), self.filename)
+        return self._index
+
+    def search(self, query: str, location_type=None, threshold=None) -> dict:
+        """
+        See :meth:`GeocodingBackend.search`. The first matching feature of the file is returned.
+        """
+        with span("geocode", backend="boundary_file"):
+            return self._search(query, location_type, threshold)
+
+    def _search(self, query, location_type, threshold) -> dict:
+        matches = self.index.get(normalize_name(query), [])
+        if location_type is not None and self.type_column is not None:
+            wanted = normalize_name(location_type)
+            matches = [
+                match for match in matches
+                if match[1] is not None and normalize_name(match[1]) == wanted
+            ]
+        if not matches:
+            return feature_collection([])
+
+        import fiona
+        from shapely.geometry import mapping, shape
+
+        from eotile.eotiles.reprojection import reproject_geometry
+
+        with fiona.open(str(self.filename), layer=self.layer) as source:
+            feature = source[matches[0][0]]
+            crs = source.crs_wkt or None
+        geom = reproject_geometry(shape(feature["geometry"]), crs)
+        if threshold is not None:
+            geom = geom.simplify(float(threshold))
+        properties = {"name": feature["properties"][self.name_column], "type": ADMINISTRATIVE}
+        return feature_collection(
+            [{"type": "Feature", "properties": properties, "geometry": mapping(geom)}]
+        )
+
+
+_GEOCODERS: Dict[str, GeocodingBackend] = {}
+_GEOCODERS_LOCK = threading.Lock()
+_DEFAULT_GEOCODER: Optional[GeocodingBackend] = None
+
+
+def set_geocoder(geocoder: Optional[GeocodingBackend]) -> None:
+    """
+    Sets the default geocoding backend of the process
+
+    :param geocoder: The backend, None to go back to the one configured by the environment
+    """
+    global _DEFAULT_GEOCODER
+    _DEFAULT_GEOCODER = geocoder
+
+
+def get_geocoder() -> GeocodingBackend:
+    """
+    Returns the default geocoding backend: the one set by :func:`set_geocoder`,
+    or else the one configured by EOTILE_GEOCODER
+
+    :rtype: GeocodingBackend
+    """
+    if _DEFAULT_GEOCODER is not None:
+        return _DEFAULT_GEOCODER
+    config = os.environ.get("EOTILE_GEOCODER") or NOMINATIM
+    if config == NOMINATIM:
+        # Follows EOTILE_NOMINATIM_URL
+        return NominatimBackend()
+    with _GEOCODERS_LOCK:
+        if config not in _GEOCODERS:
+            _GEOCODERS[config] = BoundaryFileBackend(Path(config))
+        return _GEOCODERS[config]
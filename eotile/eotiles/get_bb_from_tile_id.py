@@ -27,13 +27,14 @@ Generate tile list according AOI
 """
 
 from pathlib import Path
-from typing import Tuple, List
+from typing import Dict, Tuple, List
 import geopandas as gp
-from eotile.eotiles.eotiles import (
-    get_tile,
-    load_tiles_list_eo,
-    create_tiles_list_eo_from_geometry,
-)
+from eotile.eotiles import wrs2
+from eotile.eotiles.catalog import get_catalog, get_grid_filename
+from eotile.eotiles.crossref import get_crossref
+from eotile.eotiles.eotiles import query_sources
+from eotile.eotiles.overlap import PLANAR
+from eotile.eotiles.profiling import span
 import logging
 import re
 import pandas as pd
@@ -67,6 +68,8 @@ def tile_id_matcher(input_value: str) -> Tuple[bool, bool, bool, bool]:
     is_dem = (dem_reg.match(input_value) is not None) and dem_reg.match(input_value).string == input_value
     is_s2 = (s2_reg.match(input_value) is not None) and s2_reg.match(input_value).string == input_value
     is_l8 = (l8_reg.match(input_value) is not None) and l8_reg.match(input_value).string == input_value
+    # The path / row must exist on the WRS-2 grid
+    is_l8 = is_l8 and wrs2.is_valid_tile_id(input_value)
     is_srtm_5x5 = (srtm_5x5_reg.match(input_value) is not None) \
                   and srtm_5x5_reg.match(input_value).string == input_value
 
@@ -78,17 +81,66 @@ def tile_id_matcher(input_value: str) -> Tuple[bool, bool, bool, bool]:
 
 
 def build_reference_geom(file_name, tile_id_list):
-    output = gp.GeoDataFrame()
+    """
+    Resolves a list of tile ids of a grid file and merges their footprints
 
-    tile_list = load_tiles_list_eo(file_name)
+    :param file_name: Path to the grid file
+    :param tile_id_list: The tile ids
+    :return: the last tile, the union of the footprints and the tiles
+    :raises SystemExit: listing all the invalid tile ids, or when no tile id is given
+    """
+    if len(tile_id_list) == 0:
+        dev_logger.error("No tile id given. Exiting...")
+        raise SystemExit("Invalid Tile id: no tile id given")
+    with span("reference_tiles", grid=Path(file_name).name, ids=len(tile_id_list)):
+        output, unknown = get_catalog(file_name).get_tiles(tile_id_list)
+        if unknown:
+            dev_logger.error("Tile IDs are not valid: %s. Exiting...", ", ".join(unknown))
+            raise SystemExit(f'Invalid Tile id {", ".join(unknown)}')
 
-    for tile_id in tile_id_list:
-        tile = get_tile(tile_list, tile_id)
-        output = output.append(tile)
+        geometry = unary_union(list(output.geometry))
 
-    geometry = unary_union(list(output.geometry))
+    return output.iloc[-1], geometry, output
 
-    return tile, geometry, output
+
+def lookup_crossref(
+        aux_data_dirpath: Path,
+        reference_filename: Path,
+        filenames: Dict[str, Path],
+        tile_id_list: List,
+        min_overlap=None,
+        area_mode=PLANAR,
+) -> Dict[str, gp.GeoDataFrame]:
+    """
+    Answers tile id queries from the cross-reference table, when it is available
+
+    :param aux_data_dirpath: Path to the input aux data
+    :param reference_filename: The grid file of the input tile ids
+    :param filenames: The grid file of each requested tile source
+    :param tile_id_list: The input tile ids
+    :param min_overlap: (Optional, default = None) Minimum percentage of overlap
+    :param area_mode: (Optional, default = "planar") Areas used for the overlap
+    :return: the tiles of the sources the table can answer for
+    """
+    crossref = get_crossref(aux_data_dirpath)
+    outputs = {}
+    # The table holds planar overlaps
+    if crossref is None or (min_overlap is not None and area_mode != PLANAR):
+        return outputs
+    with span("crossref_lookup", sources=len(filenames)) as stage:
+        for source, filename in filenames.items():
+            overlaps = crossref.lookup(
+                reference_filename.name, filename.name, tile_id_list, min_overlap
+            )
+            if overlaps is not None:
+                tiles, _ = get_catalog(filename).get_tiles(overlaps.index)
+                if min_overlap is not None:
+                    # By id, as get_tiles gives every row of an id repeated in the grid
+                    tiles["overlap"] = tiles["id"].map(overlaps).to_numpy()
+                outputs[source] = tiles
+                dev_logger.info("%s tiles read from the cross-reference table", source)
+        stage.count(answered=len(outputs), tiles=sum(len(elt) for elt in outputs.values()))
+    return outputs
 
 
 def get_tiles_from_tile_id(
@@ -100,6 +152,9 @@ def get_tiles_from_tile_id(
         srtm5x5: bool,
         min_overlap=None,
         overlap=False,
+        executor="thread",
+        timings=None,
+        area_mode=PLANAR,
 ) -> Tuple[gp.GeoDataFrame, gp.GeoDataFrame, gp.GeoDataFrame, gp.GeoDataFrame]:
     """Returns the bounding box of a tile designated by its ID.
 
@@ -117,17 +172,21 @@ def get_tiles_from_tile_id(
     tile to be considered overlapping ?
     :param overlap: (Optional, default = False) Do you want to use the overlapping source file ?
     :type overlap: Boolean
+    :param executor: (Optional, default = "thread") Pool running the queries of the other
+    tile sources: "thread", "process" or None to run them one after another
+    :type executor: str
+    :param timings: (Optional, default = None) Filled with the wall time of each tile source
+    query, in seconds
+    :type timings: dict
+    :param area_mode: (Optional, default = "planar") Areas used for the overlap: "planar" in
+    square degrees, or "geodesic"
+    :type area_mode: str
     :return: Two lists of tiles
     """
-    if not overlap:
-        filename_tiles_s2 = aux_data_dirpath / "s2_no_overlap.gpkg"
-
-    else:
-        filename_tiles_s2 = aux_data_dirpath / "s2_with_overlap.gpkg"
-
-    filename_tiles_l8 = aux_data_dirpath / "l8_tiles.gpkg"
-    filename_tiles_srtm5x5 = aux_data_dirpath / "srtm5x5_tiles.gpkg"
-    filename_tiles_dem = aux_data_dirpath / "DEM_Union.gpkg"
+    filename_tiles_s2 = get_grid_filename(aux_data_dirpath, "S2", overlap)
+    filename_tiles_l8 = get_grid_filename(aux_data_dirpath, "L8")
+    filename_tiles_srtm5x5 = get_grid_filename(aux_data_dirpath, "SRTM 5x5")
+    filename_tiles_dem = get_grid_filename(aux_data_dirpath, "DEM")
 
     [is_s2, is_l8, is_dem, is_srtm5x5] = tile_id_matcher(tile_id_list[0])
 
@@ -136,37 +195,56 @@ def get_tiles_from_tile_id(
     if is_l8:
         # Search on L8 Tiles
         tile, geometry, output_l8 = build_reference_geom(filename_tiles_l8, tile_id_list)
+        reference_filename = filename_tiles_l8
 
     if is_dem:
         # Search on DEM Tiles
         tile, geometry, output_dem = build_reference_geom(filename_tiles_dem, tile_id_list)
+        reference_filename = filename_tiles_dem
 
     if is_srtm5x5:
         # Search on specific SRTM 5x5 Tiles
         tile, geometry, output_srtm5x5 = build_reference_geom(filename_tiles_srtm5x5, tile_id_list)
+        reference_filename = filename_tiles_srtm5x5
 
     if is_s2:
         # Search on s2 Tiles
         tile, geometry, output_s2 = build_reference_geom(filename_tiles_s2, tile_id_list)
+        reference_filename = filename_tiles_s2
 
     try:
         if tile is not None:
+            filenames = {}
             if not is_l8 and not s2_only:
-                output_l8 = create_tiles_list_eo_from_geometry(
-                    filename_tiles_l8, geometry, min_overlap
-                )
+                filenames["L8"] = filename_tiles_l8
             if not is_s2 and not l8_only:
-                output_s2 = create_tiles_list_eo_from_geometry(
-                    filename_tiles_s2, geometry, min_overlap
-                )
+                filenames["S2"] = filename_tiles_s2
             if not is_dem and dem:
-                output_dem = create_tiles_list_eo_from_geometry(
-                    filename_tiles_dem, geometry, min_overlap
-                )
+                filenames["DEM"] = filename_tiles_dem
             if not is_srtm5x5 and srtm5x5:
-                output_srtm5x5 = create_tiles_list_eo_from_geometry(
-                    filename_tiles_srtm5x5, geometry, min_overlap
-                )
+                filenames["SRTM 5x5"] = filename_tiles_srtm5x5
+            outputs = lookup_crossref(
+                aux_data_dirpath,
+                reference_filename,
+                filenames,
+                tile_id_list,
+                min_overlap,
+                area_mode,
+            )
+            remaining = {
+                source: filename for source, filename in filenames.items() if source not in outputs
+            }
+            outputs.update(
+                query_sources(remaining, geometry, min_overlap, executor, timings, area_mode)
+            )
+            if "L8" in outputs:
+                output_l8 = outputs["L8"]
+            if "S2" in outputs:
+                output_s2 = outputs["S2"]
+            if "DEM" in outputs:
+                output_dem = outputs["DEM"]
+            if "SRTM 5x5" in outputs:
+                output_srtm5x5 = outputs["SRTM 5x5"]
     except (UnboundLocalError, IndexError) as e:
         dev_logger.error(e)
         return gp.GeoDataFrame(), gp.GeoDataFrame(), gp.GeoDataFrame(), gp.GeoDataFrame()
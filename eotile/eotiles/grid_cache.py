@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Binary cache of the tile grids
+
+A grid file is flattened into a directory of NumPy arrays, stored next to it:
+ids, bounds, coordinates with their ring / polygon / geometry offsets, and one
+array per attribute. The arrays are memory-mapped when the cache is open, so
+that only the rows which are used are read, without going through GDAL.
+
+The cache records the modification time and size of its grid file and is
+ignored as soon as the grid file changes.
+
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import geopandas as gp
+import numpy as np
+import pandas as pd
+from shapely.geometry import MultiPolygon, Polygon
+
+LOGGER = logging.getLogger("dev_logger")
+
+CACHE_VERSION = 2
+CACHE_SUFFIX = ".cache"
+META_FILENAME = "meta.json"
+ARRAY_NAMES = [
+    "ids",
+    "bounds",
+    "coords",
+    "ring_offsets",
+    "polygon_offsets",
+    "geometry_offsets",
+    "multi",
+]
+# Types of the non null values of object columns, as inferred by pandas, and their array type
+OBJECT_DTYPES = {"boolean": bool, "integer": np.int64, "floating": float}
+
+
+def cache_dirpath(filename_tiles_list: Path) -> Path:
+    """
+    Returns the directory of the cache of a grid file
+
+    :param filename_tiles_list: Path to the grid file
+    :rtype: Path
+    """
+    filename_tiles_list = Path(filename_tiles_list)
+    return filename_tiles_list.with_name(filename_tiles_list.name + CACHE_SUFFIX)
+
+
+def _source_signature(filename_tiles_list: Path) -> dict:
+    stat = Path(filename_tiles_list).stat()
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def _polygons(geometry) -> List[Polygon]:
+    if geometry is None or geometry.is_empty:
+        return []
+    if isinstance(geometry, Polygon):
+        return [geometry]
+    return list(geometry.geoms)
+
+
+def _column_arrays(values: np.ndarray):
+    """
+    Converts a column to an array numpy can save without pickling, and its null mask
+
+    :param values: The column values
+    :return: the array, and the null mask (None when the column has no null value)
+    """
+    if values.dtype.kind in "biufM":
+        # NaN and NaT are saved as they are
+        return values, None
+    nulls = pd.isna(values)
+    dtype = OBJECT_DTYPES.get(pd.api.types.infer_dtype(values[~nulls], skipna=False), str)
+    # The null values are replaced by the fill value of the type, and restored from the mask
+    array = np.where(nulls, dtype(), values).astype(dtype)
+    return array, nulls if nulls.any() else None
+
+
+def build_cache(filename_tiles_list: Path, tiles: Optional[gp.GeoDataFrame] = None) -> Path:
+    """
+    Builds (or rebuilds) the cache of a grid file
+
+    :param filename_tiles_list: Path to the grid file
+    :type filename_tiles_list: Path
+    :param tiles: (Optional, default = None) The content of the grid file, when already read
+    :type tiles: gp.geodataframe.GeoDataFrame
+    :return: the path of the cache directory
+    :rtype: Path
+    """
+    filename_tiles_list = Path(filename_tiles_list)
+    signature = _source_signature(filename_tiles_list)
+    if tiles is None:
+        tiles = gp.read_file(filename_tiles_list)
+
+    coords, ring_offsets, polygon_offsets, geometry_offsets, multi = [], [0], [0], [0], []
+    n_coords = 0
+    for geometry in tiles.geometry:
+        polygons = _polygons(geometry)
+        for polygon in polygons:
+            for ring in [polygon.exterior, *polygon.interiors]:
+                ring_coords = np.asarray(ring.coords)[:, :2]
+                coords.append(ring_coords)
+                n_coords += len(ring_coords)
+                ring_offsets.append(n_coords)
+            polygon_offsets.append(len(ring_offsets) - 1)
+        geometry_offsets.append(len(polygon_offsets) - 1)
+        multi.append(isinstance(geometry, MultiPolygon))
+
+    arrays = {
+        "ids": np.asarray(tiles["id"].astype(str), dtype=str),
+        "bounds": tiles.geometry.bounds.to_numpy(dtype=float),
+        "coords": np.concatenate(coords) if coords else np.empty((0, 2)),
+        "ring_offsets": np.asarray(ring_offsets, dtype=np.int64),
+        "polygon_offsets": np.asarray(polygon_offsets, dtype=np.int64),
+        "geometry_offsets": np.asarray(geometry_offsets, dtype=np.int64),
+        "multi": np.asarray(multi, dtype=bool),
+    }
+    columns = []
+    for position, column in enumerate(tiles.columns):
+        if column == tiles.geometry.name:
+            columns.append({"name": column, "array": None, "nulls": None})
+            continue
+        values, nulls = _column_arrays(tiles[column].to_numpy())
+        array_name = f"column_{position}"
+        arrays[array_name] = values
+        nulls_name = None
+        if nulls is not None:
+            nulls_name = f"{array_name}_nulls"
+            arrays[nulls_name] = nulls
+        columns.append({"name": column, "array": array_name, "nulls": nulls_name})
+    meta = {
+        "version": CACHE_VERSION,
+        "source": signature,
+        "crs": tiles.crs.to_wkt() if tiles.crs is not None else None,
+        "columns": columns,
+    }
+
+    # Written aside then moved, so that a partial cache is never used
+    dirpath = cache_dirpath(filename_tiles_list)
+    tmp_dirpath = Path(tempfile.mkdtemp(prefix=dirpath.name, dir=dirpath.parent))
+    try:
+        for name, array in arrays.items():
+            np.save(tmp_dirpath / f"{name}.npy", array)
+        with open(tmp_dirpath / META_FILENAME, "w", encoding="utf-8") as meta_file:
+            json.dump(meta, meta_file)
+        if dirpath.exists():
+            shutil.rmtree(dirpath)
+        os.replace(tmp_dirpath, dirpath)
+    except BaseException:
+        shutil.rmtree(tmp_dirpath, ignore_errors=True)
+        raise
+    LOGGER.info("Built the cache of %s in %s", filename_tiles_list.name, dirpath)
+    return dirpath
+
+
+def clear_cache(filename_tiles_list: Path) -> bool:
+    """
+    Removes the cache of a grid file
+
+    :param filename_tiles_list: Path to the grid file
+    :return: True when a cache was removed
+    """
+    dirpath = cache_dirpath(filename_tiles_list)
+    if not dirpath.exists():
+        return False
+    shutil.rmtree(dirpath)
+    return True
+
+
+def open_cache(filename_tiles_list: Path) -> Optional["GridCache"]:
+    """
+    Opens the cache of a grid file
+
+    :param filename_tiles_list: Path to the grid file
+    :return: the cache, or None when there is no cache or when it is out of date
+    :rtype: GridCache
+    """
+    dirpath = cache_dirpath(filename_tiles_list)
+    meta_filename = dirpath / META_FILENAME
+    if not meta_filename.exists() or not Path(filename_tiles_list).exists():
+        return None
+    with open(meta_filename, encoding="utf-8") as meta_file:
+        meta = json.load(meta_file)
+    if meta.get("version") != CACHE_VERSION:
+        LOGGER.warning("Ignoring the cache of %s: older format", Path(filename_tiles_list).name)
+        return None
+    if meta.get("source") != _source_signature(filename_tiles_list):
+        LOGGER.warning(
+            "Ignoring the cache of %s: the grid file has changed", Path(filename_tiles_list).name
+        )
+        return None
+    return GridCache(dirpath, meta)
+
+
+class GridCache:
+    """
+    Memory-mapped tile grid, built by :func:`build_cache`
+    """
+
+    def __init__(self, dirpath: Path, meta: dict):
+        self.dirpath = Path(dirpath)
+        self.crs = meta["crs"]
+        self.columns = meta["columns"]
+        self._arrays = {}
+        column_arrays = [
+            name for elt in self.columns for name in (elt["array"], elt["nulls"]) if name
+        ]
+        for name in ARRAY_NAMES + column_arrays:
+            self._arrays[name] = np.load(self.dirpath / f"{name}.npy", mmap_mode="r")
+        self._id_index = None
+
+    def __len__(self) -> int:
+        return len(self._arrays["ids"])
+
+    @property
+    def ids(self) -> np.ndarray:
+        """Tile ids, in the grid file order"""
+        return self._arrays["ids"]
+
+    @property
+    def bounds(self) -> np.ndarray:
+        """(min x, min y, max x, max y) of each tile"""
+        return self._arrays["bounds"]
+
+    @property
+    def id_index(self) -> pd.Index:
+        """Hash index giving the row position of a tile id"""
+        if self._id_index is None:
+            self._id_index = pd.Index(self.ids)
+        return self._id_index
+
+    def query_positions(self, bounds: Sequence[float]) -> np.ndarray:
+        """
+        Lists the tiles whose bounding box intersects a bounding box
+
+        :param bounds: (min x, min y, max x, max y)
+        :return: the row positions, in the grid file order
+        """
+        x_min, y_min, x_max, y_max = bounds
+        tile_bounds = self.bounds
+        keep = (
+            (tile_bounds[:, 0] <= x_max)
+            & (tile_bounds[:, 2] >= x_min)
+            & (tile_bounds[:, 1] <= y_max)
+            & (tile_bounds[:, 3] >= y_min)
+        )
+        return np.flatnonzero(keep)
+
+    def geometries(self, positions: Sequence[int]) -> list:
+        """Rebuilds the footprints of some tiles"""
+        coords = self._arrays["coords"]
+        ring_offsets = self._arrays["ring_offsets"]
+        polygon_offsets = self._arrays["polygon_offsets"]
+        geometry_offsets = self._arrays["geometry_offsets"]
+        multi = self._arrays["multi"]
+        geometries = []
+        for position in positions:
+            polygons = []
+            for polygon in range(geometry_offsets[position], geometry_offsets[position + 1]):
+                rings = [
+                    np.array(coords[ring_offsets[ring]:ring_offsets[ring + 1]])
+                    for ring in range(polygon_offsets[polygon], polygon_offsets[polygon + 1])
+                ]
+                polygons.append(Polygon(rings[0], rings[1:]))
+            if not polygons:
+                geometries.append(None)
+            elif multi[position]:
+                geometries.append(MultiPolygon(polygons))
+            else:
+                geometries.append(polygons[0])
+        return geometries
+
+    def frame(self, positions: Sequence[int]) -> gp.GeoDataFrame:
+        """
+        Builds the tiles at some row positions
+
+        :param positions: The row positions
+        :return: the tiles, with the columns of the grid file
+        :rtype: gp.geodataframe.GeoDataFrame
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        data = {}
+        geometry_name = "geometry"
+        for column in self.columns:
+            if column["array"] is None:
+                geometry_name = column["name"]
+                data[geometry_name] = self.geometries(positions)
+            else:
+                values = np.array(self._arrays[column["array"]][positions])
+                if column["nulls"] is not None:
+                    values = values.astype(object)
+                    values[self._arrays[column["nulls"]][positions]] = None
+                data[column["name"]] = values
+        return gp.GeoDataFrame(data, geometry=geometry_name, crs=self.crs)
+
+    def to_geodataframe(self) -> gp.GeoDataFrame:
+        """Builds the whole tile grid"""
+        return self.frame(np.arange(len(self)))
@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Analytic DEM 1x1 degree and SRTM 5x5 degree tile grids
+
+Both grids are regular latitude / longitude grids: tile ids, footprints and
+candidates are computed arithmetically. The tiles which exist, and the DEM
+availability flags, come from a compact lookup table stored next to the grid file.
+
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+import logging
+import re
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import geopandas as gp
+import numpy as np
+import pandas as pd
+from shapely.geometry import Polygon, box
+
+LOGGER = logging.getLogger("dev_logger")
+
+DEM_FLAGS = ("EXIST_SRTM", "EXIST_COP30", "EXIST_COP90")
+# Bit of the lookup table telling that a tile exists, the flags use the lower bits
+EXISTS_BIT = 1 << len(DEM_FLAGS)
+
+DEM_ID_REG = re.compile(r"([NS])([0-9]{2,3})([EW])([0-9]{2,3})")
+SRTM5X5_ID_REG = re.compile(r"srtm_([0-9]{2})_([0-9]{2})")
+
+
+def lookup_table_path(filename_tiles_list: Path) -> Path:
+    """Returns the path of the lookup table of a grid file"""
+    return filename_tiles_list.with_name(filename_tiles_list.stem + "_lookup.npy")
+
+
+class LatLonGrid(ABC):
+    """
+    Regular latitude / longitude tile grid
+
+    Rows are counted southwards from ``lat_max`` and columns eastwards from -180,
+    both starting at 0.
+    """
+
+    name = "latlon"
+    cell_size = 1.0
+    lat_max = 90.0
+    lat_min = -90.0
+    # Maximum distance between the nominal cells and the footprints of the grid file
+    margin = 0.0
+    flags: Tuple[str, ...] = ()
+
+    def __init__(self, lookup_table: Optional[Path] = None):
+        self.lookup_table = lookup_table
+        self._lookup = None
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """Number of rows and columns of the grid"""
+        return (
+            int(round((self.lat_max - self.lat_min) / self.cell_size)),
+            int(round(360.0 / self.cell_size)),
+        )
+
+    @property
+    def can_replace_grid(self) -> bool:
+        """The computed footprints can stand in for a missing grid file with a lookup table"""
+        return self.lookup is not None
+
+    @property
+    def lookup(self) -> Optional[np.ndarray]:
+        """Lookup table of the existing tiles and of their flags, None when unavailable"""
+        if self._lookup is None and self.lookup_table is not None:
+            if self.lookup_table.exists():
+                self._lookup = np.load(str(self.lookup_table))
+            else:
+                LOGGER.debug("No lookup table %s", self.lookup_table)
+                self.lookup_table = None
+        return self._lookup
+
+    @abstractmethod
+    def format_ids(self, rows: np.ndarray, cols: np.ndarray) -> List[str]:
+        """Formats the tile ids of cells"""
+
+    @abstractmethod
+    def parse_id(self, tile_id: str) -> Tuple[int, int]:
+        """
+        Returns the row and the column of a tile id
+
+        :raises ValueError: when the tile id is not valid
+        """
+
+    def cells_from_points(self, lons, lats) -> Tuple[np.ndarray, np.ndarray]:
+        """Vectorized row and column of the cells containing points"""
+        n_rows, n_cols = self.shape
+        rows = np.floor((self.lat_max - np.asarray(lats, dtype=float)) / self.cell_size)
+        cols = np.floor((np.asarray(lons, dtype=float) + 180.0) / self.cell_size)
+        return (
+            np.clip(rows.astype(int), 0, n_rows - 1),
+            np.clip(cols.astype(int), 0, n_cols - 1),
+        )
+
+    def cells_from_bounds(self, bounds, margin=0.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Vectorized list of the cells intersecting many bounding boxes
+
+        :param bounds: array of shape (n, 4) of (min lon, min lat, max lon, max lat)
+        :param margin: (Optional, default = 0) Distance added around each bounding box
+        :return: the bounding box index, the row and the column of each (bbox, cell) pair
+        """
+        bounds = np.atleast_2d(np.asarray(bounds, dtype=float))
+        # The south-east corner gives the last row and column of each bbox
+        first_rows, first_cols = self.cells_from_points(
+            bounds[:, 0] - margin, bounds[:, 3] + margin
+        )
+        last_rows, last_cols = self.cells_from_points(
+            bounds[:, 2] + margin, bounds[:, 1] - margin
+        )
+        n_rows = last_rows - first_rows + 1
+        n_cols = last_cols - first_cols + 1
+        counts = n_rows * n_cols
+        aoi_index = np.repeat(np.arange(len(bounds)), counts)
+        # Position of each pair within its bbox
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        rows = np.repeat(first_rows, counts) + offsets // np.repeat(n_cols, counts)
+        cols = np.repeat(first_cols, counts) + offsets % np.repeat(n_cols, counts)
+        if self.lookup is not None:
+            exists = (self.lookup[rows, cols] & EXISTS_BIT) > 0
+            aoi_index, rows, cols = aoi_index[exists], rows[exists], cols[exists]
+        return aoi_index, rows, cols
+
+    def cell_bounds(self, rows, cols) -> np.ndarray:
+        """Vectorized nominal bounds of cells, as an array of shape (n, 4)"""
+        rows = np.asarray(rows)
+        cols = np.asarray(cols)
+        min_lons = -180.0 + cols * self.cell_size
+        max_lats = self.lat_max - rows * self.cell_size
+        return np.stack(
+            [min_lons, max_lats - self.cell_size, min_lons + self.cell_size, max_lats], axis=-1
+        )
+
+    def tile_ids_from_points(self, lons, lats) -> List[str]:
+        """Vectorized ids of the tiles containing points"""
+        rows, cols = self.cells_from_points(np.atleast_1d(lons), np.atleast_1d(lats))
+        return self.format_ids(rows, cols)
+
+    def tile_ids_from_bounds(self, bounds) -> Tuple[np.ndarray, List[str]]:
+        """
+        Vectorized ids of the tiles intersecting many bounding boxes
+
+        :param bounds: array of shape (n, 4) of (min lon, min lat, max lon, max lat)
+        :return: the bounding box index and the tile id of each (bbox, tile) pair
+        """
+        aoi_index, rows, cols = self.cells_from_bounds(bounds)
+        return aoi_index, self.format_ids(rows, cols)
+
+    def tile_ids_from_geometry(self, geom) -> List[str]:
+        """Ids of the nominal tiles intersecting a geometry (point, bbox, polygon)"""
+        if geom.geom_type in ("Point", "MultiPoint"):
+            points = [geom] if geom.geom_type == "Point" else list(geom.geoms)
+            tile_ids = self.tile_ids_from_points(
+                [point.x for point in points], [point.y for point in points]
+            )
+            return [tile_id for tile_id in dict.fromkeys(tile_ids) if self.is_valid_tile_id(tile_id)]
+        _, rows, cols = self.cells_from_bounds([geom.bounds])
+        tile_ids = self.format_ids(rows, cols)
+        if geom.equals(box(*geom.bounds)):
+            return tile_ids
+        cells = [box(*elt) for elt in self.cell_bounds(rows, cols)]
+        return [tile_id for tile_id, cell in zip(tile_ids, cells) if cell.intersects(geom)]
+
+    def tile_bounds(self, tile_ids: Sequence[str]) -> np.ndarray:
+        """
+        Nominal bounds of tiles, as an array of shape (n, 4)
+
+        :raises ValueError: when a tile id is not valid
+        """
+        cells = np.array([self.parse_id(tile_id) for tile_id in tile_ids], dtype=int)
+        return self.cell_bounds(cells[:, 0], cells[:, 1])
+
+    # Analytic engine interface of the tile catalog
+
+    def is_valid_tile_id(self, tile_id: str) -> bool:
+        """Tells whether a tile id designates an existing tile"""
+        try:
+            row, col = self.parse_id(tile_id)
+        except ValueError:
+            return False
+        if self.lookup is not None:
+            return bool(self.lookup[row, col] & EXISTS_BIT)
+        return True
+
+    def may_be_tile_id(self, tile_id: str) -> bool:
+        """
+        Tells whether a tile id may designate a tile of the grid, exactly when the lookup
+        table is available
+        """
+        return self.is_valid_tile_id(tile_id)
+
+    def candidate_tile_ids(self, bounds: Sequence[float]) -> List[str]:
+        """Lists the ids of the tiles which may intersect a bounding box"""
+        _, rows, cols = self.cells_from_bounds([bounds], margin=self.margin)
+        return self.format_ids(rows, cols)
+
+    def tile_footprints(self, tile_ids: Sequence[str]) -> List[Optional[Polygon]]:
+        """Computes the nominal footprints of tiles from their ids, None for the invalid ids"""
+        footprints: List[Optional[Polygon]] = []
+        for tile_id in tile_ids:
+            if self.is_valid_tile_id(tile_id):
+                footprints.append(box(*self.tile_bounds([tile_id])[0]))
+            else:
+                footprints.append(None)
+        return footprints
+
+    def tile_attributes(self, tile_ids: Sequence[str]) -> pd.DataFrame:
+        """
+        Attributes of the tiles joined from the lookup table
+
+        :return: a DataFrame with one boolean column per flag, empty without lookup table
+        """
+        if self.lookup is None or not self.flags:
+            return pd.DataFrame(index=range(len(tile_ids)))
+        cells = np.array([self.parse_id(tile_id) for tile_id in tile_ids], dtype=int)
+        cells = cells.reshape(-1, 2)
+        values = self.lookup[cells[:, 0], cells[:, 1]]
+        return pd.DataFrame(
+            {flag: (values & (1 << bit)) > 0 for bit, flag in enumerate(self.flags)}
+        )
+
+    def build_lookup_table(self, tile_list: gp.GeoDataFrame) -> np.ndarray:
+        """
+        Builds the lookup table of a tile grid
+
+        :param tile_list: The whole tile grid, with its flag columns
+        :return: an uint8 array with one value per cell
+        """
+        lookup = np.zeros(self.shape, dtype=np.uint8)
+        cells = np.array([self.parse_id(tile_id) for tile_id in tile_list["id"]], dtype=int)
+        values = np.full(len(tile_list), EXISTS_BIT, dtype=np.uint8)
+        for bit, flag in enumerate(self.flags):
+            values |= (tile_list[flag].fillna(False).astype(bool).to_numpy() << bit).astype(np.uint8)
+        np.bitwise_or.at(lookup, (cells[:, 0], cells[:, 1]), values)
+        return lookup
+
+
+class DEMGrid(LatLonGrid):
+    """DEM 1x1 degree grid, with tile ids such as N43E001 (south-west corner)"""
+
+    name = "DEM"
+    cell_size = 1.0
+    lat_max = 90.0
+    lat_min = -90.0
+    margin = 0.01
+    flags = DEM_FLAGS
+
+    def format_ids(self, rows, cols) -> List[str]:
+        lats = int(self.lat_max) - 1 - np.asarray(rows, dtype=int)
+        lons = np.asarray(cols, dtype=int) - 180
+        return [
+            f"{'N' if lat >= 0 else 'S'}{abs(lat):02d}{'E' if lon >= 0 else 'W'}{abs(lon):03d}"
+            for lat, lon in zip(lats.tolist(), lons.tolist())
+        ]
+
+    def parse_id(self, tile_id: str) -> Tuple[int, int]:
+        match = DEM_ID_REG.fullmatch(tile_id)
+        if match is None:
+            raise ValueError(f"Invalid DEM tile id {tile_id}")
+        lat = int(match.group(2)) * (1 if match.group(1) == "N" else -1)
+        lon = int(match.group(4)) * (1 if match.group(3) == "E" else -1)
+        if not -90 <= lat < 90 or not -180 <= lon < 180:
+            raise ValueError(f"Invalid DEM tile id {tile_id}")
+        return int(self.lat_max) - 1 - lat, lon + 180
+
+
+class SRTM5x5Grid(LatLonGrid):
+    """SRTM 5x5 degree grid, with tile ids such as srtm_37_04 (column, row from 60N)"""
+
+    name = "SRTM 5x5"
+    cell_size = 5.0
+    lat_max = 60.0
+    lat_min = -60.0
+    margin = 0.05
+
+    def format_ids(self, rows, cols) -> List[str]:
+        return [
+            f"srtm_{col + 1:02d}_{row + 1:02d}"
+            for row, col in zip(np.asarray(rows).tolist(), np.asarray(cols).tolist())
+        ]
+
+    def parse_id(self, tile_id: str) -> Tuple[int, int]:
+        match = SRTM5X5_ID_REG.fullmatch(tile_id)
+        if match is None:
+            raise ValueError(f"Invalid SRTM 5x5 tile id {tile_id}")
+        col, row = int(match.group(1)) - 1, int(match.group(2)) - 1
+        n_rows, n_cols = self.shape
+        if not 0 <= row < n_rows or not 0 <= col < n_cols:
+            raise ValueError(f"Invalid SRTM 5x5 tile id {tile_id}")
+        return row, col
+
+
+def build_lookup_table(grid: LatLonGrid, filename_tiles_list: Path) -> Path:
+    """
+    Builds and saves the lookup table of a grid file next to it
+
+    :param grid: The analytic grid of the file
+    :param filename_tiles_list: Path to the grid file
+    :return: the path of the lookup table
+    """
+    output = lookup_table_path(filename_tiles_list)
+    np.save(str(output), grid.build_lookup_table(gp.read_file(filename_tiles_list)))
+    grid.lookup_table = output
+    grid._lookup = None
+    return output
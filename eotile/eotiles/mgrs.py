@@ -0,0 +1,392 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Analytic Sentinel-2 (MGRS) tile grid
+
+A Sentinel-2 tile id such as 31TCJ is made of a UTM zone (31), a latitude band (T)
+and a 100 km square (CJ). Footprints and candidate ids are computed from these
+definitions, without reading the grid file.
+
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+import math
+import re
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyproj
+from shapely.geometry import Polygon, box
+
+BAND_LETTERS = "CDEFGHJKLMNPQRSTUVWX"
+COLUMN_LETTERS = ("ABCDEFGH", "JKLMNPQR", "STUVWXYZ")
+ROW_LETTERS = "ABCDEFGHJKLMNPQRSTUV"
+
+SQUARE_SIZE = 100000.0
+S2_TILE_SIZE = 109800.0
+ROW_CYCLE = SQUARE_SIZE * len(ROW_LETTERS)
+
+# Zones redefined by MGRS around Norway (band V) and Svalbard (band X)
+ZONE_EXCEPTIONS = {
+    "V": {31: (0.0, 3.0), 32: (3.0, 12.0)},
+    "X": {31: (0.0, 9.0), 33: (9.0, 21.0), 35: (21.0, 33.0), 37: (33.0, 42.0)},
+}
+MISSING_ZONES = {"X": (32, 34, 36)}
+
+TILE_ID_REG = re.compile(r"([0-9]{2})([C-HJ-NP-X])([A-HJ-NP-Z])([A-HJ-NP-V])")
+
+_DENSIFY = 8
+
+
+def band_bounds(band: str) -> Tuple[float, float]:
+    """
+    Returns the latitude range of a latitude band
+
+    :param band: The band letter (C to X)
+    :return: the minimum and maximum latitudes
+    """
+    index = BAND_LETTERS.index(band)
+    lat_min = -80.0 + 8.0 * index
+    lat_max = 84.0 if band == "X" else lat_min + 8.0
+    return lat_min, lat_max
+
+
+def zone_bounds(zone: int, band: str) -> Tuple[float, float]:
+    """
+    Returns the longitude range of a UTM zone within a latitude band
+
+    :param zone: The UTM zone number (1 to 60)
+    :param band: The band letter (C to X)
+    :return: the minimum and maximum longitudes
+    """
+    if zone in ZONE_EXCEPTIONS.get(band, {}):
+        return ZONE_EXCEPTIONS[band][zone]
+    return -180.0 + 6.0 * (zone - 1), -180.0 + 6.0 * zone
+
+
+def utm_epsg(zone: int, band: str) -> int:
+    """Returns the EPSG code of the UTM projection used by a zone and a band"""
+    if band >= "N":
+        return 32600 + zone
+    return 32700 + zone
+
+
+@lru_cache(maxsize=None)
+def _transformer(epsg: int, inverse: bool) -> pyproj.Transformer:
+    if inverse:
+        return pyproj.Transformer.from_crs(epsg, 4326, always_xy=True)
+    return pyproj.Transformer.from_crs(4326, epsg, always_xy=True)
+
+
+def to_utm(epsg: int, lons, lats) -> Tuple[np.ndarray, np.ndarray]:
+    """Projects WGS84 coordinates to a UTM projection"""
+    return _transformer(epsg, False).transform(np.asarray(lons), np.asarray(lats))
+
+
+def from_utm(epsg: int, eastings, northings) -> Tuple[np.ndarray, np.ndarray]:
+    """Projects UTM coordinates back to WGS84"""
+    return _transformer(epsg, True).transform(np.asarray(eastings), np.asarray(northings))
+
+
+def zones_from_points(lons, lats) -> np.ndarray:
+    """
+    Vectorized UTM zone computation, including the Norway and Svalbard exceptions
+
+    :param lons: longitudes
+    :param lats: latitudes
+    :return: an array of zone numbers
+    """
+    lons = np.asarray(lons, dtype=float)
+    lats = np.asarray(lats, dtype=float)
+    zones = np.clip(np.floor((lons + 180.0) / 6.0).astype(int) + 1, 1, 60)
+    norway = (lats >= 56.0) & (lats < 64.0) & (lons >= 3.0) & (lons < 12.0)
+    zones[norway] = 32
+    svalbard = (lats >= 72.0) & (lons >= 0.0) & (lons < 42.0)
+    for zone, (lon_min, lon_max) in ZONE_EXCEPTIONS["X"].items():
+        zones[svalbard & (lons >= lon_min) & (lons < lon_max)] = zone
+    return zones
+
+
+def bands_from_latitudes(lats) -> np.ndarray:
+    """Vectorized latitude band computation, as an array of band letters"""
+    lats = np.asarray(lats, dtype=float)
+    indexes = np.clip(np.floor((lats + 80.0) / 8.0).astype(int), 0, len(BAND_LETTERS) - 1)
+    return np.array(list(BAND_LETTERS))[indexes]
+
+
+def _square_letters(zone: int, eastings, northings) -> Tuple[np.ndarray, np.ndarray]:
+    columns = np.array(list(COLUMN_LETTERS[(zone - 1) % 3]))
+    rows = np.array(list(ROW_LETTERS))
+    col_index = np.clip(np.floor(np.asarray(eastings) / SQUARE_SIZE).astype(int) - 1, 0, 7)
+    row_offset = 5 if zone % 2 == 0 else 0
+    row_index = (np.floor(np.asarray(northings) / SQUARE_SIZE).astype(int) + row_offset) % 20
+    return columns[col_index], rows[row_index]
+
+
+def tile_ids_from_points(lons, lats) -> np.ndarray:
+    """
+    Vectorized computation of the tile ids of the 100 km squares containing points
+
+    :param lons: longitudes (WGS84)
+    :param lats: latitudes (WGS84), between -80 and 84
+    :return: an array of tile ids
+    """
+    lons = np.atleast_1d(np.asarray(lons, dtype=float))
+    lats = np.atleast_1d(np.asarray(lats, dtype=float))
+    zones = zones_from_points(lons, lats)
+    bands = bands_from_latitudes(lats)
+    north = lats >= 0
+    output = np.empty(len(lons), dtype="<U5")
+    for zone in np.unique(zones):
+        for hemisphere in (True, False):
+            mask = (zones == zone) & (north == hemisphere)
+            if not mask.any():
+                continue
+            epsg = (32600 if hemisphere else 32700) + int(zone)
+            eastings, northings = to_utm(epsg, lons[mask], lats[mask])
+            columns, rows = _square_letters(int(zone), eastings, northings)
+            prefix = f"{int(zone):02d}"
+            output[mask] = [
+                prefix + band + column + row
+                for band, column, row in zip(bands[mask], columns, rows)
+            ]
+    return output
+
+
+@lru_cache(maxsize=None)
+def _zone_band_extent(zone: int, band: str) -> Tuple[float, float, float, float]:
+    """Easting and northing extents of a zone within a band"""
+    lon_min, lon_max = zone_bounds(zone, band)
+    lat_min, lat_max = band_bounds(band)
+    lons = np.linspace(lon_min, lon_max, _DENSIFY + 1)
+    lats = np.linspace(lat_min, lat_max, _DENSIFY + 1)
+    ring_lons = np.concatenate([lons, np.full_like(lats, lon_max), lons, np.full_like(lats, lon_min)])
+    ring_lats = np.concatenate([np.full_like(lons, lat_min), lats, np.full_like(lons, lat_max), lats])
+    eastings, northings = to_utm(utm_epsg(zone, band), ring_lons, ring_lats)
+    return eastings.min(), northings.min(), eastings.max(), northings.max()
+
+
+def parse_tile_id(tile_id: str) -> Tuple[int, str, str, str]:
+    """
+    Splits a tile id into its zone, band, column and row
+
+    :raises ValueError: when the tile id is not a valid MGRS id
+    """
+    match = TILE_ID_REG.fullmatch(tile_id)
+    if match is None:
+        raise ValueError(f"Invalid Sentinel-2 tile id {tile_id}")
+    zone = int(match.group(1))
+    band, column, row = match.group(2), match.group(3), match.group(4)
+    if not 1 <= zone <= 60 or zone in MISSING_ZONES.get(band, ()):
+        raise ValueError(f"Invalid Sentinel-2 tile id {tile_id}")
+    if column not in COLUMN_LETTERS[(zone - 1) % 3]:
+        raise ValueError(f"Invalid Sentinel-2 tile id {tile_id}")
+    return zone, band, column, row
+
+
+def square_origin(tile_id: str) -> Tuple[int, float, float]:
+    """
+    Returns the UTM projection and the lower left corner of the 100 km square of a tile
+
+    :param tile_id: A Sentinel-2 tile id
+    :return: the EPSG code, the easting and the northing of the lower left corner
+    :raises ValueError: when the tile id does not exist
+    """
+    zone, band, column, row = parse_tile_id(tile_id)
+    easting = (COLUMN_LETTERS[(zone - 1) % 3].index(column) + 1) * SQUARE_SIZE
+    row_offset = 5 if zone % 2 == 0 else 0
+    northing_mod = ((ROW_LETTERS.index(row) - row_offset) % 20) * SQUARE_SIZE
+
+    e_min, n_min, e_max, n_max = _zone_band_extent(zone, band)
+    northing = northing_mod + math.floor((n_min - northing_mod) / ROW_CYCLE) * ROW_CYCLE
+    if northing + SQUARE_SIZE <= n_min:
+        northing += ROW_CYCLE
+    if northing >= n_max or easting >= e_max or easting + SQUARE_SIZE <= e_min:
+        raise ValueError(f"Invalid Sentinel-2 tile id {tile_id}")
+    return utm_epsg(zone, band), easting, northing
+
+
+def is_mgrs_square(tile_id: str) -> bool:
+    """
+    Tells whether a tile id designates an existing MGRS square. The Sentinel-2 grid only
+    holds part of them (no open ocean squares), so this does not tell that the tile exists.
+    """
+    try:
+        square_origin(tile_id)
+    except ValueError:
+        return False
+    return True
+
+
+def _ring(x_min, y_min, x_max, y_max) -> Tuple[np.ndarray, np.ndarray]:
+    xs = np.linspace(x_min, x_max, _DENSIFY + 1)
+    ys = np.linspace(y_min, y_max, _DENSIFY + 1)
+    ring_x = np.concatenate([xs, np.full(_DENSIFY, x_max), xs[::-1][1:], np.full(_DENSIFY, x_min)])
+    ring_y = np.concatenate([np.full(_DENSIFY + 1, y_min), ys[1:], np.full(_DENSIFY, y_max),
+                             ys[::-1][1:]])
+    return ring_x, ring_y
+
+
+def tile_footprints(tile_ids: Sequence[str], overlap=False) -> List[Optional[Polygon]]:
+    """
+    Computes the WGS84 footprints of tiles from their ids
+
+    Without overlap, the footprint is the 100 km MGRS square clipped to its zone and band.
+    With overlap, it is the 109.8 km Sentinel-2 product extent.
+
+    :param tile_ids: Sentinel-2 tile ids
+    :param overlap: (Optional, default = False) Use the overlapping product extent ?
+    :return: the footprints, None for the invalid ids
+    """
+    footprints: List[Optional[Polygon]] = [None] * len(tile_ids)
+    groups = {}
+    for position, tile_id in enumerate(tile_ids):
+        try:
+            epsg, easting, northing = square_origin(tile_id)
+        except ValueError:
+            continue
+        if overlap:
+            extent = (easting, northing + SQUARE_SIZE - S2_TILE_SIZE,
+                      easting + S2_TILE_SIZE, northing + SQUARE_SIZE)
+        else:
+            extent = (easting, northing, easting + SQUARE_SIZE, northing + SQUARE_SIZE)
+        groups.setdefault(epsg, []).append((position, extent))
+
+    ring_size = 4 * _DENSIFY + 1
+    for epsg, members in groups.items():
+        rings = [_ring(*extent) for _, extent in members]
+        lons, lats = from_utm(
+            epsg, np.concatenate([ring[0] for ring in rings]), np.concatenate([ring[1] for ring in rings])
+        )
+        # Squares of the zones 1 and 60 may reach over the antimeridian: their longitudes are
+        # kept continuous around the central meridian, so that the rings do not self-intersect
+        central_meridian = (epsg % 100) * 6 - 183
+        lons = (lons - central_meridian + 180.0) % 360.0 - 180.0 + central_meridian
+        for index, (position, _) in enumerate(members):
+            chunk = slice(index * ring_size, (index + 1) * ring_size)
+            polygon = Polygon(zip(lons[chunk], lats[chunk]))
+            if not overlap:
+                zone, band, _, _ = parse_tile_id(tile_ids[position])
+                lon_min, lon_max = zone_bounds(zone, band)
+                lat_min, lat_max = band_bounds(band)
+                polygon = polygon.intersection(box(lon_min, lat_min, lon_max, lat_max))
+            footprints[position] = polygon
+    return footprints
+
+
+def _candidate_zones(band: str, lon_min: float, lon_max: float) -> List[Tuple[int, float, float]]:
+    zones = []
+    for zone in range(1, 61):
+        if zone in MISSING_ZONES.get(band, ()):
+            continue
+        z_min, z_max = -180.0 + 6.0 * (zone - 1), -180.0 + 6.0 * zone
+        if zone in ZONE_EXCEPTIONS.get(band, {}):
+            e_min, e_max = ZONE_EXCEPTIONS[band][zone]
+            z_min, z_max = min(z_min, e_min), max(z_max, e_max)
+        if z_max >= lon_min and z_min <= lon_max:
+            zones.append((zone, z_min, z_max))
+    return zones
+
+
+def candidate_tile_ids(bounds: Sequence[float], overlap=False) -> List[str]:
+    """
+    Lists the ids of the tiles which may intersect a bounding box
+
+    The output is a superset of the intersecting tiles: exact intersections
+    have to be computed on the footprints.
+
+    :param bounds: (min lon, min lat, max lon, max lat) in WGS84
+    :param overlap: (Optional, default = False) Use the overlapping product extent ?
+    :return: a list of candidate tile ids
+    """
+    lon_min, lat_min, lon_max, lat_max = [float(elt) for elt in bounds]
+    lat_margin = 1.0
+    extra = S2_TILE_SIZE - SQUARE_SIZE if overlap else 0.0
+    candidates = []
+    for band in BAND_LETTERS:
+        b_min, b_max = band_bounds(band)
+        r_lat_min = max(lat_min, b_min - lat_margin)
+        r_lat_max = min(lat_max, b_max + lat_margin)
+        if r_lat_min > r_lat_max:
+            continue
+        # 110 km of longitude at the highest latitude of the region
+        max_abs_lat = min(max(abs(r_lat_min), abs(r_lat_max)), 84.0)
+        lon_margin = min(110000.0 / (111320.0 * math.cos(math.radians(max_abs_lat))), 8.0)
+        for zone, z_min, z_max in _candidate_zones(band, lon_min - lon_margin, lon_max + lon_margin):
+            r_lon_min = max(lon_min, z_min - lon_margin)
+            r_lon_max = min(lon_max, z_max + lon_margin)
+            if r_lon_min > r_lon_max:
+                continue
+            epsg = utm_epsg(zone, band)
+            ring_lons, ring_lats = _ring(r_lon_min, r_lat_min, r_lon_max, r_lat_max)
+            eastings, northings = to_utm(epsg, ring_lons, ring_lats)
+            e_min, n_min, e_max, n_max = _zone_band_extent(zone, band)
+            first_col = max(int(math.floor((eastings.min() - extra) / SQUARE_SIZE)), 1)
+            last_col = min(int(math.floor(eastings.max() / SQUARE_SIZE)), 8)
+            first_row = int(math.floor(max(northings.min(), n_min) / SQUARE_SIZE))
+            last_row = int(math.floor(min(northings.max() + extra, n_max) / SQUARE_SIZE))
+            columns, rows = COLUMN_LETTERS[(zone - 1) % 3], ROW_LETTERS
+            row_offset = 5 if zone % 2 == 0 else 0
+            for col in range(first_col, last_col + 1):
+                if col * SQUARE_SIZE >= e_max or (col + 1) * SQUARE_SIZE <= e_min:
+                    continue
+                for row in range(first_row, last_row + 1):
+                    if row * SQUARE_SIZE >= n_max or (row + 1) * SQUARE_SIZE <= n_min:
+                        continue
+                    candidates.append(
+                        f"{zone:02d}{band}{columns[col - 1]}{rows[(row + row_offset) % 20]}"
+                    )
+    return list(dict.fromkeys(candidates))
+
+
+class MGRSGrid:
+    """
+    Analytic engine of a Sentinel-2 grid file, used by the tile catalog
+    """
+
+    # The MGRS squares are not the Sentinel-2 grid: the grid file is always required
+    can_replace_grid = False
+
+    def __init__(self, overlap=False):
+        self.overlap = overlap
+
+    def may_be_tile_id(self, tile_id: str) -> bool:
+        """
+        Tells whether a tile id may designate a tile of the grid: ids of MGRS squares,
+        the grid file tells which of them exist
+        """
+        return is_mgrs_square(tile_id)
+
+    def candidate_tile_ids(self, bounds: Sequence[float]) -> List[str]:
+        """Lists the ids of the tiles which may intersect a bounding box"""
+        return candidate_tile_ids(bounds, self.overlap)
+
+    def tile_footprints(self, tile_ids: Sequence[str]) -> List[Optional[Polygon]]:
+        """Computes the footprints of tiles from their ids"""
+        return tile_footprints(tile_ids, self.overlap)
+
+    def tile_attributes(self, tile_ids: Sequence[str]) -> pd.DataFrame:
+        """Sentinel-2 tiles have no attribute besides their id"""
+        return pd.DataFrame(index=range(len(tile_ids)))
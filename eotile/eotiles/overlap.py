@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Overlap of tiles with AOIs
+
+The overlap of a tile is the fraction of its area covered by the AOI. Areas are
+either planar, in square degrees, or geodesic, on the WGS84 ellipsoid. Planar
+ratios get biased at high latitudes, geodesic ones do not.
+
+Tiles whose bounding box lies inside the AOI have an overlap of 1 and are never
+intersected.
+
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+import warnings
+from typing import Optional, Sequence
+
+import numpy as np
+import pyproj
+from geopandas.array import GeometryArray, from_shapely
+from shapely.geometry import box
+from shapely.prepared import prep
+
+PLANAR = "planar"
+GEODESIC = "geodesic"
+AREA_MODES = (PLANAR, GEODESIC)
+
+_GEOD = pyproj.Geod(ellps="WGS84")
+
+
+def check_area_mode(area_mode: str) -> str:
+    """
+    :raises ValueError: when the area mode is unknown
+    """
+    if area_mode not in AREA_MODES:
+        raise ValueError(f"Unknown area mode {area_mode}, expected one of {AREA_MODES}")
+    return area_mode
+
+
+def _as_array(geometries) -> GeometryArray:
+    if isinstance(geometries, GeometryArray):
+        return geometries
+    return from_shapely(np.asarray(list(geometries), dtype=object))
+
+
+def geometry_areas(geometries, area_mode: str = PLANAR) -> np.ndarray:
+    """
+    Computes the areas of geometries in WGS84
+
+    :param geometries: The geometries
+    :param area_mode: (Optional, default = "planar") "planar" for square degrees, "geodesic"
+    for square meters on the WGS84 ellipsoid
+    :return: the areas
+    """
+    geometries = _as_array(geometries)
+    if check_area_mode(area_mode) == PLANAR:
+        with warnings.catch_warnings():
+            # Square degrees on purpose
+            warnings.simplefilter("ignore", UserWarning)
+            return np.asarray(geometries.area, dtype=float)
+    return np.array(
+        [
+            abs(_GEOD.geometry_area_perimeter(geometry)[0]) if geometry is not None else 0.0
+            for geometry in geometries
+        ],
+        dtype=float,
+    )
+
+
+def inside_bounds(tile_bounds: np.ndarray, aoi) -> np.ndarray:
+    """
+    Tells which tiles have their bounding box inside an AOI
+
+    :param tile_bounds: (min x, min y, max x, max y) of each tile
+    :param aoi: AOI geometry
+    :return: a boolean mask
+    """
+    x_min, y_min, x_max, y_max = aoi.bounds
+    inside = (
+        (tile_bounds[:, 0] >= x_min)
+        & (tile_bounds[:, 1] >= y_min)
+        & (tile_bounds[:, 2] <= x_max)
+        & (tile_bounds[:, 3] <= y_max)
+    )
+    if inside.any():
+        prepared = prep(aoi)
+        for position in np.flatnonzero(inside):
+            inside[position] = prepared.contains(box(*tile_bounds[position]))
+    return inside
+
+
+def tile_overlaps(
+    tile_geoms,
+    aoi,
+    tile_areas: Optional[Sequence[float]] = None,
+    area_mode: str = PLANAR,
+) -> np.ndarray:
+    """
+    Computes the fraction of each tile covered by an AOI
+
+    :param tile_geoms: Tile footprints, in WGS84
+    :param aoi: AOI geometry, in WGS84
+    :param tile_areas: (Optional, default = None) The areas of the tiles, computed when missing
+    :param area_mode: (Optional, default = "planar") "planar" or "geodesic"
+    :return: the overlap of each tile, between 0 and 1
+    """
+    tile_geoms = _as_array(tile_geoms)
+    overlaps = np.ones(len(tile_geoms), dtype=float)
+    edge = ~inside_bounds(tile_geoms.bounds, aoi)
+    if edge.any():
+        if tile_areas is None:
+            tile_areas = geometry_areas(tile_geoms[edge], area_mode)
+        else:
+            tile_areas = np.asarray(tile_areas, dtype=float)[edge]
+        intersections = geometry_areas(tile_geoms[edge].intersection(aoi), area_mode)
+        overlaps[edge] = intersections / tile_areas
+    return np.minimum(overlaps, 1.0)
+
+
+def pair_overlaps(
+    tile_geoms,
+    aoi_geoms,
+    aoi_positions: np.ndarray,
+    tile_areas: Optional[Sequence[float]] = None,
+    area_mode: str = PLANAR,
+) -> np.ndarray:
+    """
+    Computes the fraction of tiles covered by AOIs, pair by pair
+
+    :param tile_geoms: Tile footprint of each pair
+    :param aoi_geoms: AOI geometries
+    :param aoi_positions: AOI position of each pair
+    :param tile_areas: (Optional, default = None) The tile area of each pair
+    :param area_mode: (Optional, default = "planar") "planar" or "geodesic"
+    :return: the overlap of each pair, between 0 and 1
+    """
+    tile_geoms = _as_array(tile_geoms)
+    aoi_geoms = _as_array(aoi_geoms)
+    if tile_areas is None:
+        tile_areas = geometry_areas(tile_geoms, area_mode)
+    tile_areas = np.asarray(tile_areas, dtype=float)
+    overlaps = np.empty(len(tile_geoms), dtype=float)
+    order = np.argsort(aoi_positions, kind="stable")
+    uniques, starts = np.unique(np.asarray(aoi_positions)[order], return_index=True)
+    for aoi_position, start, end in zip(uniques, starts, [*starts[1:], len(order)]):
+        pairs = order[start:end]
+        overlaps[pairs] = tile_overlaps(
+            tile_geoms[pairs], aoi_geoms[aoi_position], tile_areas[pairs], area_mode
+        )
+    return overlaps
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Out-of-core assignment of large parcel datasets to tiles
+
+The parcels are streamed in chunks and never loaded at once:
+
+1. Partition: each chunk is reprojected to WGS84 and its parcels are spilled to
+   temporary partition files, according to the cell of a fixed lon/lat grid
+   holding their center.
+2. Join: the partitions are read back in Z-order, so that consecutive chunks
+   cover nearby tiles, and each chunk is joined with the tile grid in a worker
+   of the pool. The (parcel, tile) pairs are appended to the output as soon as
+   a chunk is done.
+
+Memory is bounded by the chunk size and the number of chunks in flight,
+whatever the size of the input.
+
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+import logging
+import pickle
+import shutil
+import tempfile
+from collections import deque
+from pathlib import Path
+from typing import Iterator, Optional, Sequence
+
+import geopandas as gp
+import numpy as np
+import pandas as pd
+import shapely.wkb
+
+from eotile.eotiles.eotiles import (
+    MAX_WORKERS,
+    create_tiles_list_eo_from_geometries,
+    get_executor,
+    morton_codes,
+)
+from eotile.eotiles.overlap import PLANAR
+from eotile.eotiles.reprojection import to_wgs84
+
+LOGGER = logging.getLogger("dev_logger")
+
+CHUNK_SIZE = 50000
+# The partition grid has 2 ** level cells along each axis: 64 x 64 cells of 5.6 x 2.8 degrees
+PARTITION_LEVEL = 6
+PARCEL_ID = "parcel_id"
+OUTPUT_SUFFIXES = (".csv", ".parquet")
+_WKB = "__wkb"
+
+
+def iter_parcel_chunks(
+    filename_parcels: Path, chunk_size: int = CHUNK_SIZE, layer: Optional[str] = None
+) -> Iterator[gp.GeoDataFrame]:
+    """
+    Streams the features of a vector file in chunks, in WGS84
+
+    :param filename_parcels: Path to the parcels: any vector file read by fiona,
+    or a GeoParquet file (requires pyarrow)
+    :param chunk_size: (Optional, default = 50000) Number of features of each chunk
+    :param layer: (Optional, default = None) Layer of the parcels, the first one when None
+    :return: an iterator of GeoDataFrames, in the file order
+    :raises ImportError: when pyarrow is missing to read GeoParquet files
+    """
+    filename_parcels = Path(filename_parcels)
+    if filename_parcels.suffix == ".parquet":
+        yield from _iter_parquet_chunks(filename_parcels, chunk_size)
+        return
+
+    import fiona
+
+    with fiona.open(str(filename_parcels), layer=layer) as source:
+        crs = source.crs_wkt or None
+        features = []
+        for feature in source:
+            features.append(feature)
+            if len(features) == chunk_size:
+                yield _to_wgs84(gp.GeoDataFrame.from_features(features, crs=crs))
+                features = []
+        if features:
+            yield _to_wgs84(gp.GeoDataFrame.from_features(features, crs=crs))
+
+
+def _iter_parquet_chunks(filename_parcels: Path, chunk_size: int) -> Iterator[gp.GeoDataFrame]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as error:
+        raise ImportError("Reading GeoParquet files requires pyarrow") from error
+    import json
+
+    parquet_file = pq.ParquetFile(str(filename_parcels))
+    metadata = json.loads(parquet_file.schema_arrow.metadata[b"geo"])
+    column = metadata["primary_column"]
+    crs = metadata["columns"][column].get("crs", "epsg:4326")
+    for batch in parquet_file.iter_batches(batch_size=chunk_size):
+        frame = batch.to_pandas()
+        geometry = [
+            shapely.wkb.loads(value) if value is not None else None for value in frame[column]
+        ]
+        yield _to_wgs84(
+            gp.GeoDataFrame(frame.drop(columns=column), geometry=geometry, crs=crs)
+        )
+
+
+def _to_wgs84(chunk: gp.GeoDataFrame) -> gp.GeoDataFrame:
+    if chunk.crs is None:
+        return chunk.set_crs("epsg:4326")
+    return to_wgs84(chunk)
+
+
+def partition_keys(bounds: np.ndarray, level: int = PARTITION_LEVEL) -> np.ndarray:
+    """
+    Z-order code of the cell of a fixed lon/lat grid holding the center of each box
+
+    :param bounds: (min x, min y, max x, max y) of each box, in WGS84
+    :param level: (Optional, default = 6) The grid has 2 ** level cells along each axis
+    :return: the partition key of each box
+    """
+    size = 1 << level
+    centers = np.column_stack(
+        [(bounds[:, 0] + bounds[:, 2]) / 2.0, (bounds[:, 1] + bounds[:, 3]) / 2.0]
+    )
+    cells = np.column_stack(
+        [(centers[:, 0] + 180.0) / 360.0 * size, (centers[:, 1] + 90.0) / 180.0 * size]
+    )
+    cells = np.clip(np.nan_to_num(cells), 0, size - 1).astype(np.uint64)
+    return morton_codes(cells, level)
+
+
+def _assign_chunk(
+    filename_tiles_list: Path, chunk: pd.DataFrame, min_overlap=None, area_mode=PLANAR
+) -> pd.DataFrame:
+    # Runs in a worker: the geometries travel as WKB, lighter to pickle than shapely objects
+    geoms = gp.GeoSeries(
+        [shapely.wkb.loads(value) for value in chunk[_WKB]], index=np.arange(len(chunk))
+    )
+    pairs = create_tiles_list_eo_from_geometries(filename_tiles_list, geoms, min_overlap, area_mode)
+    positions = pairs.pop("aoi_index").to_numpy(dtype=np.int64)
+    attributes = chunk.drop(columns=_WKB).iloc[positions].reset_index(drop=True)
+    return pd.concat([attributes, pairs.rename(columns={"id": "tile_id"})], axis=1)
+
+
+class _AssignmentWriter:
+    """Appends the assignment to a CSV file, or to a Parquet file (requires pyarrow)"""
+
+    def __init__(self, filename: Path):
+        self.filename = Path(filename)
+        if self.filename.suffix not in OUTPUT_SUFFIXES:
+            raise ValueError(
+                f"Unsupported output {self.filename.suffix}, expected one of {OUTPUT_SUFFIXES}"
+            )
+        self._parquet_writer = None
+        self._header = True
+        self.rows = 0
+        if self.filename.exists():
+            self.filename.unlink()
+
+    def write(self, frame: pd.DataFrame) -> None:
+        if self.filename.suffix == ".csv":
+            frame.to_csv(self.filename, mode="a", header=self._header, index=False)
+        else:
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError as error:
+                raise ImportError("Writing Parquet files requires pyarrow") from error
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(str(self.filename), table.schema)
+            self._parquet_writer.write_table(table.cast(self._parquet_writer.schema))
+        self._header = False
+        self.rows += len(frame)
+
+    def close(self) -> None:
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+
+def assign_parcels(
+    filename_parcels: Path,
+    filename_tiles_list: Path,
+    output_filename: Path,
+    id_column: Optional[str] = None,
+    keep_columns: Sequence[str] = (),
+    min_overlap=None,
+    area_mode: str = PLANAR,
+    chunk_size: int = CHUNK_SIZE,
+    executor: Optional[str] = "process",
+    layer: Optional[str] = None,
+    partition_level: int = PARTITION_LEVEL,
+    tmp_dirpath: Optional[Path] = None,
+) -> dict:
+    """
+    Assigns the parcels of a large vector dataset to the tiles of a grid, out of core
+
+    :param filename_parcels: Path to the parcels, see :func:`iter_parcel_chunks`
+    :type filename_parcels: Path
+    :param filename_tiles_list: Path to the tile grid file
+    :type filename_tiles_list: Path
+    :param output_filename: Path to the output table: .csv, or .parquet (requires pyarrow)
+    :type output_filename: Path
+    :param id_column: (Optional, default = None) Column identifying the parcels,
+    their position in the input when None
+    :type id_column: str
+    :param keep_columns: (Optional, default = ()) Parcel attributes copied to the output
+    :type keep_columns: Sequence[str]
+    :param min_overlap: (Optional, default = None) Minimum percentage of each tile covered
+    by a parcel, applied to each (parcel, tile) pair
+    :param area_mode: (Optional, default = "planar") Areas used for the overlap: "planar" in
+    square degrees, or "geodesic"
+    :type area_mode: str
+    :param chunk_size: (Optional, default = 50000) Number of parcels read and joined at once
+    :type chunk_size: int
+    :param executor: (Optional, default = "process") Pool joining the chunks:
+    "process", "thread" or None to join them one after another
+    :type executor: str
+    :param layer: (Optional, default = None) Layer of the parcels
+    :type layer: str
+    :param partition_level: (Optional, default = 6) The partition grid has
+    2 ** partition_level cells along each axis
+    :type partition_level: int
+    :param tmp_dirpath: (Optional, default = None) Directory of the partition files,
+    the system temporary directory when None
+    :type tmp_dirpath: Path
+    :return: the number of parcels, of partitions and of (parcel, tile) pairs written
+    :rtype: dict
+    :raises KeyError: when the id column or a kept column is missing
+    """
+    columns = [id_column or PARCEL_ID] + [
+        column for column in keep_columns if column != id_column
+    ]
+    spill_dirpath = Path(tempfile.mkdtemp(prefix="eotile_parcels_", dir=tmp_dirpath))
+    writer = _AssignmentWriter(output_filename)
+    try:
+        n_parcels = _partition(
+            filename_parcels, spill_dirpath, id_column, columns, chunk_size, layer,
+            partition_level,
+        )
+        partitions = sorted(spill_dirpath.glob("*.pkl"))
+        pool = None if executor is None else get_executor(executor)
+        pending = deque()
+        for chunk in _iter_partition_chunks(partitions, chunk_size):
+            if pool is None:
+                writer.write(_assign_chunk(filename_tiles_list, chunk, min_overlap, area_mode))
+                continue
+            pending.append(
+                pool.submit(_assign_chunk, filename_tiles_list, chunk, min_overlap, area_mode)
+            )
+            # A bounded number of chunks in flight, written in the order they were read
+            if len(pending) >= 2 * MAX_WORKERS:
+                writer.write(pending.popleft().result())
+        while pending:
+            writer.write(pending.popleft().result())
+    finally:
+        writer.close()
+        shutil.rmtree(spill_dirpath, ignore_errors=True)
+    LOGGER.info(
+        "Assigned %s parcels in %s partitions to the tiles of %s: %s pairs",
+        n_parcels, len(partitions), Path(filename_tiles_list).name, writer.rows,
+    )
+    return {"parcels": n_parcels, "partitions": len(partitions), "pairs": writer.rows}
+
+
+def _partition(
+    filename_parcels, spill_dirpath, id_column, columns, chunk_size, layer, partition_level
+) -> int:
+    n_parcels = 0
+    for chunk in iter_parcel_chunks(filename_parcels, chunk_size, layer):
+        chunk = chunk[chunk.geometry.notna() & ~chunk.geometry.is_empty]
+        frame = pd.DataFrame(
+            {_WKB: [geometry.wkb for geometry in chunk.geometry]}, index=chunk.index
+        )
+        if id_column is None:
+            frame[PARCEL_ID] = np.arange(n_parcels, n_parcels + len(chunk))
+        for column in columns:
+            if column != PARCEL_ID or id_column is not None:
+                frame[column] = chunk[column].to_numpy()
+        frame = frame[columns + [_WKB]]
+        keys = partition_keys(chunk.geometry.bounds.to_numpy(), partition_level)
+        for key, positions in pd.Series(np.arange(len(keys))).groupby(keys):
+            with open(spill_dirpath / f"{int(key):012d}.pkl", "ab") as spill_file:
+                pickle.dump(frame.iloc[positions.to_numpy()], spill_file, pickle.HIGHEST_PROTOCOL)
+        n_parcels += len(chunk)
+    return n_parcels
+
+
+def _iter_partition_chunks(partitions: Sequence[Path], chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Reads the spilled parcels back, partition after partition, in chunks"""
+    buffer, buffered = [], 0
+    for partition in partitions:
+        with open(partition, "rb") as spill_file:
+            while True:
+                try:
+                    frame = pickle.load(spill_file)
+                except EOFError:
+                    break
+                buffer.append(frame)
+                buffered += len(frame)
+                if buffered >= chunk_size:
+                    merged = pd.concat(buffer, ignore_index=True)
+                    for start in range(0, len(merged) - chunk_size + 1, chunk_size):
+                        yield merged.iloc[start:start + chunk_size]
+                    rest = merged.iloc[len(merged) - len(merged) % chunk_size:]
+                    buffer, buffered = [rest], len(rest)
+    if buffered:
+        yield pd.concat(buffer, ignore_index=True)
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Timing spans of the query stages
+
+The stages of a query (input classification, geocoding, grid reads, reprojection,
+spatial query, overlap filter, output) open named spans. Spans are only recorded
+while a profile is active: otherwise :func:`span` returns a shared no-op object,
+so that the instrumentation costs a function call per stage.
+
+The active profile is process-wide, spans opened in the threads of the executors
+are recorded too. Stages run in worker processes are not.
+
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_ACTIVE: Optional["Profile"] = None
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size of the process, None when unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class _NoSpan:
+    """Span returned while no profile is active"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def count(self, **counts) -> None:
+        """Ignores the counts"""
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Span:
+    """
+    A stage being timed, see :func:`span`
+    """
+
+    __slots__ = ("profile", "name", "counts", "start", "depth")
+
+    def __init__(self, profile: "Profile", name: str, counts: Dict[str, int]):
+        self.profile = profile
+        self.name = name
+        self.counts = counts
+        self.start = 0.0
+        self.depth = 0
+
+    def __enter__(self):
+        self.depth = self.profile.enter()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = time.perf_counter() - self.start
+        self.profile.exit()
+        self.profile.record(self, duration, exc_info[0] is not None)
+        return False
+
+    def count(self, **counts) -> None:
+        """
+        Attaches counts to the span, e.g. the number of candidate tiles
+
+        :param counts: The counts, by name
+        """
+        self.counts.update(counts)
+
+
+class Profile:
+    """
+    Spans recorded while the profile is active, see :func:`profiling`
+
+    :param callback: (Optional, default = None) Called with the record of each span
+    when it ends, from the thread which ran it
+    """
+
+    def __init__(self, callback: Optional[Callable[[dict], None]] = None):
+        self.callback = callback
+        self.spans: List[dict] = []
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def enter(self) -> int:
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        return depth
+
+    def exit(self) -> None:
+        self._local.depth -= 1
+
+    def record(self, span: Span, duration: float, failed: bool = False) -> None:
+        record = {
+            "name": span.name,
+            "start_s": span.start - self.start,
+            "duration_s": duration,
+            "depth": span.depth,
+            "thread": threading.current_thread().name,
+            "counts": span.counts,
+            "peak_rss_bytes": peak_rss_bytes(),
+        }
+        if failed:
+            record["failed"] = True
+        with self._lock:
+            self.spans.append(record)
+        if self.callback is not None:
+            self.callback(record)
+
+    def stages(self) -> List[dict]:
+        """
+        Aggregates the spans by name, in the order of their first start
+
+        :return: one dict per stage: name, calls, total and maximum durations, summed counts
+        """
+        stages: Dict[str, dict] = {}
+        for record in sorted(self.spans, key=lambda elt: elt["start_s"]):
+            stage = stages.setdefault(
+                record["name"],
+                {"name": record["name"], "calls": 0, "total_s": 0.0, "max_s": 0.0, "counts": {}},
+            )
+            stage["calls"] += 1
+            stage["total_s"] += record["duration_s"]
+            stage["max_s"] = max(stage["max_s"], record["duration_s"])
+            for key, value in record["counts"].items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    stage["counts"][key] = stage["counts"].get(key, 0) + value
+                else:
+                    stage["counts"][key] = value
+        return list(stages.values())
+
+    def to_dict(self) -> dict:
+        """The profile as a JSON-serializable dict: wall time, peak RSS, stages and spans"""
+        duration = self.duration if self.duration is not None else time.perf_counter() - self.start
+        return {
+            "total_s": duration,
+            "peak_rss_bytes": peak_rss_bytes(),
+            "stages": self.stages(),
+            "spans": sorted(self.spans, key=lambda elt: elt["start_s"]),
+        }
+
+    def format_table(self) -> str:
+        """The stages as a text table"""
+        profile = self.to_dict()
+        lines = [f"{'stage':<24} {'calls':>5} {'total ms':>10} {'max ms':>10}  counts"]
+        for stage in profile["stages"]:
+            counts = ", ".join(f"{key}={value}" for key, value in stage["counts"].items())
+            lines.append(
+                f"{stage['name']:<24} {stage['calls']:>5} {stage['total_s'] * 1000:>10.1f} "
+                f"{stage['max_s'] * 1000:>10.1f}  {counts}"
+            )
+        lines.append(f"{'total':<24} {'':>5} {profile['total_s'] * 1000:>10.1f}")
+        if profile["peak_rss_bytes"] is not None:
+            lines.append(f"peak RSS: {profile['peak_rss_bytes'] / 2 ** 20:.1f} MiB")
+        return "\n".join(lines)
+
+
+def span(name: str, **counts):
+    """
+    Opens a timing span around a stage, to be used as a context manager::
+
+        with span("grid_query", source="S2") as stage:
+            tiles = catalog.query(geom)
+            stage.count(candidates=len(tiles))
+
+    :param name: Name of the stage
+    :param counts: Counts known when the stage starts
+    :return: the span, or a no-op object when no profile is active
+    """
+    profile = _ACTIVE
+    if profile is None:
+        return _NO_SPAN
+    return Span(profile, name, counts)
+
+
+def is_profiling() -> bool:
+    """Tells whether a profile is active"""
+    return _ACTIVE is not None
+
+
+class profiling:  # pylint: disable=invalid-name
+    """
+    Context manager recording the spans of the code it runs::
+
+        with profiling(callback=print) as profile:
+            eotile_module.main("31TCJ")
+        print(profile.format_table())
+
+    :param callback: (Optional, default = None) Called with the record of each span when it ends
+    """
+
+    def __init__(self, callback: Optional[Callable[[dict], None]] = None):
+        self.profile = Profile(callback)
+        self._previous = None
+
+    def __enter__(self) -> Profile:
+        global _ACTIVE
+        self._previous = _ACTIVE
+        self.profile.start = time.perf_counter()
+        _ACTIVE = self.profile
+        return self.profile
+
+    def __exit__(self, *exc_info):
+        global _ACTIVE
+        _ACTIVE = self._previous
+        self.profile.duration = time.perf_counter() - self.profile.start
+        return False
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Reprojection of AOIs to WGS84
+
+Transformers are built once per source CRS and kept for the life of the process:
+building the CRS objects and the transformation costs far more than reprojecting
+a small AOI. The coordinates of all the geometries reprojected at once are gathered
+in a single array, transformed with one call, then split back into geometries.
+
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+from functools import lru_cache
+from typing import Iterator, List, Optional, Sequence, Union
+
+import geopandas as gp
+import numpy as np
+import pyproj
+from shapely.geometry import (
+    GeometryCollection,
+    LinearRing,
+    LineString,
+    MultiLineString,
+    MultiPoint,
+    MultiPolygon,
+    Point,
+    Polygon,
+)
+
+from eotile.eotiles.profiling import span
+
+WGS84 = "EPSG:4326"
+
+
+def crs_key(crs) -> Union[int, str]:
+    """
+    Hashable key of a CRS: the EPSG code when it is given as one, its WKT otherwise
+
+    :param crs: An EPSG code (int or str, with or without "EPSG:"), a pyproj CRS
+    or anything pyproj.CRS accepts
+    """
+    if isinstance(crs, (int, np.integer)):
+        return int(crs)
+    if isinstance(crs, str):
+        code = crs.strip().upper()
+        if code.startswith("EPSG:"):
+            code = code[5:]
+        return int(code) if code.isdigit() else crs
+    return pyproj.CRS.from_user_input(crs).to_wkt()
+
+
+@lru_cache(maxsize=None)
+def _transformer(key: Union[int, str]) -> Optional[pyproj.Transformer]:
+    source = pyproj.CRS.from_user_input(key)
+    if source.equals(pyproj.CRS(WGS84)):
+        return None
+    return pyproj.Transformer.from_crs(source, WGS84, always_xy=True)
+
+
+def get_transformer(crs) -> Optional[pyproj.Transformer]:
+    """
+    Returns the cached transformer of a CRS to WGS84 (longitude, latitude)
+
+    :param crs: The source CRS, see :func:`crs_key`
+    :return: the transformer, None when the CRS is already WGS84
+    """
+    return _transformer(crs_key(crs))
+
+
+def clear_transformers() -> None:
+    """Drops the cached transformers"""
+    _transformer.cache_clear()
+
+
+def _coordinate_arrays(geom) -> Iterator[np.ndarray]:
+    """Coordinates of each point sequence of a geometry, in order"""
+    if geom.is_empty:
+        return
+    if isinstance(geom, Polygon):
+        yield np.asarray(geom.exterior.coords)
+        for interior in geom.interiors:
+            yield np.asarray(interior.coords)
+    elif isinstance(geom, (Point, LineString, LinearRing)):
+        yield np.asarray(geom.coords)
+    else:
+        for part in geom.geoms:
+            yield from _coordinate_arrays(part)
+
+
+def _rebuild(geom, arrays: Iterator[np.ndarray]):
+    """Same geometry, with the point sequences taken from an iterator"""
+    if geom.is_empty:
+        return geom
+    if isinstance(geom, Polygon):
+        exterior = next(arrays)
+        return Polygon(exterior, [next(arrays) for _ in geom.interiors])
+    if isinstance(geom, Point):
+        return Point(next(arrays)[0])
+    if isinstance(geom, (LineString, LinearRing)):
+        return type(geom)(next(arrays))
+    parts = [_rebuild(part, arrays) for part in geom.geoms]
+    if isinstance(geom, MultiPolygon):
+        return MultiPolygon(parts)
+    if isinstance(geom, MultiLineString):
+        return MultiLineString(parts)
+    if isinstance(geom, MultiPoint):
+        return MultiPoint(parts)
+    return GeometryCollection(parts)
+
+
+def reproject_geometries(geoms: Sequence, crs) -> List:
+    """
+    Reprojects geometries to WGS84, with a single transformation of all their coordinates
+
+    :param geoms: Shapely geometries, None for missing ones
+    :param crs: Their CRS, see :func:`crs_key`
+    :return: the reprojected geometries, None where the input is None
+    """
+    geoms = list(geoms)
+    transformer = get_transformer(crs)
+    if transformer is None:
+        return geoms
+    arrays = [list(_coordinate_arrays(geom)) if geom is not None else [] for geom in geoms]
+    flat = [array for geom_arrays in arrays for array in geom_arrays]
+    if not flat:
+        return geoms
+    with span("reproject", crs=str(crs_key(crs))[:32]) as stage:
+        coords = np.concatenate([array[:, :2] for array in flat]).astype(float)
+        stage.count(geometries=len(geoms), points=len(coords))
+        if len(coords) == 1:
+            # pyproj takes arrays of one point as scalars
+            coords = np.array([transformer.transform(*coords[0])])
+        else:
+            coords = np.column_stack(transformer.transform(coords[:, 0], coords[:, 1]))
+        splits = np.cumsum([len(array) for array in flat])[:-1]
+        # The z values are kept as they are
+        parts = iter(
+            np.column_stack([part, array[:, 2:]]) if array.shape[1] > 2 else part
+            for part, array in zip(np.split(coords, splits), flat)
+        )
+        return [_rebuild(geom, parts) if geom is not None else None for geom in geoms]
+
+
+def reproject_geometry(geom, crs):
+    """
+    Reprojects a geometry to WGS84
+
+    :param geom: A shapely geometry
+    :param crs: Its CRS, see :func:`crs_key`. None when it is WGS84.
+    :return: the geometry in WGS84
+    """
+    if crs is None:
+        return geom
+    return reproject_geometries([geom], crs)[0]
+
+
+def to_wgs84(data: Union[gp.GeoDataFrame, gp.GeoSeries]):
+    """
+    Reprojects a GeoDataFrame or a GeoSeries to WGS84 with the cached transformers,
+    as to_crs("epsg:4326") does
+
+    :param data: The geometries, with their CRS
+    :return: a copy in WGS84
+    :raises ValueError: when the data has no CRS
+    """
+    if data.crs is None:
+        raise ValueError(
+            "Cannot transform naive geometries. Please set a crs on the object first."
+        )
+    geoms = gp.GeoSeries(
+        reproject_geometries(data.geometry.values, data.crs), index=data.index, crs=WGS84
+    )
+    if isinstance(data, gp.GeoSeries):
+        return geoms.rename(data.name)
+    result = data.copy()
+    result[data.geometry.name] = geoms
+    return result.set_crs(WGS84, allow_override=True)
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Minimal sets of tiles covering an AOI
+
+The AOI is split into atoms: the faces of the arrangement of the tile footprints
+clipped to the AOI. Each atom lies inside a fixed set of tiles, found with the
+spatial index of the clipped footprints, so that covering the AOI becomes a
+weighted set cover problem on the atoms.
+
+The greedy method picks the tile covering the largest uncovered area until the
+AOI is covered, then drops the tiles made redundant by the later ones. The
+optimal method runs a branch and bound seeded with the greedy cover, which stops
+after a budget of search nodes with the best cover found so far.
+
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+import logging
+from typing import List, Optional, Tuple
+
+import geopandas as gp
+import numpy as np
+from shapely.geometry import GeometryCollection, MultiPolygon, Polygon
+from shapely.ops import polygonize, unary_union
+
+from eotile.eotiles.aoi_cover import AoiCover
+from eotile.eotiles.overlap import PLANAR, geometry_areas, inside_bounds
+from eotile.eotiles.profiling import span
+
+LOGGER = logging.getLogger("dev_logger")
+
+GREEDY = "greedy"
+OPTIMAL = "optimal"
+COVER_METHODS = (GREEDY, OPTIMAL)
+# Search nodes explored by the optimal method before it settles for its best cover
+COVER_BUDGET = 10000
+# Atoms smaller than this fraction of the covered area are floating point slivers
+SLIVER_FRACTION = 1e-9
+
+
+def check_cover_method(method: str) -> str:
+    """
+    :raises ValueError: when the cover method is unknown
+    """
+    if method not in COVER_METHODS:
+        raise ValueError(f"Unknown cover method {method}, expected one of {COVER_METHODS}")
+    return method
+
+
+def _polygonal(geom):
+    """Polygonal part of an intersection, None when empty"""
+    if geom is None or geom.is_empty:
+        return None
+    if isinstance(geom, (Polygon, MultiPolygon)):
+        return geom
+    if isinstance(geom, GeometryCollection):
+        polygons = [part for part in geom.geoms if isinstance(part, (Polygon, MultiPolygon))]
+        return unary_union(polygons) if polygons else None
+    return None
+
+
+class CoverageAtoms:
+    """
+    Atoms of an AOI covered by a set of tiles
+
+    :param tile_geoms: Tile footprints, in WGS84
+    :param aoi: AOI geometry, in WGS84, or its quad cover
+    :param area_mode: (Optional, default = "planar") Areas of the atoms: "planar" or "geodesic"
+    """
+
+    def __init__(self, tile_geoms, aoi, area_mode: str = PLANAR):
+        if isinstance(aoi, AoiCover):
+            aoi = aoi.geom
+        tile_geoms = list(tile_geoms)
+        self.n_tiles = len(tile_geoms)
+        bounds = np.array([geom.bounds for geom in tile_geoms], dtype=float).reshape(-1, 4)
+        inside = inside_bounds(bounds, aoi)
+        clipped = [
+            geom if inside[position] else _polygonal(geom.intersection(aoi))
+            for position, geom in enumerate(tile_geoms)
+        ]
+        tiles = np.array([position for position, geom in enumerate(clipped) if geom is not None])
+        clipped = [geom for geom in clipped if geom is not None]
+
+        self.areas = np.empty(0, dtype=float)
+        self.pair_atoms = np.empty(0, dtype=np.int64)
+        self.pair_tiles = np.empty(0, dtype=np.int64)
+        if not clipped:
+            return
+        # Noding the boundaries splits them at every crossing
+        atoms = list(polygonize(unary_union([geom.boundary for geom in clipped])))
+        points = gp.GeoSeries([atom.representative_point() for atom in atoms])
+        pair_atoms, pair_tiles = gp.GeoSeries(clipped).sindex.query_bulk(
+            points, predicate="within"
+        )
+        areas = geometry_areas(atoms, area_mode)
+        # Faces in the holes of the AOI lie in no tile
+        keep = np.zeros(len(atoms), dtype=bool)
+        keep[pair_atoms] = True
+        keep &= areas > areas[keep].sum() * SLIVER_FRACTION
+        renumber = np.cumsum(keep) - 1
+        pairs = keep[pair_atoms]
+        self.areas = areas[keep]
+        self.pair_atoms = renumber[pair_atoms[pairs]].astype(np.int64)
+        self.pair_tiles = tiles[pair_tiles[pairs]].astype(np.int64)
+
+    @property
+    def total_area(self) -> float:
+        """Area of the AOI covered by the tiles"""
+        return float(self.areas.sum())
+
+    def unique_areas(self, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Area covered by each tile and by no other tile of a selection
+
+        :param positions: (Optional, default = None) Positions of the selected tiles,
+        all the tiles when None
+        :return: the uniquely covered area of each tile, 0 for the tiles not selected
+        """
+        selected = np.ones(self.n_tiles, dtype=bool)
+        if positions is not None:
+            selected[:] = False
+            selected[np.asarray(positions, dtype=np.int64)] = True
+        pairs = selected[self.pair_tiles]
+        counts = np.bincount(self.pair_atoms[pairs], minlength=len(self.areas))
+        unique = pairs & (counts[self.pair_atoms] == 1)
+        return np.bincount(
+            self.pair_tiles[unique],
+            weights=self.areas[self.pair_atoms[unique]],
+            minlength=self.n_tiles,
+        ).astype(float)
+
+    def greedy_cover(self) -> List[int]:
+        """
+        Greedy cover: the tile covering the largest uncovered area first, then the
+        redundant tiles are dropped, smallest unique area first
+
+        :return: the positions of the selected tiles
+        """
+        covered = np.zeros(len(self.areas), dtype=bool)
+        chosen = []
+        while True:
+            live = ~covered[self.pair_atoms]
+            gains = np.bincount(
+                self.pair_tiles[live],
+                weights=self.areas[self.pair_atoms[live]],
+                minlength=self.n_tiles,
+            )
+            best = int(np.argmax(gains)) if self.n_tiles else 0
+            if not self.n_tiles or gains[best] <= 0:
+                break
+            chosen.append(best)
+            covered[self.pair_atoms[self.pair_tiles == best]] = True
+
+        counts = np.bincount(
+            self.pair_atoms[np.isin(self.pair_tiles, chosen)], minlength=len(self.areas)
+        )
+        unique_areas = self.unique_areas(chosen)
+        for position in sorted(chosen, key=lambda elt: unique_areas[elt]):
+            atoms = self.pair_atoms[self.pair_tiles == position]
+            if np.all(counts[atoms] > 1):
+                counts[atoms] -= 1
+                chosen.remove(position)
+        return sorted(chosen)
+
+    def optimal_cover(self, budget: int = COVER_BUDGET) -> Tuple[List[int], bool]:
+        """
+        Cover with the fewest tiles, by branch and bound
+
+        :param budget: (Optional, default = 10000) Maximum number of search nodes
+        :return: the positions of the selected tiles, and whether the cover is proven minimal
+        """
+        best = self.greedy_cover()
+        if len(best) <= 1:
+            return best, True
+        # Atom sets as bit masks
+        masks = [0] * self.n_tiles
+        coverers: List[List[int]] = [[] for _ in range(len(self.areas))]
+        for atom, tile in zip(self.pair_atoms.tolist(), self.pair_tiles.tolist()):
+            masks[tile] |= 1 << atom
+            coverers[atom].append(tile)
+        largest = max(bin(mask).count("1") for mask in masks)
+        nodes = 0
+        exhausted = True
+        stack = [(sum(1 << atom for atom in range(len(self.areas))), [])]
+        while stack:
+            uncovered, chosen = stack.pop()
+            if not uncovered:
+                if len(chosen) < len(best):
+                    best = sorted(chosen)
+                continue
+            # At least this number of tiles is still needed
+            needed = -(-bin(uncovered).count("1") // largest)
+            if len(chosen) + needed >= len(best):
+                continue
+            nodes += 1
+            if nodes > budget:
+                exhausted = False
+                break
+            # Branch on the tiles covering the uncovered atom with the fewest candidates
+            atom = min(
+                (atom for atom in range(len(self.areas)) if uncovered >> atom & 1),
+                key=lambda elt: len(coverers[elt]),
+            )
+            candidates = sorted(
+                coverers[atom], key=lambda tile: bin(masks[tile] & uncovered).count("1")
+            )
+            # The most covering candidate is explored first
+            stack.extend((uncovered & ~masks[tile], chosen + [tile]) for tile in candidates)
+        return best, exhausted
+
+
+def minimal_cover(
+    tile_list: gp.GeoDataFrame,
+    aoi,
+    method: str = GREEDY,
+    area_mode: str = PLANAR,
+    budget: int = COVER_BUDGET,
+) -> gp.GeoDataFrame:
+    """
+    Selects a minimal subset of tiles still covering an AOI
+
+    :param tile_list: The tiles intersecting the AOI
+    :param aoi: AOI geometry, in WGS84, or its quad cover
+    :param method: (Optional, default = "greedy") "greedy" or "optimal"
+    :param area_mode: (Optional, default = "planar") Areas used for the greedy choices and
+    the report: "planar" in square degrees, or "geodesic" in square meters
+    :param budget: (Optional, default = 10000) Search nodes of the optimal method
+    :return: the selected tiles, in the order of the tile list, with the area of the AOI
+    covered by each of them only in a "unique_area" column, and its share of the covered
+    area in a "unique_fraction" column
+    :raises ValueError: when the method is unknown
+    """
+    check_cover_method(method)
+    if len(tile_list) == 0:
+        return tile_list
+    with span("tile_cover", method=method, candidates=len(tile_list)) as stage:
+        atoms = CoverageAtoms(tile_list.geometry.values, aoi, area_mode)
+        if method == GREEDY:
+            positions = atoms.greedy_cover()
+        else:
+            positions, proven = atoms.optimal_cover(budget)
+            if not proven:
+                LOGGER.warning(
+                    "Cover search stopped after %s nodes, %s tiles may not be minimal",
+                    budget, len(positions),
+                )
+        unique_areas = atoms.unique_areas(positions)[positions]
+        covered = tile_list.iloc[positions].copy()
+        covered["unique_area"] = unique_areas
+        covered["unique_fraction"] = unique_areas / atoms.total_area if atoms.total_area else 0.0
+        stage.count(tiles=len(covered))
+    LOGGER.info("Cover of the AOI: %s tiles out of %s", len(covered), len(tile_list))
+    return covered
@@ -28,61 +28,88 @@ EO tile
 
 import logging
 import re
+import threading
 from pathlib import Path
 
-import requests
-from geopy.geocoders import Nominatim
-from shapely.geometry import box, shape
+from shapely.geometry import Point, box, shape
 
 from eotile.eotiles.eotiles import (
     bbox_to_list,
-    create_tiles_list_eo,
     create_tiles_list_eo_from_geometry,
-    geom_to_eo_tiles, parse_to_list
+    load_aoi,
+    load_geojson_geom,
+    load_wkb_geom,
+    load_wkt_geom,
+    parse_to_list,
+    point_to_list,
 )
+from eotile.eotiles.geocoders import get_geocoder
+from eotile.eotiles.profiling import span
+from eotile.eotiles.tile_cover import COVER_BUDGET, minimal_cover
+
+
+POLY_REG = re.compile("(POLYGON|Polygon|MULTIPOLYGON|Multipolygon)(.*?)")
+BBOX_REG = re.compile("(.*?)(([0-9]|.|-|,|'| )*,).(.*?)")
+TILE_ID_REG = re.compile(
+    "(([0-9]){4,6}|([0-9]){2}([A-Z]){3}|(N|S)([0-9]){2}(E|W)([0-9]){3}|srtm_([0-9]){2}_([0-9]){2})"
+)
+# GeoJSON geometries, features and feature collections
+GEOJSON_REG = re.compile(r'\s*\{.*"type"\s*:', re.DOTALL)
+# Hex encoded wkb: byte order, geometry type, then at least a point
+WKB_REG = re.compile("(00|01)([0-9A-Fa-f]{2}){20,}")
+# "lat, lon" or "lat lon", optionally between brackets
+POINT_REG = re.compile(
+    r"[\[(]?\s*'?(-?[0-9]+(\.[0-9]*)?)'?\s*(,|\s)\s*'?(-?[0-9]+(\.[0-9]*)?)'?\s*[\])]?"
+)
+
+SEARCH_TYPES = ["wkt", "geojson", "wkb", "tile_id", "point", "bbox", "file", "location"]
 
 
 # noinspection Mypy
-def input_matcher(input_value: str) -> str:
+def input_matcher(input_value: str, geocoder=None, geocode=True) -> str:
     """
     Induces the type of the input from the user input
 
     :param input_value: input provided by user of the cli
-    :return: type of the input: wkt, bbox, tile_id, file, location
+    :param geocoder: (Optional, default = None) Geocoding backend of the locations,
+    the default one when None
+    :param geocode: (Optional, default = True) Checks that the remaining inputs are
+    administrative locations with the geocoding backend. When False, they are
+    classified as locations without any request.
+    :return: type of the input: wkt, geojson, wkb, tile_id, point, bbox, file, location
     :rtype: str
     :raises ValueError: when the input value cannot be parsed
     """
-    poly_pattern = "(POLYGON|Polygon|MULTIPOLYGON|Multipolygon)(.*?)"
+    if POLY_REG.match(input_value):
+        return "wkt"
 
-    bbox_pattern = "(.*?)(([0-9]|.|-|,|'| )*,).(.*?)"
+    if GEOJSON_REG.match(input_value):
+        return "geojson"
 
-    tile_id_pattern = "(([0-9]){4,6}|([0-9]){2}([A-Z]){3}|(N|S)([0-9]){2}(E|W)([0-9]){3}|srtm_([0-9]){2}_([0-9]){2})"
-    poly_reg = re.compile(poly_pattern)
-    bbox_reg = re.compile(bbox_pattern)
-    tile_id_reg = re.compile(tile_id_pattern)
-    if poly_reg.match(input_value) and poly_reg.match(input_value).string == input_value:
-        return "wkt"
+    if WKB_REG.fullmatch(input_value):
+        return "wkb"
 
     # To parse a tile_id (list), we check that all inputted values corresponds to the tile_id regex
-    list_input = parse_to_list(input_value)
-    can_be_tile_id = True
-    for possible_tile in list_input:
-        if not(tile_id_reg.match(possible_tile) and
-               tile_id_reg.match(possible_tile).string == possible_tile):
-            can_be_tile_id = False
-    if can_be_tile_id:
+    if all(TILE_ID_REG.match(possible_tile) for possible_tile in parse_to_list(input_value)):
         return "tile_id"
 
-    if bbox_reg.match(input_value) and bbox_reg.match(input_value).string == input_value:
+    if POINT_REG.fullmatch(input_value.strip()):
+        return "point"
+
+    if BBOX_REG.match(input_value):
         return "bbox"
 
     if Path(input_value).exists():
         return "file"
 
-    geolocator = Nominatim(user_agent="eotile")
-    location = geolocator.geocode(input_value)
-    if location is not None:
-        location_type = location.raw["type"]
+    if not geocode:
+        return "location"
+
+    if geocoder is None:
+        geocoder = get_geocoder()
+    features = geocoder.search(input_value)["features"]
+    if features:
+        location_type = features[0]["properties"]["type"]
         if location_type == "administrative":
             return "location"
         raise ValueError(
@@ -93,6 +120,39 @@ def input_matcher(input_value: str) -> str:
     raise ValueError(f"Cannot parse this input: {input_value}")
 
 
+# Handler installed by build_logger on each logger, replaced by the next call so that
+# long-running processes calling main repeatedly do not pile handlers up
+_HANDLERS = {}
+_HANDLERS_LOCK = threading.Lock()
+
+
+def _set_handler(logger, handler):
+    with _HANDLERS_LOCK:
+        previous = _HANDLERS.pop(logger.name, None)
+        if previous is not None:
+            logger.removeHandler(previous)
+            previous.close()
+        logger.addHandler(handler)
+        _HANDLERS[logger.name] = handler
+
+
+def log_level(verbose=None):
+    """
+    Returns the level of the dev log for a verbosity
+
+    :param verbose: None for errors only, on the stream, 1 for warnings, 2 for info,
+    3 or more for debug, in the dev_log.log file
+    :returns: the logging level
+    """
+    if verbose is None:  # Default, no file
+        return logging.ERROR
+    if verbose == 1:  # Else, in a file
+        return logging.WARNING
+    if verbose == 2:
+        return logging.INFO
+    return logging.DEBUG
+
+
 def build_logger(level, user_file_name=None):
     """
     Builds two loggers : a dev one as well as a user one.
@@ -112,7 +172,7 @@ def build_logger(level, user_file_name=None):
 
     dev_logger = logging.getLogger("dev_logger")
     dev_logger.setLevel(level)
-    dev_logger.addHandler(dev_handler)
+    _set_handler(dev_logger, dev_handler)
 
     # Creating User logger
     user_formatter = logging.Formatter("%(message)s")
@@ -125,7 +185,7 @@ def build_logger(level, user_file_name=None):
 
     user_logger = logging.getLogger("user_logger")
     user_logger.setLevel(logging.INFO)
-    user_logger.addHandler(user_handler)
+    _set_handler(user_logger, user_handler)
 
     return dev_logger, user_logger
 
@@ -140,6 +200,8 @@ def treat_eotiles(
     min_overlap,
     location_type,
     threshold,
+    cover=None,
+    cover_budget=COVER_BUDGET,
 ):
     """
     Treats Tiles that can be loaded from a standard geography file
@@ -163,50 +225,93 @@ def treat_eotiles(
     :type location_type: str
     :param threshold: simplifying factor for the nominatim request
     :type threshold: str
+    :param cover: (Optional, default = None) Only keep a minimal set of tiles still covering
+    the AOI: "greedy" or "optimal"
+    :type cover: str
+    :param cover_budget: (Optional, default = 10000) Search nodes of the "optimal" cover
+    :type cover_budget: int
     """
-    if induced_type == "wkt":
-        wkt = input_arg
-        tile_list = geom_to_eo_tiles(wkt, epsg, filename_tiles, min_overlap)
-    elif induced_type == "location":
-        geom = build_nominatim_request(location_type, input_arg, threshold)
-        tile_list = create_tiles_list_eo_from_geometry(filename_tiles, geom, min_overlap)
-    elif induced_type == "bbox":
-        bbox = bbox_to_list(input_arg)
-        geom = box(*bbox)
-        tile_list = create_tiles_list_eo_from_geometry(filename_tiles, geom, min_overlap)
-    elif induced_type == "file":
-        aoi_filepath = Path(input_arg)
-        tile_list = create_tiles_list_eo(filename_tiles, aoi_filepath, min_overlap)
-        dev_logger.info("Nb of %s tiles which crossing the AOI: %s", tile_type, len(tile_list))
-    else:
+    geom = build_aoi_geometry(induced_type, input_arg, epsg, location_type, threshold)
+    if geom is None:
         dev_logger.error("Unrecognized Option: %s", induced_type)
-        tile_list = []
+        return []
+    tile_list = create_tiles_list_eo_from_geometry(filename_tiles, geom, min_overlap)
+    if cover is not None:
+        tile_list = minimal_cover(tile_list, geom, cover, budget=cover_budget)
+    if induced_type == "file":
+        dev_logger.info("Nb of %s tiles which crossing the AOI: %s", tile_type, len(tile_list))
 
     return tile_list
 
 
-def build_nominatim_request(location_type, input_arg, threshold):
+def build_aoi_geometry(
+    induced_type, input_arg, epsg, location_type, threshold, geocoder=None, aoi_mode="first"
+):
     """
-    Builds an http requests for nominatim, then runs it and outputs a geometry object
+    Parses and reprojects the input argument to a WGS84 geometry,
+    so that it can be shared by the queries of all tile sources
+    :param induced_type: Induced type of the input argument
+    :type induced_type: string
     :param input_arg: Argument out of which we select the tiles.
     :type input_arg: Union(list, str)
+    :param epsg: if input is a wkt polygon not coded in epsg 4326 (wgs84), then a conversion from
+    that epsg is produced
+    :type epsg: str
     :param location_type: specified type of nominatim request
     :type location_type: str
     :param threshold: simplifying factor for the nominatim request
     :type threshold: str
+    :param geocoder: (Optional, default = None) Geocoding backend of the locations,
+    the default one when None
+    :type geocoder: GeocodingBackend
+    :param aoi_mode: (Optional, default = "first") For files: "first" to keep the first feature,
+    "union" for the union of all the features
+    :type aoi_mode: str
+    :return: the AOI geometry, None if the input type is not recognized
     """
-    if location_type is not None:
-        req = location_type
-    else:
-        req = "q"
-    url = (
-        f"https://nominatim.openstreetmap.org/search?{req}={input_arg}"
-        f"&format=geojson&polygon_geojson=1&limit=1"
-    )
-    if threshold is not None:
-        url += f"& polygon_threshold = {threshold}"
-    data = requests.get(url)
-    elt = data.json()
+    with span("parse_aoi", type=induced_type):
+        return _build_aoi_geometry(
+            induced_type, input_arg, epsg, location_type, threshold, geocoder, aoi_mode
+        )
+
+
+def _build_aoi_geometry(
+    induced_type, input_arg, epsg, location_type, threshold, geocoder, aoi_mode
+):
+    if induced_type == "wkt":
+        return load_wkt_geom(input_arg, epsg)
+    if induced_type == "location":
+        return build_nominatim_request(location_type, input_arg, threshold, geocoder)
+    if induced_type == "bbox":
+        bbox = bbox_to_list(input_arg)
+        return box(*bbox)
+    if induced_type == "geojson":
+        return load_geojson_geom(input_arg, epsg)
+    if induced_type == "wkb":
+        return load_wkb_geom(input_arg, epsg)
+    if induced_type == "point":
+        lat, lon = point_to_list(input_arg)
+        return Point(lon, lat)
+    if induced_type == "file":
+        return load_aoi(Path(input_arg), aoi_mode)
+    return None
+
+
+def build_nominatim_request(location_type, input_arg, threshold, geocoder=None):
+    """
+    Runs a location request with the geocoding backend (Nominatim by default)
+    and outputs a geometry object
+    :param input_arg: Argument out of which we select the tiles.
+    :type input_arg: Union(list, str)
+    :param location_type: specified type of nominatim request
+    :type location_type: str
+    :param threshold: simplifying factor for the nominatim request
+    :type threshold: str
+    :param geocoder: (Optional, default = None) Geocoding backend, the default one when None
+    :type geocoder: GeocodingBackend
+    """
+    if geocoder is None:
+        geocoder = get_geocoder()
+    elt = geocoder.search(input_arg, location_type, threshold)
     geom = shape(elt["features"][0]["geometry"])
     return geom
-    
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Streaming writers of the tile lists printed by the CLI
+
+Tiles are formatted from column arrays, by chunks, and each chunk is written to
+the output stream at once.
+
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+import csv
+import json
+from typing import Dict, List, TextIO
+
+import geopandas as gp
+
+CHUNK_SIZE = 5000
+
+OUTPUT_FORMATS = ("text", "csv", "ndjson")
+
+# Fields written for each kind of output
+OUTPUT_FIELDS = {
+    "tile_id": ["id"],
+    "bbox": ["id", "bounds"],
+    "wkt": ["id", "wkt"],
+    "default": ["id", "wkt"],
+}
+
+TEXT_TEMPLATES = {
+    "tile_id": "[{label}] Tile id: {id}",
+    "bbox": "[{label}] Tile Bounds: {bounds}",
+    "wkt": "[{label}] Tile: {wkt}",
+    "default": "[{label} tile]\n {id}\n {wkt}",
+}
+
+DEM_AVAILABILITY = {
+    "EXIST_SRTM": "SRTM",
+    "EXIST_COP30": "Copernicus 30",
+    "EXIST_COP90": "Copernicus 90",
+}
+
+
+def _text_labels(source: str, tile_list: gp.GeoDataFrame) -> List[str]:
+    """The source of each tile, or the available products for DEM tiles"""
+    if source != "DEM":
+        return [source] * len(tile_list)
+    return [
+        ", ".join(name for name, exists in zip(DEM_AVAILABILITY.values(), flags) if exists)
+        for flags in zip(*(tile_list[column] for column in DEM_AVAILABILITY))
+    ]
+
+
+def _field_values(tile_list: gp.GeoDataFrame, field: str) -> list:
+    if field == "id":
+        return [str(elt) for elt in tile_list["id"]]
+    if field == "bounds":
+        return [tuple(elt) for elt in tile_list.geometry.bounds.to_numpy().tolist()]
+    return [geometry.wkt for geometry in tile_list.geometry]
+
+
+def tile_records(tile_list: gp.GeoDataFrame, source: str, output: str = "default") -> List[dict]:
+    """
+    Converts tiles to records serializable to JSON
+
+    :param tile_list: The tiles
+    :param source: Source of the tiles
+    :param output: (Optional, default = "default") What to write about each tile:
+    "tile_id", "bbox", "wkt" or "default" (id and wkt)
+    :return: one dict per tile, with the source, the output fields and the overlap when known
+    """
+    fields = list(OUTPUT_FIELDS[output])
+    columns = [_field_values(tile_list, field) for field in fields]
+    if "overlap" in tile_list.columns:
+        fields.append("overlap")
+        columns.append(tile_list["overlap"].astype(float).tolist())
+    return [{"source": source, **dict(zip(fields, values))} for values in zip(*columns)]
+
+
+def _chunks(tile_list: gp.GeoDataFrame, chunk_size: int):
+    for start in range(0, len(tile_list), chunk_size):
+        yield start, tile_list.iloc[start:start + chunk_size]
+
+
+def write_tile_lists(
+    stream: TextIO,
+    tile_lists: Dict[str, gp.GeoDataFrame],
+    output: str = "default",
+    output_format: str = "text",
+    chunk_size: int = CHUNK_SIZE,
+    line=None,
+    header: bool = True,
+) -> None:
+    """
+    Writes tile lists to a stream
+
+    :param stream: The output stream
+    :param tile_lists: The tiles of each source
+    :param output: (Optional, default = "default") What to write about each tile:
+    "tile_id", "bbox", "wkt" or "default" (id and wkt)
+    :param output_format: (Optional, default = "text") "text" for the human readable output
+    followed by a summary, "csv" or "ndjson"
+    :param chunk_size: (Optional, default = 5000) Number of tiles formatted and written at once
+    :param line: (Optional, default = None) Input line number the tiles are tagged with,
+    in batch mode. No summary is written for a line.
+    :param header: (Optional, default = True) Write the CSV header
+    :raises ValueError: when the output format is unknown
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format {output_format}, expected one of {OUTPUT_FORMATS}")
+    fields = OUTPUT_FIELDS[output]
+    csv_writer = None
+    if output_format == "csv":
+        csv_fields = ["source"] + [
+            field for elt in fields
+            for field in (["min_x", "min_y", "max_x", "max_y"] if elt == "bounds" else [elt])
+        ]
+        if line is not None:
+            csv_fields.insert(0, "line")
+        csv_writer = csv.writer(stream, lineterminator="\n")
+        if header:
+            csv_writer.writerow(csv_fields)
+    tags = {} if line is None else {"line": line}
+    prefix = "" if line is None else f"[line {line}] "
+
+    for source, tile_list in tile_lists.items():
+        if len(tile_list) == 0:
+            continue
+        for _, chunk in _chunks(tile_list, chunk_size):
+            columns = [_field_values(chunk, field) for field in fields]
+            if output_format == "text":
+                template = TEXT_TEMPLATES[output]
+                lines = [
+                    prefix + template.format(label=label, **dict(zip(fields, values)))
+                    for label, *values in zip(_text_labels(source, chunk), *columns)
+                ]
+                stream.write("\n".join(lines) + "\n")
+            elif output_format == "csv":
+                csv_writer.writerows(
+                    [*tags.values(), source, *[item for value in values
+                               for item in (value if isinstance(value, tuple) else [value])]]
+                    for values in zip(*columns)
+                )
+            else:
+                stream.write(
+                    "".join(
+                        json.dumps({**tags, "source": source, **dict(zip(fields, values))})
+                        + "\n"
+                        for values in zip(*columns)
+                    )
+                )
+
+    if output_format == "text" and line is None:
+        summary = ["--- Summary ---"] + [
+            f"- {len(tile_list)} {source} Tiles"
+            for source, tile_list in tile_lists.items()
+            if len(tile_list) > 0
+        ]
+        stream.write("\n".join(summary) + "\n")
+    stream.flush()
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+Analytic Landsat 8 (WRS-2 descending) tile grid
+
+A Landsat 8 tile id such as 198030 is a WRS-2 path (198) and row (030). Scene
+centers are derived from the WRS-2 orbit: 233 paths over a 16 days cycle, 248
+rows per orbit, row 60 on the descending node and path 1 crossing the equator
+at 64.60 W. Footprints are rebuilt around the centers with the nominal scene size.
+
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+import re
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyproj
+from shapely.geometry import Point, Polygon
+
+N_PATHS = 233
+N_ROWS = 248
+# Last row of the descending (daylight) pass
+LAST_DESCENDING_ROW = 124
+EQUATOR_ROW = 60
+PATH_1_NODE_LONGITUDE = -64.60
+INCLINATION = np.radians(98.2)
+# Orbital period, in minutes
+ORBIT_PERIOD = 16.0 * 1440.0 / N_PATHS
+# Rotation of the ground track relative to the orbit plane, in degrees per minute
+# (sun-synchronous orbit: one turn per solar day)
+GROUND_ROTATION = 360.0 / 1440.0
+ECCENTRICITY_2 = 0.00669438
+
+# Nominal scene size, in meters
+SCENE_LENGTH = 170000.0
+SCENE_WIDTH = 185000.0
+# Distance from a scene center within which the scene may reach, used to list candidates: the
+# half diagonal of a scene (about 126 km) plus a wide margin, as the scenes of the grid file are
+# larger than the nominal ones and their centers differ from the rebuilt ones
+SEARCH_RADIUS = 200000.0
+
+TILE_ID_REG = re.compile(r"([0-9]{1,3})([0-9]{3})")
+
+_GEOD = pyproj.Geod(ellps="WGS84")
+
+
+def parse_tile_id(tile_id: str) -> Tuple[int, int]:
+    """
+    Splits a tile id into its path and row
+
+    :raises ValueError: when the tile id is not a valid WRS-2 path / row
+    """
+    match = TILE_ID_REG.fullmatch(tile_id)
+    if match is None:
+        raise ValueError(f"Invalid Landsat 8 tile id {tile_id}")
+    path, row = int(match.group(1)), int(match.group(2))
+    if not 1 <= path <= N_PATHS or not 1 <= row <= N_ROWS:
+        raise ValueError(f"Invalid Landsat 8 tile id {tile_id}")
+    return path, row
+
+
+def format_tile_ids(paths, rows) -> List[str]:
+    """Formats tile ids from paths and rows"""
+    return [f"{path}{row:03d}" for path, row in zip(np.asarray(paths).tolist(),
+                                                    np.asarray(rows).tolist())]
+
+
+def is_valid_tile_id(tile_id: str) -> bool:
+    """Tells whether a tile id designates a WRS-2 path / row"""
+    try:
+        parse_tile_id(tile_id)
+    except ValueError:
+        return False
+    return True
+
+
+def _argument_of_latitude(rows) -> np.ndarray:
+    """Angle along the orbit from the ascending node, in radians"""
+    return np.radians(180.0 + (np.asarray(rows, dtype=float) - EQUATOR_ROW) * 360.0 / N_ROWS)
+
+
+def _track_offsets(arguments) -> Tuple[np.ndarray, np.ndarray]:
+    """Geodetic latitude and longitude offset from the descending node, in degrees"""
+    geocentric = np.arcsin(np.sin(INCLINATION) * np.sin(arguments))
+    latitudes = np.degrees(np.arctan(np.tan(geocentric) / (1.0 - ECCENTRICITY_2)))
+    inertial = np.arctan2(np.cos(INCLINATION) * np.sin(arguments), np.cos(arguments))
+    longitudes = np.degrees(inertial) - 180.0
+    elapsed = (np.degrees(arguments) - 180.0) / 360.0 * ORBIT_PERIOD
+    return latitudes, longitudes - elapsed * GROUND_ROTATION
+
+
+def node_longitudes(paths) -> np.ndarray:
+    """Longitudes of the descending node of paths"""
+    longitudes = PATH_1_NODE_LONGITUDE - (np.asarray(paths, dtype=float) - 1) * 360.0 / N_PATHS
+    return (longitudes + 180.0) % 360.0 - 180.0
+
+
+def scene_centers(paths, rows) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized scene center computation
+
+    :param paths: WRS-2 paths
+    :param rows: WRS-2 rows
+    :return: the longitudes and latitudes of the scene centers
+    """
+    latitudes, offsets = _track_offsets(_argument_of_latitude(rows))
+    longitudes = (node_longitudes(paths) + offsets + 180.0) % 360.0 - 180.0
+    return longitudes, latitudes
+
+
+def tile_footprints(tile_ids: Sequence[str]) -> List[Optional[Polygon]]:
+    """
+    Rebuilds the footprints of scenes from their ids, None for the invalid ids
+
+    Longitudes are kept continuous around the scene center, so footprints crossing
+    the antimeridian may go beyond 180 degrees.
+    """
+    footprints: List[Optional[Polygon]] = [None] * len(tile_ids)
+    valid = [(position, parse_tile_id(tile_id)) for position, tile_id in enumerate(tile_ids)
+             if is_valid_tile_id(tile_id)]
+    if not valid:
+        return footprints
+    paths = np.array([path for _, (path, _) in valid])
+    rows = np.array([row for _, (_, row) in valid])
+    lons, lats = scene_centers(paths, rows)
+    # Along track direction, from the centers of the neighbouring rows
+    half_row = 0.5
+    lons_before, lats_before = scene_centers(paths, rows - half_row)
+    lons_after, lats_after = scene_centers(paths, rows + half_row)
+    azimuths, _, _ = _GEOD.inv(lons_before, lats_before, lons_after, lats_after)
+
+    n_scenes = len(valid)
+    corners = []
+    for along, across in ((1, -1), (1, 1), (-1, 1), (-1, -1)):
+        mid_lons, mid_lats, _ = _GEOD.fwd(
+            lons, lats, azimuths, np.full(n_scenes, along * SCENE_LENGTH / 2.0)
+        )
+        corner_lons, corner_lats, _ = _GEOD.fwd(
+            mid_lons, mid_lats, azimuths + 90.0, np.full(n_scenes, across * SCENE_WIDTH / 2.0)
+        )
+        # Unwrap around the scene center
+        corner_lons = lons + (corner_lons - lons + 180.0) % 360.0 - 180.0
+        corners.append((corner_lons, corner_lats))
+    for index, (position, _) in enumerate(valid):
+        footprints[position] = Polygon([(elt[0][index], elt[1][index]) for elt in corners])
+    return footprints
+
+
+def candidate_tile_ids(bounds: Sequence[float]) -> List[str]:
+    """
+    Lists the ids of the scenes whose center is close enough to intersect a bounding box
+
+    The output is a superset of the intersecting scenes.
+
+    :param bounds: (min lon, min lat, max lon, max lat) in WGS84
+    :return: a list of candidate tile ids
+    """
+    lon_min, lat_min, lon_max, lat_max = [float(elt) for elt in bounds]
+    rows = np.arange(1, LAST_DESCENDING_ROW + 1)
+    latitudes, offsets = _track_offsets(_argument_of_latitude(rows))
+    lat_margin = np.degrees(SEARCH_RADIUS / 6371000.0)
+    keep = (latitudes >= lat_min - lat_margin) & (latitudes <= lat_max + lat_margin)
+    rows, latitudes, offsets = rows[keep], latitudes[keep], offsets[keep]
+
+    paths = np.arange(1, N_PATHS + 1)
+    nodes = node_longitudes(paths)
+    candidates = []
+    for row, latitude, offset in zip(rows, latitudes, offsets):
+        # Longitude margin at the highest latitude the scene can reach
+        highest = min(abs(latitude) + lat_margin, 89.0)
+        lon_margin = lat_margin / np.cos(np.radians(highest))
+        if lon_margin >= 180.0 or lon_max - lon_min + 2 * lon_margin >= 360.0:
+            keep = np.ones(N_PATHS, dtype=bool)
+        else:
+            centers = (nodes + offset + 180.0) % 360.0 - 180.0
+            middle = (lon_min + lon_max) / 2.0
+            distance = np.abs((centers - middle + 180.0) % 360.0 - 180.0)
+            keep = distance <= (lon_max - lon_min) / 2.0 + lon_margin
+        candidates.extend(format_tile_ids(paths[keep], np.full(keep.sum(), row)))
+    return candidates
+
+
+def tile_ids_from_points(lons, lats) -> Tuple[np.ndarray, List[str]]:
+    """
+    Lists the scenes whose rebuilt footprint contains points
+
+    :param lons: longitudes (WGS84)
+    :param lats: latitudes (WGS84)
+    :return: the point index and the tile id of each (point, scene) pair
+    """
+    point_index, tile_ids = [], []
+    for index, (lon, lat) in enumerate(zip(np.atleast_1d(lons), np.atleast_1d(lats))):
+        candidates = candidate_tile_ids((lon, lat, lon, lat))
+        point = Point(lon, lat)
+        for tile_id, footprint in zip(candidates, tile_footprints(candidates)):
+            if footprint.contains(point) or footprint.contains(Point(lon + 360.0, lat)):
+                point_index.append(index)
+                tile_ids.append(tile_id)
+    return np.array(point_index, dtype=int), tile_ids
+
+
+class WRS2Grid:
+    """
+    Analytic engine of the Landsat 8 grid file, used by the tile catalog
+    """
+
+    # The rebuilt footprints are approximate: the grid file is always required
+    can_replace_grid = False
+
+    def may_be_tile_id(self, tile_id: str) -> bool:
+        """
+        Tells whether a tile id may designate a scene of the grid: ids of WRS-2 path / rows,
+        the grid file tells which of them exist
+        """
+        return is_valid_tile_id(tile_id)
+
+    def candidate_tile_ids(self, bounds: Sequence[float]) -> List[str]:
+        """Lists the ids of the scenes which may intersect a bounding box"""
+        return candidate_tile_ids(bounds)
+
+    def tile_footprints(self, tile_ids: Sequence[str]) -> List[Optional[Polygon]]:
+        """Rebuilds the footprints of scenes from their ids"""
+        return tile_footprints(tile_ids)
+
+    def tile_attributes(self, tile_ids: Sequence[str]) -> pd.DataFrame:
+        """Landsat 8 tiles have no attribute besides their id"""
+        return pd.DataFrame(index=range(len(tile_ids)))
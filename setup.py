@@ -41,7 +41,7 @@ setup(
     author_email="mickael.savinaud@csgroup.eu, mathis.germa@csgroup.eu",
     url="https://github.com/CS-SI/eotile",
     packages=find_packages(exclude=["*.tests", "*.tests.*", "tests.*", "tests"]),
-    python_requires=">=3.6, <4",
+    python_requires=">=3.7, <4",
     license="Apache License Version 2.0",
     classifiers=[
         "Programming Language :: Python :: 3",
@@ -51,7 +51,7 @@ setup(
     install_requires=[
         "geopandas>= 0.9,<0.10",
         "geopy>=2.2,<3",
-        "pyproj>=3,<4",
+        "pyproj>=3.1,<4",
         "requests>=2.26,<3",
         "Shapely>=1.8,<2",
     ],
@@ -63,12 +63,14 @@ setup(
             "data/aux_data/l8_tiles.gpkg",
             "data/aux_data/DEM_Union.gpkg",
             "data/aux_data/srtm5x5_tiles.gpkg",
+            "data/aux_data/*_lookup.npy",
             "config/data_path",
         ]
     },
     extras_require={
         "dev": ["check-manifest"],
         "test": ["coverage>5,<=6"],
+        "parquet": ["pyarrow"],
     },
     entry_points={
         "console_scripts": [
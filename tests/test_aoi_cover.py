@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+
+
+import pickle
+import unittest
+from pathlib import Path
+
+import numpy as np
+from shapely.geometry import Point, box
+
+from eotile.eotiles.aoi_cover import (
+    BOUNDARY,
+    INSIDE,
+    OUTSIDE,
+    AoiCover,
+    count_vertices,
+    prepare_aoi,
+)
+from eotile.eotiles.catalog import get_catalog
+from eotile.eotiles.eotiles import create_tiles_list_eo_from_geometry
+from eotile.eotiles.overlap import GEODESIC, tile_overlaps
+
+
+class TestAoiCover(unittest.TestCase):
+    def setUp(self):
+        self.grid = Path("eotile/data/aux_data/srtm5x5_tiles.gpkg")
+        self.tiles = get_catalog(self.grid).tiles
+        # A detailed disk with a hole, spanning many 5x5 degrees tiles
+        self.aoi = Point(2, 46).buffer(12, resolution=2000).difference(
+            Point(3, 47).buffer(2, resolution=200)
+        )
+
+    def test_count_vertices(self):
+        self.assertEqual(count_vertices(box(0, 0, 1, 1)), 5)
+        with_hole = box(0, 0, 4, 4).difference(box(1, 1, 2, 2))
+        self.assertEqual(count_vertices(with_hole), 10)
+
+    def test_decomposition(self):
+        cover = AoiCover(self.aoi, max_vertices=64)
+        self.assertEqual(cover.vertices_before, count_vertices(self.aoi))
+        self.assertTrue(cover.inside_cells)
+        self.assertTrue(all(count_vertices(piece) <= 64 for piece in cover.pieces))
+        # The cells and the pieces partition the AOI
+        area = sum(cell.area for cell in cover.inside_cells) + sum(
+            piece.area for piece in cover.pieces
+        )
+        self.assertAlmostEqual(area, self.aoi.area, places=8)
+
+    def test_classify(self):
+        cover = AoiCover(self.aoi, max_vertices=64)
+        tiles = self.tiles.geometry.values
+        classes = cover.classify(tiles)
+        np.testing.assert_array_equal(classes != OUTSIDE, self.tiles.intersects(self.aoi))
+        # Tiles touching boundary pieces only along their edges are classified on the boundary
+        self.assertTrue((classes == INSIDE).any())
+        self.assertTrue(self.tiles[classes == INSIDE].within(self.aoi).all())
+        self.assertTrue((classes == BOUNDARY).any())
+
+    def test_overlaps(self):
+        cover = AoiCover(self.aoi, max_vertices=64)
+        tiles = self.tiles[self.tiles.intersects(self.aoi)].geometry.values
+        for area_mode in ("planar", GEODESIC):
+            with self.subTest(area_mode=area_mode):
+                overlaps = cover.overlaps(tiles, area_mode=area_mode)
+                expected = tile_overlaps(tiles, self.aoi, area_mode=area_mode)
+                np.testing.assert_allclose(overlaps, expected, atol=1e-9)
+                np.testing.assert_array_equal(overlaps == 1.0, expected == 1.0)
+
+    def test_tolerance(self):
+        exact = AoiCover(self.aoi)
+        simplified = AoiCover(self.aoi, tolerance=0.05)
+        self.assertLess(simplified.vertices_after, exact.vertices_after)
+        tiles = self.tiles[self.tiles.intersects(self.aoi)].geometry.values
+        np.testing.assert_allclose(
+            simplified.overlaps(tiles), exact.overlaps(tiles), atol=0.01
+        )
+
+    def test_pickle(self):
+        cover = AoiCover(self.aoi, max_vertices=64)
+        tiles = self.tiles.geometry.values
+        cover.classify(tiles)
+        copy = pickle.loads(pickle.dumps(cover))
+        np.testing.assert_array_equal(copy.classify(tiles), cover.classify(tiles))
+
+    def test_prepare_aoi(self):
+        self.assertIs(prepare_aoi(self.aoi), self.aoi)
+        self.assertIsInstance(prepare_aoi(self.aoi, 0), AoiCover)
+        self.assertIsInstance(prepare_aoi(Point(2, 46).buffer(1, resolution=6000)), AoiCover)
+        point = Point(2, 46)
+        self.assertIs(prepare_aoi(point, 0.1), point)
+
+    def test_create_tiles_list(self):
+        cover = prepare_aoi(self.aoi, 0)
+        for min_overlap in (None, 0.3):
+            with self.subTest(min_overlap=min_overlap):
+                expected = create_tiles_list_eo_from_geometry(self.grid, self.aoi, min_overlap)
+                tiles = create_tiles_list_eo_from_geometry(self.grid, cover, min_overlap)
+                self.assertEqual(list(tiles["id"]), list(expected["id"]))
+                if min_overlap is not None:
+                    np.testing.assert_allclose(tiles["overlap"], expected["overlap"], atol=1e-9)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+import geopandas as gp
+from shapely.geometry import box
+
+from eotile.eotiles import grid_cache
+from eotile.eotiles.catalog import clear_catalogs, get_catalog, warm_up
+from eotile.eotiles.eotiles import create_tiles_list_eo_from_geometry
+from eotile.eotiles.get_bb_from_tile_id import build_reference_geom
+
+
+class TestCatalog(unittest.TestCase):
+    filename_tiles_srtm5x5 = Path("eotile/data/aux_data/srtm5x5_tiles.gpkg")
+
+    def setUp(self):
+        clear_catalogs()
+
+    def test_catalog_is_shared_and_lazy(self):
+        catalog = get_catalog(self.filename_tiles_srtm5x5)
+        self.assertIs(catalog, get_catalog(self.filename_tiles_srtm5x5.absolute()))
+        self.assertFalse(catalog.is_loaded)
+        warm_up([self.filename_tiles_srtm5x5])
+        self.assertTrue(catalog.is_loaded)
+
+    def test_query_matches_file_mask(self):
+        geom = box(-74.657, 39.4284, -72.0429, 41.2409)
+        expected = gp.read_file(self.filename_tiles_srtm5x5, mask=geom)
+        output = create_tiles_list_eo_from_geometry(self.filename_tiles_srtm5x5, geom)
+        self.assertListEqual(sorted(output.id), sorted(expected.id))
+        self.assertEqual(len(output), 2)
+        # The same index before and after the grid is loaded
+        warm_up([self.filename_tiles_srtm5x5])
+        loaded = create_tiles_list_eo_from_geometry(self.filename_tiles_srtm5x5, geom)
+        self.assertListEqual(list(output.index), [0, 1])
+        self.assertListEqual(list(loaded.index), [0, 1])
+
+    def test_get_tile(self):
+        catalog = get_catalog(self.filename_tiles_srtm5x5)
+        self.assertEqual(catalog.get_tile("srtm_37_04")["id"], "srtm_37_04")
+        with self.assertRaises(KeyError):
+            catalog.get_tile("srtm_99_99")
+
+    def test_get_tiles(self):
+        tile_ids = ["srtm_37_04", "srtm_99_99", "srtm_36_04", "31TCJ"]
+        catalog = get_catalog(self.filename_tiles_srtm5x5)
+        tiles, unknown = catalog.get_tiles(tile_ids)
+        self.assertFalse(catalog.is_loaded)
+        self.assertListEqual(list(tiles.id), ["srtm_37_04", "srtm_36_04"])
+        self.assertListEqual(unknown, ["srtm_99_99", "31TCJ"])
+
+        catalog.warm_up()
+        loaded_tiles, loaded_unknown = catalog.get_tiles(tile_ids)
+        self.assertListEqual(list(loaded_tiles.id), list(tiles.id))
+        self.assertListEqual(loaded_unknown, unknown)
+        self.assertTrue(loaded_tiles.geometry.geom_equals(tiles.geometry).all())
+
+
+    def test_duplicate_tile_ids(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = Path(tmp_dir) / "tiles.gpkg"
+            gp.GeoDataFrame(
+                {"id": ["a", "b", "a"], "rank": [0, 1, 2]},
+                geometry=[box(0, 0, 1, 1), box(1, 0, 2, 1), box(2, 0, 3, 1)],
+                crs="epsg:4326",
+            ).to_file(filename, driver="GPKG")
+            # Every row of a repeated id, as the grid file read with .loc
+            for use_cache in [False, True]:
+                clear_catalogs()
+                if use_cache:
+                    grid_cache.build_cache(filename)
+                catalog = get_catalog(filename)
+                tiles, unknown = catalog.get_tiles(["b", "a", "c", "b"])
+                self.assertListEqual(list(tiles["rank"]), [1, 0, 2, 1])
+                self.assertListEqual(unknown, ["c"])
+                self.assertEqual(catalog.get_tile("a")["rank"], 0)
+                self.assertEqual(len(build_reference_geom(filename, ["a"])[2]), 2)
+            clear_catalogs()
+
+    def test_no_tile_id(self):
+        with self.assertRaisesRegex(SystemExit, "no tile id"):
+            build_reference_geom(self.filename_tiles_srtm5x5, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import geopandas as gp
+import numpy as np
+import pandas as pd
+from shapely.geometry import box
+
+from eotile.eotiles.catalog import clear_catalogs
+from eotile.eotiles.crossref import build_crossref, clear_crossrefs, get_crossref
+from eotile.eotiles.get_bb_from_tile_id import get_tiles_from_tile_id
+
+
+def dem_tile_id(lon, lat):
+    return f"{'N' if lat >= 0 else 'S'}{abs(lat):02d}{'E' if lon >= 0 else 'W'}{abs(lon):03d}"
+
+
+class TestCrossReference(unittest.TestCase):
+    def setUp(self):
+        clear_catalogs()
+        clear_crossrefs()
+        self.aux_data_dirpath = Path(tempfile.mkdtemp())
+        shutil.copy("eotile/data/aux_data/srtm5x5_tiles.gpkg", self.aux_data_dirpath)
+        cells = [(lon, lat) for lon in range(-8, 8) for lat in range(36, 48)]
+        # Around srtm_48_06 and srtm_49_06, which overlap each other
+        cells += [(lon, lat) for lon in range(54, 66) for lat in range(29, 36)]
+        gp.GeoDataFrame(
+            {
+                "id": [dem_tile_id(lon, lat) for lon, lat in cells],
+                "EXIST_SRTM": 1,
+                "EXIST_COP30": 1,
+                "EXIST_COP90": 1,
+            },
+            geometry=[box(lon, lat, lon + 1, lat + 1) for lon, lat in cells],
+            crs="epsg:4326",
+        ).to_file(self.aux_data_dirpath / "DEM_Union.gpkg", driver="GPKG")
+
+    def tearDown(self):
+        clear_catalogs()
+        clear_crossrefs()
+        shutil.rmtree(self.aux_data_dirpath)
+
+    def search(self, tile_ids, min_overlap=None):
+        output_s2, output_l8, output_dem, output_srtm5x5 = get_tiles_from_tile_id(
+            tile_ids, self.aux_data_dirpath, True, True, True, True, min_overlap
+        )
+        return list(output_dem.id), list(output_srtm5x5.id)
+
+    def test_lookup_matches_spatial_query(self):
+        queries = [
+            (["srtm_37_04"], None),
+            (["srtm_37_04", "srtm_36_05"], 0.5),
+            (["N43E001"], None),
+            (["N43E001", "N43E002", "N44E001"], 0.02),
+        ]
+        expected = [self.search(tile_ids, min_overlap) for tile_ids, min_overlap in queries]
+        build_crossref(self.aux_data_dirpath)
+        self.assertIsNotNone(get_crossref(self.aux_data_dirpath))
+        for (tile_ids, min_overlap), output in zip(queries, expected):
+            self.assertEqual(self.search(tile_ids, min_overlap), output)
+        self.assertEqual(
+            list(get_crossref(self.aux_data_dirpath).lookup(
+                "srtm5x5_tiles.gpkg", "DEM_Union.gpkg", ["srtm_37_04"], 0.5
+            ).index),
+            [dem_tile_id(lon, lat) for lon in range(0, 5) for lat in range(40, 45)],
+        )
+
+    def test_overlapping_input_tiles(self):
+        # The overlap of the two SRTM tiles is not counted twice
+        tile_ids = ["srtm_48_06", "srtm_49_06"]
+        expected = self.search(tile_ids, 0.999)
+        self.assertNotIn("N34E059", expected[0])
+        build_crossref(self.aux_data_dirpath)
+        crossref = get_crossref(self.aux_data_dirpath)
+        self.assertFalse(crossref.meta["disjoint"]["srtm5x5_tiles.gpkg"])
+        self.assertTrue(crossref.meta["disjoint"]["DEM_Union.gpkg"])
+        self.assertEqual(self.search(tile_ids, 0.999), expected)
+
+    def test_repeated_tile_id(self):
+        filename = self.aux_data_dirpath / "DEM_Union.gpkg"
+        tiles = gp.read_file(filename)
+        gp.GeoDataFrame(
+            pd.concat([tiles, tiles[tiles.id == "N40E001"]], ignore_index=True), crs=tiles.crs
+        ).to_file(filename, driver="GPKG")
+        clear_catalogs()
+        outputs = []
+        for _ in range(2):
+            outputs.append(get_tiles_from_tile_id(
+                ["srtm_37_04"], self.aux_data_dirpath, True, True, True, False, 0.5
+            )[2])
+            build_crossref(self.aux_data_dirpath)
+        # Every row of the repeated id, from the spatial query then from the table
+        spatial, table = [output.sort_values("id", kind="stable") for output in outputs]
+        self.assertEqual(list(table.id).count("N40E001"), 2)
+        self.assertListEqual(list(table.id), list(spatial.id))
+        self.assertTrue(np.allclose(table.overlap, spatial.overlap))
+
+    def test_ignored_when_grid_changes(self):
+        build_crossref(self.aux_data_dirpath)
+        filename = self.aux_data_dirpath / "DEM_Union.gpkg"
+        # A copy of the grids, e.g. an installed package, can use the table
+        stat = filename.stat()
+        os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertIsNotNone(
+            get_crossref(self.aux_data_dirpath).lookup(
+                "srtm5x5_tiles.gpkg", "DEM_Union.gpkg", ["srtm_37_04"]
+            )
+        )
+        clear_crossrefs()
+        gp.GeoDataFrame(
+            {"id": ["N00E000"], "EXIST_SRTM": 1, "EXIST_COP30": 1, "EXIST_COP90": 1},
+            geometry=[box(0, 0, 1, 1)],
+            crs="epsg:4326",
+        ).to_file(filename, driver="GPKG")
+        self.assertIsNone(
+            get_crossref(self.aux_data_dirpath).lookup(
+                "srtm5x5_tiles.gpkg", "DEM_Union.gpkg", ["srtm_37_04"]
+            )
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
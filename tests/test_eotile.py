@@ -24,14 +24,33 @@
 :license: see LICENSE file.
 """
 
+import io
+import json
 import logging
+import tempfile
+import threading
 import unittest
+from contextlib import redirect_stderr, redirect_stdout
 from pathlib import Path
 
-from eotile.eotile_module import main as eomain
-from eotile.eotiles.eotiles import create_tiles_list_eo, get_tile, write_tiles_bb
+import geopandas as gp
+from shapely.geometry import box, mapping
+
+from eotile.eotile_cli import main as cli_main
+from eotile.eotile_module import batch_search, main as eomain, search_lines
+from eotile.eotiles.eotiles import (
+    create_tiles_list_eo,
+    get_tile,
+    query_sources,
+    write_tiles_bb,
+)
 from eotile.eotiles.get_bb_from_tile_id import get_tiles_from_tile_id, tile_id_matcher
-from eotile.eotiles.utils import build_nominatim_request, input_matcher
+from eotile.eotiles.utils import (
+    build_aoi_geometry,
+    build_logger,
+    build_nominatim_request,
+    input_matcher,
+)
 
 
 class TestEOTile(unittest.TestCase):
@@ -133,6 +152,114 @@ class TestEOTile(unittest.TestCase):
             out_list.append(input_matcher(elt))
         self.assertListEqual(out_list, ["tile_id", "tile_id"])
 
+    def test_input_matcher_offline(self):
+        polygon = box(1, 43, 2, 44)
+        inputs = {
+            json.dumps(polygon.__geo_interface__): "geojson",
+            json.dumps({"type": "Feature", "properties": {}, "geometry": mapping(polygon)}):
+                "geojson",
+            polygon.wkb_hex: "wkb",
+            "43.6, 1.44": "point",
+            "(-12.5 130)": "point",
+            "31TCJ": "tile_id",
+            "Toulouse": "location",
+        }
+        for input_value, search_type in inputs.items():
+            self.assertEqual(input_matcher(input_value, geocode=False), search_type)
+            if search_type in ("geojson", "wkb"):
+                geom = build_aoi_geometry(search_type, input_value, None, None, None)
+                self.assertTrue(geom.equals(polygon))
+        self.assertEqual(
+            build_aoi_geometry("point", "43.6, 1.44", None, None, None).coords[0], (1.44, 43.6)
+        )
+        with self.assertRaises(ValueError):
+            build_aoi_geometry("point", "143.6, 1.44", None, None, None)
+
+    def test_main_search_type(self):
+        out = eomain(
+            "43.6, 1.44", no_l8=True, no_s2=True, srtm5x5=True, search_type="point"
+        )
+        self.assertListEqual(list(out[3].id), ["srtm_37_04"])
+        with self.assertRaises(ValueError):
+            eomain("43.6, 1.44", search_type="address")
+
+    def test_search_lines(self):
+        lines = ["43.6, 1.44\n", "\n", "# comment\n", "srtm_99_99\n", "46.6, 1.44\n"] * 3
+        for jobs in (1, 3):
+            results = list(
+                search_lines(lines, jobs, no_l8=True, no_s2=True, srtm5x5=True, executor=None)
+            )
+            self.assertListEqual([number for number, _ in results], [1, 4, 5, 6, 9, 10, 11, 14, 15])
+            self.assertIsInstance(results[1][1], SystemExit)
+            self.assertListEqual(list(results[0][1][3].id), ["srtm_37_04"])
+            self.assertListEqual(list(results[2][1][3].id), ["srtm_37_03"])
+
+    def test_build_logger_threads(self):
+        loggers = build_logger(logging.ERROR)
+        counts = [len(logger.handlers) for logger in loggers]
+
+        def configure():
+            for _ in range(300):
+                build_logger(logging.ERROR)
+
+        threads = [threading.Thread(target=configure) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertListEqual([len(logger.handlers) for logger in loggers], counts)
+
+    def test_batch_cli(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = Path(tmp_dir) / "inputs.txt"
+            filename.write_text("43.6, 1.44\nsrtm_99_99\n46.6, 1.44\n")
+            stdout, stderr = io.StringIO(), io.StringIO()
+            with redirect_stdout(stdout), redirect_stderr(stderr):
+                status = cli_main(
+                    ["-batch", str(filename), "-no_l8", "-no_s2", "-srtm5x5", "-to_tile_id",
+                     "-format", "ndjson", "-jobs", "2"]
+                )
+        self.assertEqual(status, 1)
+        self.assertListEqual(
+            [json.loads(line) for line in stdout.getvalue().splitlines()],
+            [
+                {"line": 1, "source": "SRTM 5x5", "id": "srtm_37_04"},
+                {"line": 3, "source": "SRTM 5x5", "id": "srtm_37_03"},
+            ],
+        )
+        self.assertIn("[line 2] Error", stderr.getvalue())
+
+    def test_aoi_modes(self):
+        filename_tiles = Path("eotile/data/aux_data/srtm5x5_tiles.gpkg")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename_aoi = Path(tmp_dir) / "aoi.gpkg"
+            gp.GeoDataFrame(
+                {"name": ["Toulouse", "Paris", "Sydney"], "id": [31, 75, 2000]},
+                geometry=[box(1.3, 43.5, 1.5, 43.7), box(2.2, 48.8, 2.5, 48.9),
+                          box(151.1, -34.0, 151.3, -33.8)],
+                crs="EPSG:4326",
+            ).to_crs("EPSG:3857").to_file(filename_aoi, driver="GPKG")
+
+            first = create_tiles_list_eo(filename_tiles, filename_aoi)
+            self.assertListEqual(list(first.id), ["srtm_37_04"])
+            union = create_tiles_list_eo(filename_tiles, filename_aoi, aoi_mode="union")
+            self.assertListEqual(sorted(union.id), ["srtm_37_03", "srtm_37_04", "srtm_67_19"])
+            for executor in (None, "process"):
+                features = create_tiles_list_eo(
+                    filename_tiles, filename_aoi, aoi_mode="features", executor=executor
+                )
+                self.assertListEqual(
+                    list(features.id), ["srtm_37_04", "srtm_37_03", "srtm_67_19"]
+                )
+                self.assertListEqual(list(features.aoi_index), [0, 1, 2])
+                self.assertListEqual(list(features.name), ["Toulouse", "Paris", "Sydney"])
+                self.assertListEqual(list(features.aoi_id), [31, 75, 2000])
+
+            outputs = eomain(
+                str(filename_aoi), no_l8=True, no_s2=True, srtm5x5=True, aoi_mode="features"
+            )
+            self.assertListEqual(list(outputs[3].name), ["Toulouse", "Paris", "Sydney"])
+
     def test_id_matcher(self):
         test_id_srtm = "N02W102"
         test_id_cop = "S02W102"
@@ -215,6 +342,48 @@ class TestEOTile(unittest.TestCase):
         self.assertEqual(len(output_dem), 4)
         self.assertEqual(len(output_srtm5x5), 0)
 
+    def test_batch_search(self):
+        aois = gp.GeoDataFrame(
+            {"name": ["New Jersey", "Illinois"]},
+            geometry=[
+                box(-74.657, 39.4284, -72.0429, 41.2409),
+                gp.read_file("tests/test_data/illinois.shp").to_crs(4326).geometry.iloc[0],
+            ],
+            crs="epsg:4326",
+            index=[10, 20],
+        )
+        output = batch_search(aois, no_l8=True, no_s2=True, srtm5x5=True)
+        self.assertListEqual(list(output.columns), ["aoi_index", "source", "id"])
+        self.assertEqual(len(output[output.aoi_index == 10]), 2)
+        self.assertEqual(len(output[output.aoi_index == 20]), 4)
+
+        output = batch_search(
+            ["POLYGON((0 40, 6 40, 6 46, 0 40))"],
+            no_l8=True,
+            no_s2=True,
+            srtm5x5=True,
+            min_overlap=0.3,
+        )
+        self.assertListEqual(list(output.id), ["srtm_37_04"])
+
+    def test_query_sources(self):
+        aux_data_dirpath = Path("eotile/data/aux_data")
+        # Only the SRTM 5x5 grid is shipped with the sources
+        filenames = {
+            "SRTM 5x5": aux_data_dirpath / "srtm5x5_tiles.gpkg",
+            "SRTM 5x5 copy": aux_data_dirpath / "srtm5x5_tiles.gpkg",
+        }
+        geom = box(-74.657, 39.4284, -72.0429, 41.2409)
+        sequential = query_sources(filenames, geom, executor=None)
+        timings = {}
+        concurrent = query_sources(filenames, geom, executor="thread", timings=timings)
+        self.assertSetEqual(set(timings), set(filenames))
+        for source in filenames:
+            self.assertListEqual(list(sequential[source].id), list(concurrent[source].id))
+        self.assertEqual(len(concurrent["SRTM 5x5"]), 2)
+        with self.assertRaises(ValueError):
+            query_sources(filenames, geom, executor="fork")
+
     def test_build_nominatim_request(self):
         self.assertTrue(
             abs(
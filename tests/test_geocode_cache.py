@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+from eotile.eotiles.geocode_cache import GeocodeCache
+from eotile.eotiles.utils import build_nominatim_request, input_matcher
+
+TOULOUSE = {
+    "type": "FeatureCollection",
+    "features": [
+        {
+            "type": "Feature",
+            "properties": {"type": "administrative"},
+            "geometry": {
+                "type": "Polygon",
+                "coordinates": [[[1.3, 43.5], [1.5, 43.5], [1.5, 43.7], [1.3, 43.7], [1.3, 43.5]]],
+            },
+        }
+    ],
+}
+
+
+class StandInNominatim(BaseHTTPRequestHandler):
+    """Answers every search with Toulouse, or nothing for Nowhere"""
+
+    requests = []
+
+    def do_GET(self):  # noqa: N802
+        query = parse_qs(urlparse(self.path).query)
+        self.requests.append(query)
+        response = {"type": "FeatureCollection", "features": []}
+        if query.get("q") != ["Nowhere"]:
+            response = TOULOUSE
+        body = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestGeocodeCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_path = Path(self.tmp_dir.name) / "geocode.sqlite"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_ttl(self):
+        cache = GeocodeCache(self.cache_path, ttl=100)
+        key = GeocodeCache.make_key(["Toulouse", None, None])
+        cache.put(key, TOULOUSE)
+        self.assertEqual(cache.get(key), TOULOUSE)
+        with mock.patch("time.time", return_value=cache_time(cache, key) + 101):
+            self.assertIsNone(cache.get(key))
+        self.assertEqual(len(cache), 0)
+
+    def test_lru_eviction(self):
+        cache = GeocodeCache(self.cache_path, max_entries=2)
+        now = time.time()
+        with mock.patch("time.time", side_effect=[now + step for step in range(4)]):
+            cache.put("a", 1)
+            cache.put("b", 2)
+            self.assertEqual(cache.get("a"), 1)
+            cache.put("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.clear(), 2)
+
+    def test_damaged_database(self):
+        cache = GeocodeCache(self.cache_path)
+        self.cache_path.write_bytes(b"not a database" * 100)
+        with self.assertLogs("dev_logger", "WARNING"):
+            cache.put("a", 1)
+            self.assertIsNone(cache.get("a"))
+
+
+def cache_time(cache, key):
+    import sqlite3
+
+    with sqlite3.connect(str(cache.path)) as connection:
+        return connection.execute("SELECT created FROM geocode WHERE key = ?", (key,)).fetchone()[0]
+
+
+class TestCachedNominatim(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(("127.0.0.1", 0), StandInNominatim)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        StandInNominatim.requests = []
+        environ = {
+            "EOTILE_NOMINATIM_URL": f"http://127.0.0.1:{self.server.server_port}",
+            "EOTILE_GEOCODE_CACHE": os.path.join(self.tmp_dir.name, "geocode.sqlite"),
+        }
+        self.environ = mock.patch.dict(os.environ, environ)
+        self.environ.start()
+
+    def tearDown(self):
+        self.environ.stop()
+        self.tmp_dir.cleanup()
+
+    def test_shared_cache(self):
+        self.assertEqual(input_matcher("Toulouse"), "location")
+        geom = build_nominatim_request(None, "Toulouse", None)
+        self.assertAlmostEqual(geom.area, 0.04)
+        # Both calls were answered by a single request
+        self.assertEqual(len(StandInNominatim.requests), 1)
+
+        build_nominatim_request(None, "Toulouse", "0.1")
+        self.assertEqual(len(StandInNominatim.requests), 2)
+        self.assertEqual(StandInNominatim.requests[-1]["polygon_threshold"], ["0.1"])
+
+    def test_misses_are_cached(self):
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                input_matcher("Nowhere")
+        self.assertEqual(len(StandInNominatim.requests), 1)
+
+    def test_damaged_cache(self):
+        input_matcher("Toulouse")
+        Path(os.environ["EOTILE_GEOCODE_CACHE"]).write_bytes(b"not a database" * 100)
+        # The requests are sent to the geocoder
+        for _ in range(2):
+            self.assertAlmostEqual(build_nominatim_request(None, "Toulouse", None).area, 0.04)
+        self.assertEqual(len(StandInNominatim.requests), 3)
+
+    def test_disabled_cache(self):
+        with mock.patch.dict(os.environ, {"EOTILE_GEOCODE_CACHE": "off"}):
+            for _ in range(2):
+                input_matcher("Toulouse")
+        self.assertEqual(len(StandInNominatim.requests), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
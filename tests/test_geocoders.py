@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import geopandas as gp
+from shapely.geometry import box
+
+from eotile.eotiles import geocoders
+from eotile.eotiles.geocoders import BoundaryFileBackend, NominatimBackend, get_geocoder
+from eotile.eotiles.utils import build_aoi_geometry, input_matcher
+
+
+class TestBoundaryFileBackend(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.filename = Path(self.tmp_dir.name) / "boundaries.gpkg"
+        boundaries = gp.GeoDataFrame(
+            {
+                "name": ["Toulouse", "Haute-Garonne", "Île-de-France", "Toulouse"],
+                "kind": ["city", "county", "state", "county"],
+            },
+            geometry=[box(1.3, 43.5, 1.5, 43.7), box(0, 42, 2, 44), box(1, 48, 3, 49),
+                      box(10, 10, 11, 11)],
+            crs="EPSG:4326",
+        )
+        boundaries.to_crs("EPSG:3857").to_file(self.filename, driver="GPKG", layer="admin")
+        self.backend = BoundaryFileBackend(self.filename, type_column="kind")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_search(self):
+        features = self.backend.search("  ile-de-FRANCE ")["features"]
+        self.assertEqual(len(features), 1)
+        self.assertEqual(features[0]["properties"]["type"], "administrative")
+        self.assertEqual(features[0]["properties"]["name"], "Île-de-France")
+
+    def test_reprojection(self):
+        geom = build_aoi_geometry("location", "Toulouse", None, None, None, self.backend)
+        for value, expected in zip(geom.bounds, (1.3, 43.5, 1.5, 43.7)):
+            self.assertAlmostEqual(value, expected)
+
+    def test_location_type(self):
+        geom = build_aoi_geometry("location", "Toulouse", None, "county", None, self.backend)
+        self.assertAlmostEqual(geom.bounds[0], 10)
+        self.assertEqual(self.backend.search("Toulouse", "country")["features"], [])
+
+    def test_input_matcher(self):
+        self.assertEqual(input_matcher("Haute-Garonne", self.backend), "location")
+        with self.assertRaises(ValueError):
+            input_matcher("Nowhere", self.backend)
+
+    def test_other_formats(self):
+        filename = Path(self.tmp_dir.name) / "boundaries.geojson"
+        gp.read_file(self.filename).to_file(filename, driver="GeoJSON")
+        backend = BoundaryFileBackend(filename)
+        self.assertEqual(len(backend.search("toulouse")["features"]), 1)
+
+    def test_default_geocoder(self):
+        with mock.patch.dict(os.environ, {"EOTILE_GEOCODER": str(self.filename)}):
+            self.assertIsInstance(get_geocoder(), BoundaryFileBackend)
+            self.assertIs(get_geocoder(), get_geocoder())
+        environ = {"EOTILE_GEOCODER": "nominatim", "EOTILE_NOMINATIM_URL": "http://mirror/"}
+        with mock.patch.dict(os.environ, environ):
+            self.assertEqual(get_geocoder().base_url, "http://mirror")
+        geocoders.set_geocoder(self.backend)
+        try:
+            self.assertIs(get_geocoder(), self.backend)
+        finally:
+            geocoders.set_geocoder(None)
+        self.assertIsInstance(get_geocoder(), NominatimBackend)
+
+    def test_incomplete_backend(self):
+        class Incomplete(geocoders.GeocodingBackend):
+            pass
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import geopandas as gp
+import pandas as pd
+from shapely.geometry import box
+
+from eotile.eotiles import grid_cache
+from eotile.eotiles.catalog import clear_catalogs, get_catalog
+
+
+class TestGridCache(unittest.TestCase):
+    def setUp(self):
+        clear_catalogs()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filename = Path(self.tmp_dir) / "srtm5x5_tiles.gpkg"
+        shutil.copy("eotile/data/aux_data/srtm5x5_tiles.gpkg", self.filename)
+
+    def tearDown(self):
+        clear_catalogs()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_round_trip(self):
+        self.assertIsNone(grid_cache.open_cache(self.filename))
+        grid_cache.build_cache(self.filename)
+        cache = grid_cache.open_cache(self.filename)
+        expected = gp.read_file(self.filename)
+        tiles = cache.to_geodataframe()
+        self.assertListEqual(list(tiles.columns), list(expected.columns))
+        self.assertListEqual(list(tiles.id), list(expected.id))
+        self.assertTrue(tiles.geometry.geom_equals(expected.geometry).all())
+        self.assertEqual(tiles.crs, expected.crs)
+
+    def test_round_trip_nulls(self):
+        filename = Path(self.tmp_dir) / "nulls.gpkg"
+        gp.GeoDataFrame(
+            {
+                "id": ["a", "b", "c"],
+                "name": ["x", None, "z"],
+                "flag": [True, None, False],
+                "count": [1, None, 3],
+                "exists": [True, False, True],
+            },
+            geometry=[box(0, 0, 1, 1), box(1, 0, 2, 1), box(2, 0, 3, 1)],
+            crs="epsg:4326",
+        ).to_file(filename, driver="GPKG")
+        grid_cache.build_cache(filename)
+        expected = gp.read_file(filename)
+        tiles = grid_cache.open_cache(filename).to_geodataframe()
+        pd.testing.assert_frame_equal(
+            tiles.drop(columns="geometry"), expected.drop(columns="geometry")
+        )
+        self.assertTrue(tiles.geometry.geom_equals(expected.geometry).all())
+        # Tiles given in memory keep the type of their values
+        grid_cache.build_cache(filename, tiles=expected.assign(flag=[True, None, False]))
+        tiles = grid_cache.open_cache(filename).to_geodataframe()
+        self.assertListEqual(list(tiles.flag), [True, None, False])
+
+    def test_catalog_uses_cache(self):
+        grid_cache.build_cache(self.filename)
+        geom = box(-74.657, 39.4284, -72.0429, 41.2409)
+        catalog = get_catalog(self.filename)
+        self.assertIsNotNone(catalog.cache)
+        self.assertListEqual(sorted(catalog.query(geom).id), ["srtm_22_04", "srtm_22_05"])
+        tiles, unknown = catalog.get_tiles(["srtm_37_04", "srtm_99_99"])
+        self.assertListEqual(list(tiles.id), ["srtm_37_04"])
+        self.assertListEqual(unknown, ["srtm_99_99"])
+        self.assertEqual(catalog.get_tile("srtm_37_04")["id"], "srtm_37_04")
+        self.assertFalse(catalog.is_loaded)
+
+    def test_invalidated_when_grid_changes(self):
+        grid_cache.build_cache(self.filename)
+        stat = self.filename.stat()
+        os.utime(self.filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertIsNone(grid_cache.open_cache(self.filename))
+        self.assertTrue(grid_cache.clear_cache(self.filename))
+        self.assertFalse(grid_cache.cache_dirpath(self.filename).exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
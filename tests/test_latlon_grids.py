@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+import geopandas as gp
+import numpy as np
+from shapely.geometry import Point, box
+
+from eotile.eotiles.catalog import clear_catalogs, get_catalog
+from eotile.eotiles.latlon_grids import (
+    DEMGrid,
+    LatLonGrid,
+    SRTM5x5Grid,
+    build_lookup_table,
+    lookup_table_path,
+)
+
+
+class TestLatLonGrids(unittest.TestCase):
+    aux_data_dirpath = Path("eotile/data/aux_data")
+
+    def test_dem_ids(self):
+        grid = DEMGrid()
+        self.assertListEqual(
+            grid.tile_ids_from_points([1.44, -101.5], [43.6, -1.5]), ["N43E001", "S02W102"]
+        )
+        self.assertListEqual(grid.tile_bounds(["S02W102"])[0].tolist(), [-102, -2, -101, -1])
+        self.assertListEqual(
+            grid.tile_ids_from_geometry(box(0.5, 43.5, 1.5, 44.5)),
+            ["N44E000", "N44E001", "N43E000", "N43E001"],
+        )
+        self.assertListEqual(grid.tile_ids_from_geometry(Point(1.44, 43.6)), ["N43E001"])
+        self.assertFalse(grid.is_valid_tile_id("N91E001"))
+
+    def test_incomplete_grid(self):
+        class Incomplete(LatLonGrid):
+            def format_ids(self, rows, cols):
+                return []
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+    def test_bounds_batch(self):
+        grid = DEMGrid()
+        aoi_index, tile_ids = grid.tile_ids_from_bounds(
+            np.array([[0.5, 43.5, 1.5, 44.5], [10.2, 10.2, 10.4, 10.4]])
+        )
+        self.assertListEqual(aoi_index.tolist(), [0, 0, 0, 0, 1])
+        self.assertEqual(tile_ids[-1], "N10E010")
+
+    def test_srtm5x5_lookup_table(self):
+        grid = SRTM5x5Grid(lookup_table_path(self.aux_data_dirpath / "srtm5x5_tiles.gpkg"))
+        tiles = gp.read_file(self.aux_data_dirpath / "srtm5x5_tiles.gpkg")
+        self.assertEqual(int((grid.lookup > 0).sum()), len(tiles))
+        self.assertTrue(grid.is_valid_tile_id("srtm_37_04"))
+        # South Atlantic ocean
+        self.assertFalse(grid.is_valid_tile_id("srtm_32_17"))
+        self.assertListEqual(grid.candidate_tile_ids((-23, -23, -22, -22)), [])
+
+        # Exact refinement against the grid file gives the same result as a full read
+        geom = box(-91.5130518, 36.9701313, -87.0199244, 42.5082935)
+        candidates = tiles[tiles.id.isin(grid.candidate_tile_ids(geom.bounds))]
+        self.assertListEqual(
+            sorted(candidates[candidates.intersects(geom)].id),
+            sorted(tiles[tiles.intersects(geom)].id),
+        )
+
+    def test_dem_flags_without_grid_file(self):
+        clear_catalogs()
+        tiles = gp.GeoDataFrame(
+            {
+                "id": ["N43E001", "N43E000"],
+                "EXIST_SRTM": [True, False],
+                "EXIST_COP30": [True, True],
+                "EXIST_COP90": [False, True],
+            },
+            geometry=[box(1, 43, 2, 44), box(0, 43, 1, 44)],
+            crs="epsg:4326",
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = Path(tmp_dir) / "DEM_Union.gpkg"
+            tiles.to_file(str(filename), driver="GPKG")
+            build_lookup_table(DEMGrid(), filename)
+            filename.unlink()
+
+            output = get_catalog(filename).query(box(0.5, 43.5, 1.5, 43.6))
+            self.assertListEqual(list(output.id), ["N43E000", "N43E001"])
+            self.assertListEqual(list(output.EXIST_SRTM), [False, True])
+            self.assertListEqual(list(output.EXIST_COP90), [True, False])
+        clear_catalogs()
+
+
+if __name__ == "__main__":
+    unittest.main()
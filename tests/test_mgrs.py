@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from shapely.geometry import box
+
+from eotile.eotiles import mgrs
+from eotile.eotiles.catalog import clear_catalogs, get_catalog
+from eotile.eotiles.get_bb_from_tile_id import build_reference_geom
+
+
+class TestMGRS(unittest.TestCase):
+    def test_tile_ids_from_points(self):
+        tile_ids = mgrs.tile_ids_from_points(
+            [1.44, -87.6, 151.2, 10.7, 15.6], [43.6, 41.8, -33.9, 59.9, 78.2]
+        )
+        self.assertListEqual(list(tile_ids), ["31TCJ", "16TDM", "56HLH", "32VNM", "33XWG"])
+
+    def test_tile_footprint(self):
+        # Same bounds as the 31TCJ tile of s2_no_overlap.gpkg
+        bounds = mgrs.tile_footprints(["31TCJ"])[0].bounds
+        expected = (0.49593622377, 43.326246335, 1.7661878622, 44.246370915)
+        for value, expected_value in zip(bounds, expected):
+            self.assertAlmostEqual(value, expected_value, places=6)
+
+        footprint_overlap = mgrs.tile_footprints(["31TCJ"], overlap=True)[0]
+        self.assertGreater(footprint_overlap.area, mgrs.tile_footprints(["31TCJ"])[0].area)
+
+    def test_antimeridian_footprints(self):
+        # Squares of the zones 1 and 60 reaching over the antimeridian
+        tile_ids = mgrs.candidate_tile_ids((-180, -80, -174, 84)) + mgrs.candidate_tile_ids(
+            (174, -80, 180, 84)
+        )
+        for overlap in (False, True):
+            footprints = mgrs.tile_footprints(tile_ids, overlap=overlap)
+            self.assertTrue(all(footprint.is_valid for footprint in footprints))
+            self.assertTrue(
+                all(-180 <= footprint.bounds[0] and footprint.bounds[2] <= 180
+                    for footprint in footprints if not overlap and not footprint.is_empty)
+            )
+
+    def test_mgrs_squares(self):
+        self.assertTrue(mgrs.is_mgrs_square("31TCJ"))
+        self.assertTrue(mgrs.is_mgrs_square("18SWJ"))
+        # Column letter of another zone set, missing Svalbard zone, band I
+        self.assertFalse(mgrs.is_mgrs_square("31TJJ"))
+        self.assertFalse(mgrs.is_mgrs_square("32XNM"))
+        self.assertFalse(mgrs.is_mgrs_square("31ICJ"))
+        self.assertEqual(mgrs.tile_footprints(["31ICJ"]), [None])
+
+    def test_candidate_tile_ids(self):
+        bounds = (0.6, 43.4, 1.7, 44.2)
+        candidates = mgrs.candidate_tile_ids(bounds)
+        self.assertIn("31TCJ", candidates)
+        self.assertNotIn("31TCF", candidates)
+        footprints = mgrs.tile_footprints(candidates)
+        intersecting = [
+            tile_id for tile_id, footprint in zip(candidates, footprints)
+            if footprint.intersects(box(*bounds))
+        ]
+        self.assertListEqual(intersecting, ["31TCJ"])
+
+    def test_catalog_without_grid_file(self):
+        clear_catalogs()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            catalog = get_catalog(Path(tmp_dir) / "s2_no_overlap.gpkg")
+            # Ids which are not MGRS squares are rejected without the grid file
+            with self.assertRaises(KeyError):
+                catalog.get_tile("31TJJ")
+            # The MGRS squares do not stand in for the missing Sentinel-2 grid
+            with self.assertRaises(ValueError):
+                catalog.query(box(-74.657, 39.4284, -72.0429, 41.2409))
+            with self.assertRaises(ValueError):
+                catalog.get_tile("31TCJ")
+            with self.assertRaises(ValueError):
+                build_reference_geom(catalog.filename, ["31TCJ"])
+        clear_catalogs()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+
+import unittest
+from pathlib import Path
+
+import numpy as np
+from shapely.geometry import box
+
+from eotile.eotiles import overlap
+from eotile.eotiles.catalog import clear_catalogs, get_catalog
+from eotile.eotiles.eotiles import (
+    create_tiles_list_eo_from_geometries,
+    create_tiles_list_eo_from_geometry,
+    load_aois,
+)
+
+
+class TestOverlap(unittest.TestCase):
+    filename_tiles_srtm5x5 = Path("eotile/data/aux_data/srtm5x5_tiles.gpkg")
+
+    def setUp(self):
+        clear_catalogs()
+
+    def test_planar_overlap(self):
+        tiles = [box(0, 0, 1, 1), box(1, 0, 2, 1), box(5, 5, 6, 6)]
+        aoi = box(0.5, -1, 3, 2)
+        np.testing.assert_allclose(overlap.tile_overlaps(tiles, aoi), [0.5, 1.0, 0.0])
+        np.testing.assert_array_equal(
+            overlap.inside_bounds(np.array([elt.bounds for elt in tiles]), aoi),
+            [False, True, False],
+        )
+
+    def test_geodesic_overlap(self):
+        tile = box(0, 60, 10, 70)
+        aoi = box(0, 60, 10, 65)
+        planar = overlap.tile_overlaps([tile], aoi)[0]
+        geodesic = overlap.tile_overlaps([tile], aoi, area_mode="geodesic")[0]
+        self.assertAlmostEqual(planar, 0.5)
+        # The southern half of the tile is the largest one
+        self.assertGreater(geodesic, 0.54)
+        with self.assertRaises(ValueError):
+            overlap.tile_overlaps([tile], aoi, area_mode="spherical")
+
+    def test_overlap_column(self):
+        geom = box(-1, 38, 8, 47)
+        output = create_tiles_list_eo_from_geometry(self.filename_tiles_srtm5x5, geom, 0.3)
+        expected = output.geometry.intersection(geom).area / output.geometry.area
+        np.testing.assert_allclose(output["overlap"], expected)
+        self.assertTrue((output["overlap"] >= 0.3).all())
+        self.assertIn("srtm_37_04", list(output.id))
+
+        catalog = get_catalog(self.filename_tiles_srtm5x5)
+        np.testing.assert_allclose(
+            catalog.tile_areas(output, "planar"), output.geometry.area
+        )
+
+        pairs = create_tiles_list_eo_from_geometries(
+            self.filename_tiles_srtm5x5, load_aois([geom.wkt]), 0.3
+        )
+        self.assertListEqual(list(pairs.id), list(output.id))
+        np.testing.assert_allclose(pairs["overlap"], output["overlap"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+
+
+import tempfile
+import unittest
+from pathlib import Path
+
+import geopandas as gp
+import numpy as np
+import pandas as pd
+from shapely.geometry import Point, box
+
+from eotile.eotiles.eotiles import create_tiles_list_eo_from_geometries
+from eotile.eotiles.parcels import assign_parcels, iter_parcel_chunks, partition_keys
+
+
+class TestParcels(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dirpath = Path(self.tmp_dir.name)
+        self.grid = Path("eotile/data/aux_data/srtm5x5_tiles.gpkg")
+        # Toulouse, a parcel across two tiles, Sydney, and parcels spread around the world
+        geometries = [
+            Point(1.44, 43.6).buffer(0.01),
+            box(4.9, 44.0, 5.1, 44.1),
+            Point(151.2, -33.87).buffer(0.01),
+        ] + [Point(lon, lat).buffer(0.05) for lon in range(-170, 180, 40) for lat in (-50, 10, 60)]
+        self.parcels = gp.GeoDataFrame(
+            {
+                "code": [f"P{index}" for index in range(len(geometries))],
+                "crop": ["wheat"] * len(geometries),
+            },
+            geometry=geometries,
+            crs="epsg:4326",
+        )
+        self.filename_parcels = self.dirpath / "parcels.gpkg"
+        # Stored in another CRS, reprojected while streaming
+        self.parcels.to_crs("epsg:3857").to_file(self.filename_parcels, driver="GPKG")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def expected_pairs(self, min_overlap=None):
+        pairs = create_tiles_list_eo_from_geometries(
+            self.grid, self.parcels.geometry.reset_index(drop=True), min_overlap
+        )
+        return sorted(zip(self.parcels["code"].to_numpy()[pairs["aoi_index"]], pairs["id"]))
+
+    def test_iter_parcel_chunks(self):
+        chunks = list(iter_parcel_chunks(self.filename_parcels, chunk_size=10))
+        self.assertEqual([len(chunk) for chunk in chunks], [10, 10, 10])
+        self.assertEqual(chunks[0].crs.to_epsg(), 4326)
+        self.assertAlmostEqual(chunks[0].geometry.iloc[0].centroid.x, 1.44, places=6)
+
+    def test_partition_keys(self):
+        bounds = np.array([[1.4, 43.5, 1.5, 43.7], [1.3, 43.4, 1.6, 43.8], [151, -34, 152, -33]])
+        keys = partition_keys(bounds, level=4)
+        self.assertEqual(keys[0], keys[1])
+        self.assertNotEqual(keys[0], keys[2])
+
+    def test_assign_parcels(self):
+        output = self.dirpath / "pairs.csv"
+        for executor in (None, "thread"):
+            with self.subTest(executor=executor):
+                stats = assign_parcels(
+                    self.filename_parcels,
+                    self.grid,
+                    output,
+                    id_column="code",
+                    keep_columns=["crop"],
+                    chunk_size=4,
+                    executor=executor,
+                    tmp_dirpath=self.dirpath,
+                )
+                pairs = pd.read_csv(output)
+                self.assertEqual(list(pairs.columns), ["code", "crop", "tile_id"])
+                self.assertEqual(sorted(zip(pairs["code"], pairs["tile_id"])), self.expected_pairs())
+                self.assertEqual(stats["parcels"], len(self.parcels))
+                self.assertEqual(stats["pairs"], len(pairs))
+                self.assertIn(("P0", "srtm_37_04"), set(zip(pairs["code"], pairs["tile_id"])))
+                self.assertEqual(len(pairs[pairs["code"] == "P1"]), 2)
+                # The partition files are removed
+                self.assertEqual(list(self.dirpath.glob("eotile_parcels_*")), [])
+
+    def test_assign_parcels_min_overlap(self):
+        output = self.dirpath / "pairs.csv"
+        assign_parcels(
+            self.filename_parcels, self.grid, output, min_overlap=0.0001, executor=None
+        )
+        pairs = pd.read_csv(output)
+        self.assertEqual(list(pairs.columns), ["parcel_id", "tile_id", "overlap"])
+        codes = self.parcels["code"].to_numpy()[pairs["parcel_id"]]
+        self.assertEqual(sorted(zip(codes, pairs["tile_id"])), self.expected_pairs(0.0001))
+
+    def test_unsupported_output(self):
+        with self.assertRaises(ValueError):
+            assign_parcels(self.filename_parcels, self.grid, self.dirpath / "pairs.shp")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+import io
+import json
+import threading
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+
+from shapely.geometry import box
+
+from eotile.eotile_cli import main as cli_main
+from eotile.eotiles.eotiles import create_tiles_list_eo_from_geometry
+from eotile.eotiles.profiling import is_profiling, profiling, span
+
+
+def _worker():
+    with span("worker"):
+        pass
+
+
+class TestProfiling(unittest.TestCase):
+    def test_disabled(self):
+        self.assertFalse(is_profiling())
+        with span("stage", tiles=1) as stage:
+            stage.count(tiles=2)
+        self.assertIs(span("other"), stage)
+
+    def test_spans(self):
+        records = []
+        with profiling(callback=records.append) as profile:
+            self.assertTrue(is_profiling())
+            with span("outer", source="S2") as outer:
+                with span("inner") as inner:
+                    inner.count(candidates=3)
+                with span("inner") as inner:
+                    inner.count(candidates=4)
+                outer.count(tiles=2)
+            thread = threading.Thread(target=_worker)
+            thread.start()
+            thread.join()
+        self.assertFalse(is_profiling())
+        self.assertListEqual(
+            [record["name"] for record in records], ["inner", "inner", "outer", "worker"]
+        )
+        self.assertListEqual([record["depth"] for record in records], [1, 1, 0, 0])
+        self.assertDictEqual(records[2]["counts"], {"source": "S2", "tiles": 2})
+        stages = {stage["name"]: stage for stage in profile.stages()}
+        self.assertEqual(stages["inner"]["calls"], 2)
+        self.assertDictEqual(stages["inner"]["counts"], {"candidates": 7})
+        result = profile.to_dict()
+        self.assertGreaterEqual(result["total_s"], stages["outer"]["total_s"])
+        self.assertEqual(len(result["spans"]), 4)
+        self.assertIn("outer", profile.format_table())
+
+    def test_failed_span(self):
+        with profiling() as profile:
+            with self.assertRaises(ValueError):
+                with span("stage"):
+                    raise ValueError
+        self.assertTrue(profile.spans[0]["failed"])
+
+    def test_query_stages(self):
+        filename_tiles = Path("eotile/data/aux_data/srtm5x5_tiles.gpkg")
+        with profiling() as profile:
+            tiles = create_tiles_list_eo_from_geometry(filename_tiles, box(0, 40, 3, 43), 0.1)
+        stages = {stage["name"]: stage for stage in profile.stages()}
+        self.assertEqual(stages["grid_query"]["counts"]["grid"], filename_tiles.name)
+        self.assertGreaterEqual(stages["grid_query"]["counts"]["candidates"], len(tiles))
+        self.assertEqual(stages["overlap_filter"]["counts"]["tiles"], len(tiles))
+
+    def test_cli_profile(self):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            cli_main(["43.6, 1.44", "-no_l8", "-no_s2", "-srtm5x5", "-to_tile_id",
+                      "-profile", "json"])
+        self.assertIn("srtm_37_04", stdout.getvalue())
+        result = json.loads(stderr.getvalue().splitlines()[-1])
+        names = [stage["name"] for stage in result["stages"]]
+        for name in ("classify_input", "parse_aoi", "grid_query", "write_output"):
+            self.assertIn(name, names)
+
+
+if __name__ == "__main__":
+    unittest.main()
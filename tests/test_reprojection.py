@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+import unittest
+
+import geopandas as gp
+import pyproj
+from shapely.geometry import (
+    GeometryCollection,
+    LineString,
+    MultiPolygon,
+    Point,
+    Polygon,
+    box,
+)
+
+from eotile.eotiles.eotiles import load_wkt_geom
+from eotile.eotiles.reprojection import (
+    crs_key,
+    get_transformer,
+    reproject_geometries,
+    reproject_geometry,
+    to_wgs84,
+)
+
+
+class TestReprojection(unittest.TestCase):
+    def setUp(self):
+        self.geoms = [
+            Polygon(
+                [(600000, 6600000), (700000, 6600000), (700000, 6700000), (600000, 6700000)],
+                [[(620000, 6620000), (640000, 6620000), (640000, 6640000)]],
+            ),
+            MultiPolygon(
+                [box(500000, 6500000, 510000, 6510000), box(520000, 6520000, 530000, 6530000)]
+            ),
+            Point(650000, 6650000),
+            LineString([(600000, 6600000), (610000, 6610000)]),
+            None,
+            Polygon(),
+            GeometryCollection([Point(600000, 6600000), box(600000, 6600000, 601000, 6601000)]),
+        ]
+        self.frame = gp.GeoDataFrame(
+            {"name": list("abcdefg")},
+            geometry=self.geoms,
+            crs="EPSG:2154",
+            index=list(range(7, 0, -1)),
+        )
+
+    def test_crs_key(self):
+        self.assertEqual(crs_key("2154"), 2154)
+        self.assertEqual(crs_key("epsg:2154"), 2154)
+        self.assertEqual(crs_key(2154), 2154)
+        self.assertEqual(crs_key(pyproj.CRS("EPSG:2154")), pyproj.CRS("EPSG:2154").to_wkt())
+
+    def test_cached_transformer(self):
+        self.assertIs(get_transformer("2154"), get_transformer("EPSG:2154"))
+        self.assertIsNone(get_transformer(4326))
+        geom = box(1, 43, 2, 44)
+        self.assertIs(reproject_geometry(geom, "4326"), geom)
+        self.assertIs(reproject_geometry(geom, None), geom)
+
+    def test_reproject_geometries(self):
+        expected = self.frame.to_crs("EPSG:4326").geometry
+        result = reproject_geometries(self.geoms, 2154)
+        for geom, reference in zip(result, expected):
+            if reference is None:
+                self.assertIsNone(geom)
+            else:
+                self.assertEqual(geom.geom_type, reference.geom_type)
+                self.assertTrue(geom.equals_exact(reference, 1e-9))
+
+    def test_z_kept(self):
+        geom = reproject_geometry(LineString([(600000, 6600000, 10), (610000, 6610000, 20)]), 2154)
+        self.assertTrue(geom.has_z)
+        self.assertListEqual([coords[2] for coords in geom.coords], [10, 20])
+
+    def test_to_wgs84(self):
+        result = to_wgs84(self.frame)
+        self.assertEqual(result.crs.to_epsg(), 4326)
+        self.assertListEqual(list(result.index), list(self.frame.index))
+        self.assertListEqual(list(result["name"]), list(self.frame["name"]))
+        self.assertEqual(self.frame.crs.to_epsg(), 2154)
+        series = to_wgs84(self.frame.geometry)
+        self.assertEqual(series.crs.to_epsg(), 4326)
+        with self.assertRaises(ValueError):
+            to_wgs84(gp.GeoSeries([Point(0, 0)]))
+
+    def test_load_wkt_geom(self):
+        geom = load_wkt_geom("POINT (650000 6650000)", "2154")
+        self.assertAlmostEqual(geom.x, 2.3426, places=3)
+        self.assertAlmostEqual(geom.y, 46.9483, places=3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import unittest
+from http.client import HTTPConnection
+from http.server import HTTPServer
+from unittest import mock
+
+from eotile.eotile_server import EOTileServer
+from tests.test_geocode_cache import StandInNominatim
+
+
+class ServerThread:
+    """Runs an EOTileServer in the event loop of a background thread"""
+
+    def __init__(self, **kwargs):
+        self.server = EOTileServer(port=0, **kwargs)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self.server.start(), self.loop).result(60)
+        return self
+
+    def __exit__(self, *args):
+        asyncio.run_coroutine_threadsafe(self.server.close(), self.loop).result(60)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def request(self, method, path, body=None):
+        connection = HTTPConnection("127.0.0.1", self.server.port, timeout=60)
+        try:
+            payload = body if isinstance(body, (str, type(None))) else json.dumps(body)
+            connection.request(method, path, body=payload)
+            response = connection.getresponse()
+            return response.status, json.loads(response.read())
+        finally:
+            connection.close()
+
+
+SRTM_ONLY = {"no_l8": True, "no_s2": True, "srtm5x5": True}
+
+
+class TestServer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.nominatim = HTTPServer(("127.0.0.1", 0), StandInNominatim)
+        threading.Thread(target=cls.nominatim.serve_forever, daemon=True).start()
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.environ = mock.patch.dict(
+            os.environ,
+            {
+                "EOTILE_NOMINATIM_URL": f"http://127.0.0.1:{cls.nominatim.server_port}",
+                "EOTILE_GEOCODE_CACHE": os.path.join(cls.tmp_dir.name, "geocode.sqlite"),
+            },
+        )
+        cls.environ.start()
+        cls.server = ServerThread(executor="thread", workers=2).__enter__()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.__exit__()
+        cls.environ.stop()
+        cls.nominatim.shutdown()
+        cls.nominatim.server_close()
+        cls.tmp_dir.cleanup()
+
+    def test_health(self):
+        self.assertEqual(self.server.request("GET", "/health"), (200, {"status": "ok"}))
+
+    def test_search(self):
+        status, payload = self.server.request(
+            "POST", "/search", {"input": "43.6, 1.44", "search_type": "point", **SRTM_ONLY}
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual(payload["counts"], {"SRTM 5x5": 1})
+        self.assertEqual(payload["tiles"]["SRTM 5x5"][0]["id"], "srtm_37_04")
+        self.assertIn("wkt", payload["tiles"]["SRTM 5x5"][0])
+
+        status, payload = self.server.request(
+            "GET", "/search?input=43.6,%201.44&no_l8=1&no_s2=true&srtm5x5=yes&output=tile_id"
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual(payload["tiles"]["SRTM 5x5"], [{"source": "SRTM 5x5", "id": "srtm_37_04"}])
+
+    def test_location(self):
+        status, payload = self.server.request(
+            "POST", "/search", {"input": "Toulouse", "output": "bbox", **SRTM_ONLY}
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual(payload["tiles"]["SRTM 5x5"][0]["id"], "srtm_37_04")
+
+    def test_quick_search_and_tile_id(self):
+        status, payload = self.server.request(
+            "POST",
+            "/quick_search",
+            {"input": "1, 2, 43, 44", "search_type": "bbox", "tile_source": "SRTM 5x5",
+             "min_overlap": "0.01"},
+        )
+        self.assertEqual(status, 200)
+        self.assertIn("overlap", payload["tiles"]["SRTM 5x5"][0])
+
+        status, payload = self.server.request(
+            "POST", "/tile_id", {"ids": ["srtm_37_04"], "output": "tile_id", **SRTM_ONLY}
+        )
+        self.assertEqual(status, 200)
+        self.assertIn("srtm_37_04", [elt["id"] for elt in payload["tiles"]["SRTM 5x5"]])
+
+    def test_errors(self):
+        for method, path, body, status in [
+            ("GET", "/nowhere", None, 404),
+            ("DELETE", "/search", None, 405),
+            ("POST", "/search", "{", 400),
+            ("POST", "/search", {"input": "43.6, 1.44", "color": "red"}, 400),
+            ("POST", "/search", {"input": "43.6, 1.44", "output": "svg"}, 400),
+            ("POST", "/tile_id", {"ids": ["srtm_99_99"], **SRTM_ONLY}, 400),
+            ("POST", "/quick_search", {"input": "31TCJ"}, 400),
+        ]:
+            with self.subTest(path=path, body=body):
+                self.assertEqual(self.server.request(method, path, body)[0], status)
+
+    def test_invalid_content_length(self):
+        for length in ["abc", "-1"]:
+            with self.subTest(length=length):
+                connection = HTTPConnection("127.0.0.1", self.server.server.port, timeout=60)
+                try:
+                    connection.putrequest("POST", "/search")
+                    connection.putheader("Content-Length", length)
+                    connection.endheaders()
+                    response = connection.getresponse()
+                    self.assertEqual(response.status, 400)
+                    self.assertEqual(
+                        json.loads(response.read()), {"error": "Invalid Content-Length"}
+                    )
+                finally:
+                    connection.close()
+
+    def test_metrics(self):
+        self.server.request("GET", "/health")
+        self.server.request("GET", "/unknown")
+        status, payload = self.server.request("GET", "/metrics")
+        self.assertEqual(status, 200)
+        health = payload["routes"]["GET /health"]
+        self.assertGreaterEqual(health["count"], 1)
+        self.assertLessEqual(health["p50_ms"], health["max_ms"])
+        self.assertGreaterEqual(payload["routes"]["unmatched"]["errors"], 1)
+        self.assertNotIn("GET /unknown", payload["routes"])
+
+
+class TestProcessServer(unittest.TestCase):
+    def test_process_workers(self):
+        with ServerThread(executor="process", workers=1) as server:
+            status, payload = server.request(
+                "POST", "/search", {"input": "43.6, 1.44", "search_type": "point", **SRTM_ONLY}
+            )
+        self.assertEqual(status, 200)
+        self.assertEqual(payload["counts"], {"SRTM 5x5": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+
+import subprocess
+import sys
+import unittest
+
+
+def imported_modules(statement):
+    """Lists the modules imported by a statement, in a new interpreter"""
+    output = subprocess.run(
+        [sys.executable, "-c", f"import sys; {statement}; print(' '.join(sys.modules))"],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return set(output.stdout.split())
+
+
+class TestStartup(unittest.TestCase):
+    def test_cli_imports_are_deferred(self):
+        modules = imported_modules("import eotile.eotile_cli")
+        for module in ["eotile.eotile_module", "geopandas", "geopy", "requests"]:
+            self.assertNotIn(module, modules)
+
+    def test_module_imports_are_deferred(self):
+        modules = imported_modules("import eotile.eotile_module")
+        for module in ["geopy", "requests"]:
+            self.assertNotIn(module, modules)
+
+
+if __name__ == "__main__":
+    unittest.main()
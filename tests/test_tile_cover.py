@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import geopandas as gp
+import numpy as np
+from shapely.geometry import Polygon, box
+from shapely.ops import unary_union
+
+from eotile import eotile_module
+from eotile.eotile_module import get_aux_data_dirpath
+from eotile.eotiles import mgrs
+from eotile.eotiles.catalog import S2_OVERLAP_FILENAME, clear_catalogs
+from eotile.eotiles.tile_cover import CoverageAtoms, minimal_cover
+
+
+class TestTileCover(unittest.TestCase):
+    def setUp(self):
+        # Greedy picks the columns, the two rows are enough
+        self.tiles = gp.GeoDataFrame(
+            {"id": ["top", "bottom", "c1", "c2", "c3", "outside", "touching"]},
+            geometry=[
+                box(0, 1, 7, 2),
+                box(0, 0, 7, 1),
+                box(0, 0, 4, 2),
+                box(4, 0, 6, 2),
+                box(6, 0, 7, 2),
+                box(10, 10, 11, 11),
+                box(7, 0, 8, 2),
+            ],
+            crs="epsg:4326",
+        )
+        self.aoi = box(0, 0, 7, 2)
+
+    def assertCovers(self, tiles, aoi):
+        self.assertAlmostEqual(aoi.difference(unary_union(list(tiles.geometry))).area, 0.0)
+
+    def test_greedy(self):
+        cover = minimal_cover(self.tiles, self.aoi)
+        self.assertListEqual(list(cover.id), ["c1", "c2", "c3"])
+        self.assertCovers(cover, self.aoi)
+        np.testing.assert_allclose(cover.unique_area, [8, 4, 2])
+        self.assertAlmostEqual(cover.unique_fraction.sum(), 1.0)
+
+    def test_optimal(self):
+        cover = minimal_cover(self.tiles, self.aoi, "optimal")
+        self.assertListEqual(list(cover.id), ["top", "bottom"])
+        np.testing.assert_allclose(cover.unique_fraction, [0.5, 0.5])
+        # Without budget, the greedy cover is kept
+        cover = minimal_cover(self.tiles, self.aoi, "optimal", budget=0)
+        self.assertEqual(len(cover), 3)
+
+    def test_redundant_tiles(self):
+        tiles = self.tiles.iloc[[2, 0, 1]]
+        cover = minimal_cover(tiles, box(0, 0, 4, 2))
+        self.assertListEqual(list(cover.id), ["c1"])
+
+    def test_aoi_with_hole(self):
+        aoi = Polygon(
+            [(0.5, 0.5), (6.5, 0.5), (6.5, 1.5), (0.5, 1.5)],
+            [[(1, 0.8), (2, 0.8), (2, 1.2), (1, 1.2)]],
+        )
+        atoms = CoverageAtoms(self.tiles.geometry.values, aoi)
+        self.assertAlmostEqual(atoms.total_area, aoi.area)
+        cover = minimal_cover(self.tiles, aoi, "optimal")
+        np.testing.assert_allclose(cover.unique_area, [aoi.area / 2] * 2)
+
+    def test_unique_areas(self):
+        atoms = CoverageAtoms(self.tiles.geometry.values, self.aoi)
+        np.testing.assert_allclose(atoms.unique_areas(), [0] * 7)
+        np.testing.assert_allclose(atoms.unique_areas([0, 1, 2]), [3, 3, 0, 0, 0, 0, 0])
+
+    def test_geodesic(self):
+        cover = minimal_cover(self.tiles, self.aoi, area_mode="geodesic")
+        self.assertEqual(len(cover), 3)
+        self.assertGreater(cover.unique_area.iloc[0], 1e10)
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            minimal_cover(self.tiles, self.aoi, "exact")
+        empty = self.tiles.iloc[:0]
+        self.assertIs(minimal_cover(empty, self.aoi), empty)
+
+    def test_main(self):
+        wkt = "POLYGON((1 41, 6 41, 6 46, 1 46, 1 41))"
+        tiles = eotile_module.main(wkt, no_l8=True, no_s2=True, srtm5x5=True)[3]
+        cover = eotile_module.main(wkt, no_l8=True, no_s2=True, srtm5x5=True, cover="greedy")[3]
+        # The tiles of the grid do not overlap
+        self.assertListEqual(list(cover.id), list(tiles.id))
+        self.assertAlmostEqual(cover.unique_fraction.sum(), 1.0)
+        cover = eotile_module.quick_search(wkt, "wkt", "SRTM 5x5", cover="optimal")
+        self.assertListEqual(list(cover.id), list(tiles.id))
+
+    def test_main_tile_id(self):
+        # The S2 tiles with overlap of an SRTM tile, the input tile is kept as is
+        aux_data_dirpath = get_aux_data_dirpath()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for filename in ["srtm5x5_tiles.gpkg", "srtm5x5_tiles_lookup.npy"]:
+                shutil.copy(aux_data_dirpath / filename, tmp_dir)
+            # A small S2 grid with overlap around the SRTM tile
+            tile_ids = mgrs.candidate_tile_ids((-1.0, 39.0, 6.0, 46.0), overlap=True)
+            gp.GeoDataFrame(
+                {"id": tile_ids},
+                geometry=mgrs.tile_footprints(tile_ids, overlap=True),
+                crs="epsg:4326",
+            ).to_file(Path(tmp_dir) / S2_OVERLAP_FILENAME, driver="GPKG")
+            with mock.patch.dict(os.environ, {"EOTILE_AUX_DATA": tmp_dir}):
+                s2_tiles, _, _, srtm_tiles = eotile_module.main(
+                    "srtm_37_04", no_l8=True, srtm5x5=True, overlap=True
+                )
+                s2_cover, _, _, srtm_cover = eotile_module.main(
+                    "srtm_37_04", no_l8=True, srtm5x5=True, overlap=True, cover="greedy"
+                )
+            clear_catalogs()
+        self.assertLess(len(s2_cover), len(s2_tiles))
+        self.assertTrue(set(s2_cover.id) <= set(s2_tiles.id))
+        self.assertCovers(s2_cover, srtm_tiles.geometry.iloc[0])
+        self.assertListEqual(list(srtm_cover.id), ["srtm_37_04"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+
+import tempfile
+import unittest
+from pathlib import Path
+
+import fiona
+import geopandas as gp
+import numpy as np
+from shapely.geometry import box
+
+from eotile.eotiles.eotiles import morton_order, write_tile_lists_to_file, write_tiles_bb
+
+
+class TestWriteTiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dirpath = Path(self.tmp_dir.name)
+        self.tile_lists = {
+            "S2": gp.GeoDataFrame(
+                {"id": ["31TCJ", "31TDJ"]}, geometry=[box(0, 43, 1, 44), box(1, 43, 2, 44)]
+            ),
+            "L8": gp.GeoDataFrame({"id": []}, geometry=[]),
+            "DEM": gp.GeoDataFrame({"id": ["N43E001"]}, geometry=[box(1, 43, 2, 44)]),
+        }
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_flatgeobuf(self):
+        filename = self.dirpath / "tiles.fgb"
+        write_tiles_bb(self.tile_lists["S2"], filename, source="S2")
+        tiles = gp.read_file(filename)
+        # The spatial index reorders the features
+        self.assertEqual(sorted(tiles["id"]), ["31TCJ", "31TDJ"])
+        self.assertEqual(tiles.crs.to_epsg(), 4326)
+
+    def test_geopackage_layers(self):
+        filename = self.dirpath / "tiles.gpkg"
+        written = write_tile_lists_to_file(self.tile_lists, filename)
+        self.assertEqual(written, [filename])
+        self.assertEqual(sorted(fiona.listlayers(str(filename))), ["DEM", "S2"])
+        self.assertEqual(list(self.dirpath.iterdir()), [filename])
+        # Rewriting replaces the layers of the same name only
+        write_tile_lists_to_file(
+            {"L8": self.tile_lists["S2"], "DEM": self.tile_lists["S2"]}, filename
+        )
+        self.assertEqual(sorted(fiona.listlayers(str(filename))), ["DEM", "L8", "S2"])
+        self.assertEqual(list(gp.read_file(filename, layer="DEM")["id"]), ["31TCJ", "31TDJ"])
+        self.assertEqual(list(self.dirpath.iterdir()), [filename])
+
+    def test_file_per_source(self):
+        written = write_tile_lists_to_file(self.tile_lists, self.dirpath / "tiles.geojson")
+        self.assertEqual(
+            [elt.name for elt in written], ["tiles_S2.geojson", "tiles_DEM.geojson"]
+        )
+
+    def test_single_file(self):
+        filename = self.dirpath / "tiles.fgb"
+        written = write_tile_lists_to_file(self.tile_lists, filename, single_file=True)
+        self.assertEqual(written, [filename])
+        tiles = gp.read_file(filename)
+        self.assertEqual(
+            sorted(zip(tiles["source"], tiles["id"])),
+            [("DEM", "N43E001"), ("S2", "31TCJ"), ("S2", "31TDJ")],
+        )
+
+    def test_morton_order(self):
+        bounds = np.array(
+            [[10, 10, 11, 11], [0, 0, 1, 1], [10, 0, 11, 1], [0, 10, 1, 11]], dtype=float
+        )
+        self.assertEqual(list(morton_order(bounds)), [1, 2, 3, 0])
+
+    def test_geoparquet(self):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            self.skipTest("pyarrow is not installed")
+        filename = self.dirpath / "tiles.parquet"
+        write_tiles_bb(self.tile_lists["S2"], filename)
+        tiles = gp.read_parquet(filename)
+        self.assertEqual(sorted(tiles["id"]), ["31TCJ", "31TDJ"])
+        self.assertIn("xmin", tiles.columns)
+
+
+if __name__ == "__main__":
+    unittest.main()
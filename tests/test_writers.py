@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+
+import io
+import json
+import unittest
+
+import geopandas as gp
+from shapely.geometry import box
+
+from eotile.eotiles.writers import write_tile_lists
+
+
+class TestWriters(unittest.TestCase):
+    def setUp(self):
+        self.tile_lists = {
+            "S2": gp.GeoDataFrame(
+                {"id": ["31TCJ", "31TDJ"]}, geometry=[box(0, 43, 1, 44), box(1, 43, 2, 44)]
+            ),
+            "L8": gp.GeoDataFrame({"id": []}, geometry=[]),
+            "DEM": gp.GeoDataFrame(
+                {"id": ["N43E001"], "EXIST_SRTM": [1], "EXIST_COP30": [0], "EXIST_COP90": [1]},
+                geometry=[box(1, 43, 2, 44)],
+            ),
+        }
+
+    def write(self, output, output_format, chunk_size=1):
+        stream = io.StringIO()
+        write_tile_lists(stream, self.tile_lists, output, output_format, chunk_size)
+        return stream.getvalue().splitlines()
+
+    def test_text(self):
+        self.assertListEqual(
+            self.write("tile_id", "text"),
+            [
+                "[S2] Tile id: 31TCJ",
+                "[S2] Tile id: 31TDJ",
+                "[SRTM, Copernicus 90] Tile id: N43E001",
+                "--- Summary ---",
+                "- 2 S2 Tiles",
+                "- 1 DEM Tiles",
+            ],
+        )
+        self.assertEqual(self.write("bbox", "text")[0], "[S2] Tile Bounds: (0.0, 43.0, 1.0, 44.0)")
+        self.assertListEqual(
+            self.write("default", "text")[:3],
+            ["[S2 tile]", " 31TCJ", " POLYGON ((1 43, 1 44, 0 44, 0 43, 1 43))"],
+        )
+
+    def test_csv(self):
+        lines = self.write("bbox", "csv")
+        self.assertListEqual(
+            lines,
+            [
+                "source,id,min_x,min_y,max_x,max_y",
+                "S2,31TCJ,0.0,43.0,1.0,44.0",
+                "S2,31TDJ,1.0,43.0,2.0,44.0",
+                "DEM,N43E001,1.0,43.0,2.0,44.0",
+            ],
+        )
+        self.assertEqual(
+            self.write("wkt", "csv")[1], 'S2,31TCJ,"POLYGON ((1 43, 1 44, 0 44, 0 43, 1 43))"'
+        )
+
+    def test_ndjson(self):
+        records = [json.loads(line) for line in self.write("bbox", "ndjson", chunk_size=2)]
+        self.assertEqual(len(records), 3)
+        self.assertDictEqual(
+            records[2], {"source": "DEM", "id": "N43E001", "bounds": [1.0, 43.0, 2.0, 44.0]}
+        )
+        with self.assertRaises(ValueError):
+            self.write("bbox", "xml")
+
+    def test_batch_line(self):
+        stream = io.StringIO()
+        write_tile_lists(stream, self.tile_lists, "tile_id", "csv", line=7)
+        write_tile_lists(stream, self.tile_lists, "tile_id", "csv", line=8, header=False)
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(lines[0], "line,source,id")
+        self.assertEqual(lines[1:4], ["7,S2,31TCJ", "7,S2,31TDJ", "7,DEM,N43E001"])
+        self.assertEqual(len(lines), 7)
+
+        stream = io.StringIO()
+        write_tile_lists(stream, self.tile_lists, "tile_id", "text", line=3)
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(lines[0], "[line 3] [S2] Tile id: 31TCJ")
+        # No summary for a batch line
+        self.assertEqual(len(lines), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2021 CS GROUP - France.
+#
+# This file is part of EOTile.
+# See https://github.com/CS-SI/eotile for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+:author: mgerma
+:organization: CS GROUP - France
+:copyright: 2021 CS GROUP - France. All rights reserved.
+:license: see LICENSE file.
+"""
+
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from shapely import wkt
+from shapely.geometry import box
+
+from eotile.eotiles import mgrs, wrs2
+from eotile.eotiles.catalog import clear_catalogs, get_catalog
+from eotile.eotiles.get_bb_from_tile_id import tile_id_matcher
+
+# 198029 footprint of l8_tiles.gpkg
+FOOTPRINT_198029 = (
+    "POLYGON ((0.8468214953196805 44.02363566574142, 0.84638 44.0237, "
+    "1.35047 45.524, 3.65866 45.1875, 3.09866 43.6955, 0.8468214953196805 44.02363566574142))"
+)
+
+
+class TestWRS2(unittest.TestCase):
+    def test_scene_centers(self):
+        lons, lats = wrs2.scene_centers([1, 198], [60, 29])
+        self.assertAlmostEqual(lons[0], -64.60)
+        self.assertAlmostEqual(lats[0], 0.0)
+        reference = wkt.loads(FOOTPRINT_198029).centroid
+        self.assertAlmostEqual(lons[1], reference.x, delta=0.05)
+        self.assertAlmostEqual(lats[1], reference.y, delta=0.05)
+
+    def test_tile_footprint(self):
+        reference = wkt.loads(FOOTPRINT_198029)
+        footprint = wrs2.tile_footprints(["198029"])[0]
+        self.assertGreater(
+            footprint.intersection(reference).area / footprint.union(reference).area, 0.9
+        )
+        self.assertEqual(wrs2.tile_footprints(["234001"]), [None])
+
+    def test_candidate_tile_ids(self):
+        s2_footprint = mgrs.tile_footprints(["31TCJ"])[0]
+        candidates = wrs2.candidate_tile_ids(s2_footprint.bounds)
+        intersecting = [
+            tile_id
+            for tile_id, footprint in zip(candidates, wrs2.tile_footprints(candidates))
+            if footprint.intersects(s2_footprint)
+        ]
+        self.assertListEqual(sorted(intersecting), ["198029", "198030", "199029", "199030"])
+
+        point_index, tile_ids = wrs2.tile_ids_from_points([1.44], [43.6])
+        self.assertListEqual(sorted(tile_ids), ["198030", "199030"])
+        self.assertListEqual(point_index.tolist(), [0, 0])
+
+    def test_candidate_margin(self):
+        # The candidates include the scenes of the grid file reaching the box with a corner
+        footprint = wkt.loads(FOOTPRINT_198029)
+        for lon, lat in list(footprint.exterior.coords)[1:]:
+            self.assertIn("198029", wrs2.candidate_tile_ids((lon, lat, lon, lat)))
+        # and the rebuilt scenes at up to half a degree from the box
+        bounds = (10.0, -20.0, 10.5, -19.5)
+        candidates = wrs2.candidate_tile_ids((5.0, -25.0, 15.5, -14.5))
+        close = [
+            tile_id
+            for tile_id, footprint in zip(candidates, wrs2.tile_footprints(candidates))
+            if footprint.buffer(0.5).intersects(box(*bounds))
+        ]
+        self.assertTrue(set(close) <= set(wrs2.candidate_tile_ids(bounds)))
+
+    def test_catalog_without_grid_file(self):
+        clear_catalogs()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            catalog = get_catalog(Path(tmp_dir) / "l8_tiles.gpkg")
+            # The rebuilt scenes do not stand in for the missing grid file
+            with self.assertRaises(ValueError):
+                catalog.query(box(1.0, 43.0, 2.0, 44.0))
+            with self.assertRaises(ValueError):
+                catalog.get_tile("198029")
+        clear_catalogs()
+
+    def test_tile_id_matcher(self):
+        self.assertEqual(tile_id_matcher("25030"), [False, True, False, False])
+        with self.assertRaises(ValueError):
+            # Path 250 does not exist
+            tile_id_matcher("250030")
+
+
+if __name__ == "__main__":
+    unittest.main()